@@ -2,6 +2,7 @@ from fastapi import HTTPException
 from datetime import datetime
 import asyncio
 import json
+from core.driver_load import driver_load
 
 # Admin endpoints to be added to main.py
 
@@ -47,8 +48,8 @@ def get_admin_analytics_endpoint(orders_db, drivers_db):
 
 # Driver assignment response endpoint
 def driver_assignment_response_endpoint(response, orders_db, drivers_db, manager):
-    order = next((o for o in orders_db if o["id"] == response.order_id), None)
-    driver = next((d for d in drivers_db if d["id"] == response.driver_id), None)
+    order = orders_db.get(response.order_id)
+    driver = drivers_db.get(response.driver_id)
     
     if not order or not driver:
         raise HTTPException(status_code=404, detail="Order or driver not found")
@@ -56,7 +57,7 @@ def driver_assignment_response_endpoint(response, orders_db, drivers_db, manager
     if response.accept:
         order["status"] = "accepted"
         order["accepted_at"] = datetime.now().isoformat()
-        driver["current_orders"].append(response.order_id)
+        driver_load.attach(driver, response.order_id)
         driver["status"] = "busy"
         
         asyncio.create_task(manager.send_to_user({
@@ -80,8 +81,8 @@ def driver_assignment_response_endpoint(response, orders_db, drivers_db, manager
 
 # GPS tracking endpoint
 def update_driver_gps_endpoint(gps_data, orders_db, drivers_db, manager):
-    driver = next((d for d in drivers_db if d["id"] == gps_data.driver_id), None)
-    order = next((o for o in orders_db if o["id"] == gps_data.order_id), None)
+    driver = drivers_db.get(gps_data.driver_id)
+    order = orders_db.get(gps_data.order_id)
     
     if not driver or not order:
         raise HTTPException(status_code=404, detail="Driver or order not found")
@@ -125,8 +126,8 @@ def update_driver_gps_endpoint(gps_data, orders_db, drivers_db, manager):
 
 # Start delivery endpoint
 def start_delivery_route_endpoint(order_id, driver_id, orders_db, drivers_db, manager):
-    order = next((o for o in orders_db if o["id"] == order_id), None)
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    order = orders_db.get(order_id)
+    driver = drivers_db.get(driver_id)
     
     if not order or not driver:
         raise HTTPException(status_code=404, detail="Order or driver not found")
@@ -156,8 +157,8 @@ def complete_delivery_final_endpoint(completion_data, orders_db, drivers_db, man
     notes = completion_data.get("notes", "")
     proof_photo = completion_data.get("proof_photo", "")
     
-    order = next((o for o in orders_db if o["id"] == order_id), None)
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    order = orders_db.get(order_id)
+    driver = drivers_db.get(driver_id)
     
     if not order or not driver:
         raise HTTPException(status_code=404, detail="Order or driver not found")
@@ -167,8 +168,7 @@ def complete_delivery_final_endpoint(completion_data, orders_db, drivers_db, man
     order["completion_notes"] = notes
     order["proof_photo"] = proof_photo
     
-    if order_id in driver["current_orders"]:
-        driver["current_orders"].remove(order_id)
+    if driver_load.detach(driver, order_id):
         driver["total_deliveries"] += 1
         
         if not driver["current_orders"]:
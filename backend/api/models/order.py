@@ -1,7 +1,7 @@
 from beanie import Document
 from pydantic import Field
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Union
 
 class Order(Document):
     tracking_number: str = Field(index=True, unique=True)
@@ -24,7 +24,7 @@ class Order(Document):
     current_location: Optional[str] = None
     current_lat: Optional[float] = None
     current_lng: Optional[float] = None
-    route_geometry: Optional[List] = None
+    route_geometry: Optional[Union[str, List]] = None  # encoded polyline; older orders hold [lng, lat] lists
     route_duration: Optional[float] = None
     route_distance: Optional[float] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -1,14 +1,15 @@
 from fastapi import APIRouter
 from api.services.smart_assignment import SmartAssignmentService
+from core.store import orders_db, drivers_db
+from core.driver_load import driver_load, current_load
 
 router = APIRouter()
 
 @router.get("/debug/assignment/{order_id}")
 async def debug_assignment(order_id: str):
     """Debug assignment process for an order"""
-    from main import orders_db, drivers_db
     
-    order = next((o for o in orders_db if o["id"] == order_id), None)
+    order = orders_db.get(order_id)
     if not order:
         return {"error": "Order not found"}
     
@@ -60,9 +61,9 @@ def get_unsuitability_reasons(driver, order, weather, service):
     if driver.get("status") not in ["available", "online"]:
         reasons.append(f"Driver status: {driver.get('status')}")
     
-    current_load = sum([service.get_order_weight(oid) for oid in driver.get("current_orders", [])])
-    if current_load + order.get("weight", 1) > driver.get("vehicle_capacity", 50):
-        reasons.append(f"Capacity exceeded: {current_load + order.get('weight', 1)} > {driver.get('vehicle_capacity', 50)}")
+    load_weight = current_load(driver)["weight"]
+    if load_weight + order.get("weight", 1) > driver.get("vehicle_capacity", 50):
+        reasons.append(f"Capacity exceeded: {load_weight + order.get('weight', 1)} > {driver.get('vehicle_capacity', 50)}")
     
     max_orders = {"bike": 5, "scooter": 6, "car": 8, "van": 10}.get(vehicle_type, 5)
     if len(driver.get("current_orders", [])) >= max_orders:
@@ -73,10 +74,9 @@ def get_unsuitability_reasons(driver, order, weather, service):
 @router.post("/debug/force-assign/{order_id}/{driver_id}")
 async def force_assign_debug(order_id: str, driver_id: str):
     """Force assign order to driver for debugging"""
-    from main import orders_db, drivers_db
     
-    order = next((o for o in orders_db if o["id"] == order_id), None)
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    order = orders_db.get(order_id)
+    driver = drivers_db.get(driver_id)
     
     if not order or not driver:
         return {"error": "Order or driver not found"}
@@ -85,8 +85,7 @@ async def force_assign_debug(order_id: str, driver_id: str):
     order["assigned_driver"] = driver_id
     order["status"] = "assigned"
     
-    if order_id not in driver["current_orders"]:
-        driver["current_orders"].append(order_id)
+    driver_load.attach(driver, order_id)
     
     return {
         "success": True,
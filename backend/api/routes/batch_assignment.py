@@ -1,7 +1,11 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from api.services.multi_package_optimizer import MultiPackageOptimizer
+from api.services.fleet_vrp import fleet_optimizer
+from core.store import orders_db, drivers_db
+from core.driver_load import driver_load
+from core.config import settings
 
 router = APIRouter(prefix="/api/batch", tags=["batch_assignment"])
 
@@ -13,13 +17,17 @@ class MultiOrderCreate(BaseModel):
     orders: List[dict]
     optimize_assignment: bool = True
 
+class FleetOptimizeRequest(BaseModel):
+    cities: Optional[List[str]] = None  # Default: every city with pending orders
+    time_budget_seconds: Optional[float] = None  # Per city
+    assign: bool = True
+
 @router.post("/assign-multiple")
 async def assign_multiple_orders(request: BatchAssignmentRequest):
     """Assign multiple orders to optimal driver with route optimization"""
-    from main import orders_db, drivers_db
     
     # Get orders
-    orders = [o for o in orders_db if o["id"] in request.order_ids]
+    orders = [orders_db.get(oid) for oid in request.order_ids if oid in orders_db]
     if not orders:
         raise HTTPException(status_code=404, detail="No valid orders found")
     
@@ -27,7 +35,7 @@ async def assign_multiple_orders(request: BatchAssignmentRequest):
     
     if request.driver_id:
         # Assign to specific driver
-        driver = next((d for d in drivers_db if d["id"] == request.driver_id), None)
+        driver = drivers_db.get(request.driver_id)
         if not driver:
             raise HTTPException(status_code=404, detail="Driver not found")
         
@@ -42,12 +50,13 @@ async def assign_multiple_orders(request: BatchAssignmentRequest):
         for order in orders:
             order["assigned_driver"] = driver["id"]
             order["status"] = "assigned"
-            driver["current_orders"].append(order["id"])
+            driver_load.attach(driver, order["id"])
         
         # Generate optimized route
         route_data = optimizer.optimize_multi_delivery_route(
             driver["current_location"],
-            [o for o in orders_db if o.get("assigned_driver") == driver["id"]]
+            orders_db.find("assigned_driver", driver["id"]),
+            capacity=driver.get("vehicle_capacity")
         )
         
         return {
@@ -63,7 +72,7 @@ async def assign_multiple_orders(request: BatchAssignmentRequest):
         best_driver = None
         best_score = 0
         
-        available_drivers = [d for d in drivers_db if d["status"] in ["available", "busy"]]
+        available_drivers = drivers_db.find_in("status", ["available", "busy"])
         
         for driver in available_drivers:
             score = optimizer.calculate_batch_assignment_score(driver, orders)
@@ -78,14 +87,15 @@ async def assign_multiple_orders(request: BatchAssignmentRequest):
         for order in orders:
             order["assigned_driver"] = best_driver["id"]
             order["status"] = "assigned"
-            best_driver["current_orders"].append(order["id"])
+            driver_load.attach(best_driver, order["id"])
         
         best_driver["status"] = "busy"
         
         # Generate optimized route
         route_data = optimizer.optimize_multi_delivery_route(
             best_driver["current_location"],
-            [o for o in orders_db if o.get("assigned_driver") == best_driver["id"]]
+            orders_db.find("assigned_driver", best_driver["id"]),
+            capacity=best_driver.get("vehicle_capacity")
         )
         
         return {
@@ -100,7 +110,6 @@ async def assign_multiple_orders(request: BatchAssignmentRequest):
 @router.post("/create-optimized-batch")
 async def create_optimized_batch(request: MultiOrderCreate):
     """Create multiple orders and assign them optimally"""
-    from main import orders_db, drivers_db
     import random
     from datetime import datetime, timedelta
     
@@ -120,7 +129,7 @@ async def create_optimized_batch(request: MultiOrderCreate):
             "assigned_driver": None
         }
         
-        orders_db.append(new_order)
+        new_order = orders_db.insert(new_order)
         created_orders.append(new_order)
     
     if request.optimize_assignment:
@@ -129,7 +138,7 @@ async def create_optimized_batch(request: MultiOrderCreate):
         best_driver = None
         best_score = 0
         
-        available_drivers = [d for d in drivers_db if d["status"] in ["available", "busy"]]
+        available_drivers = drivers_db.find_in("status", ["available", "busy"])
         
         for driver in available_drivers:
             score = optimizer.calculate_batch_assignment_score(driver, created_orders)
@@ -142,14 +151,15 @@ async def create_optimized_batch(request: MultiOrderCreate):
             for order in created_orders:
                 order["assigned_driver"] = best_driver["id"]
                 order["status"] = "assigned"
-                best_driver["current_orders"].append(order["id"])
+                driver_load.attach(best_driver, order["id"])
             
             best_driver["status"] = "busy"
             
             # Generate optimized route
             route_data = optimizer.optimize_multi_delivery_route(
                 best_driver["current_location"],
-                [o for o in orders_db if o.get("assigned_driver") == best_driver["id"]]
+                orders_db.find("assigned_driver", best_driver["id"]),
+                capacity=best_driver.get("vehicle_capacity")
             )
             
             return {
@@ -170,9 +180,8 @@ async def create_optimized_batch(request: MultiOrderCreate):
 @router.get("/driver/{driver_id}/capacity")
 async def get_driver_capacity(driver_id: str):
     """Get driver's current capacity and optimization potential"""
-    from main import drivers_db, orders_db
     
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    driver = drivers_db.get(driver_id)
     if not driver:
         raise HTTPException(status_code=404, detail="Driver not found")
     
@@ -181,10 +190,11 @@ async def get_driver_capacity(driver_id: str):
     current_load = len(driver["current_orders"])
     
     # Get current route optimization
-    current_orders = [o for o in orders_db if o.get("assigned_driver") == driver_id]
+    current_orders = orders_db.find("assigned_driver", driver_id)
     route_data = optimizer.optimize_multi_delivery_route(
         driver["current_location"],
-        current_orders
+        current_orders,
+        capacity=driver.get("vehicle_capacity")
     ) if current_orders else None
     
     return {
@@ -201,25 +211,28 @@ async def get_driver_capacity(driver_id: str):
 @router.post("/optimize-existing/{driver_id}")
 async def optimize_existing_route(driver_id: str):
     """Re-optimize existing driver route for better efficiency"""
-    from main import drivers_db, orders_db
     
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    driver = drivers_db.get(driver_id)
     if not driver:
         raise HTTPException(status_code=404, detail="Driver not found")
     
-    current_orders = [o for o in orders_db if o.get("assigned_driver") == driver_id and 
+    current_orders = [o for o in orders_db.find("assigned_driver", driver_id) if 
                      o["status"] in ["assigned", "accepted", "picked_up", "in_transit"]]
     
     if not current_orders:
         return {"message": "No orders to optimize"}
     
     optimizer = MultiPackageOptimizer()
+    await optimizer.prefetch_matrix(driver["current_location"], current_orders)
     
     # Get current route metrics
-    old_route = optimizer.optimize_multi_delivery_route(driver["current_location"], current_orders)
+    old_route = optimizer.optimize_multi_delivery_route(driver["current_location"], current_orders,
+                                                        capacity=driver.get("vehicle_capacity"))
     
-    # Re-optimize (this will use improved algorithms)
-    new_route = optimizer.optimize_multi_delivery_route(driver["current_location"], current_orders)
+    # Re-optimize with a short large neighborhood search on top
+    new_route = optimizer.optimize_multi_delivery_route(driver["current_location"], current_orders,
+                                                        capacity=driver.get("vehicle_capacity"),
+                                                        search_budget=settings.ANYTIME_LIVE_BUDGET_SECONDS)
     
     savings = old_route["total_cost"] - new_route["total_cost"]
     time_saved = old_route["total_time"] - new_route["total_time"]
@@ -244,4 +257,51 @@ async def optimize_existing_route(driver_id: str):
             "efficiency_gain": round(new_route["efficiency_score"] - old_route["efficiency_score"], 1)
         },
         "optimized_route": new_route
-    }
\ No newline at end of file
+    }
+
+@router.post("/fleet-optimize")
+async def fleet_optimize(request: FleetOptimizeRequest):
+    """Split pending orders across all available drivers of each city as one multi-vehicle route problem"""
+    
+    pending_orders = orders_db.find("status", "pending_assignment")
+    available_drivers = drivers_db.find_in("status", ["available", "busy"])
+    problems = fleet_optimizer.build_problems(pending_orders, available_drivers, request.cities,
+                                              request.time_budget_seconds)
+    if not problems:
+        return {"success": False, "message": "No pending orders with available drivers"}
+    
+    results = await fleet_optimizer.optimize(problems)
+    
+    assigned = skipped = 0
+    if request.assign:
+        for result in results:
+            for route in result.get("routes", []):
+                driver = drivers_db.get(route["driver_id"])
+                for order_id in route["orders"]:
+                    order = orders_db.get(order_id)
+                    # The solve ran on a snapshot; leave orders that were taken meanwhile
+                    if not driver or not order or order.get("assigned_driver") or order["status"] != "pending_assignment":
+                        skipped += 1
+                        continue
+                    order["assigned_driver"] = driver["id"]
+                    order["status"] = "assigned"
+                    driver_load.attach(driver, order_id)
+                    driver["status"] = "busy"
+                    assigned += 1
+    
+    solved = [r for r in results if "error" not in r]
+    return {
+        "success": bool(solved),
+        "cities": results,
+        "summary": {
+            "cities": len(results),
+            "cities_failed": len(results) - len(solved),
+            "orders": sum(r["stats"]["orders"] for r in solved),
+            "orders_routed": sum(r["stats"]["assigned"] for r in solved),
+            "orders_assigned": assigned,
+            "orders_skipped": skipped,
+            "unassigned": [order_id for r in solved for order_id in r["unassigned"]],
+            "total_km": round(sum(r["stats"]["final_km"] for r in solved), 3),
+            "max_solve_ms": max((r["stats"]["solve_ms"] for r in solved), default=0)
+        }
+    }
@@ -0,0 +1,26 @@
+from fastapi import APIRouter
+from api.services.dispatch import dispatch_engine
+
+router = APIRouter(prefix="/dispatch")
+
+@router.get("/metrics")
+def get_dispatch_metrics():
+    """Batch dispatcher throughput and latency"""
+    return dispatch_engine.get_metrics()
+
+@router.post("/run")
+def run_dispatch_window():
+    """Run one dispatch window immediately"""
+    return {"success": True, "window": dispatch_engine.run_window()}
+
+@router.post("/start")
+async def start_dispatch():
+    """Start the background dispatch loop"""
+    dispatch_engine.start()
+    return {"success": True, "window_seconds": dispatch_engine.window_seconds}
+
+@router.post("/stop")
+async def stop_dispatch():
+    """Stop the background dispatch loop"""
+    await dispatch_engine.stop()
+    return {"success": True}
@@ -2,6 +2,8 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from datetime import datetime
 from typing import Optional, List
+from core.store import orders_db, drivers_db
+from core.driver_load import driver_load
 
 router = APIRouter()
 
@@ -32,9 +34,8 @@ assignment_history = []
 @router.post("/driver/status/update")
 async def update_driver_status(status_update: DriverStatusUpdate):
     """Update driver availability status"""
-    from main import drivers_db
     
-    driver = next((d for d in drivers_db if d["id"] == status_update.driver_id), None)
+    driver = drivers_db.get(status_update.driver_id)
     if not driver:
         raise HTTPException(status_code=404, detail="Driver not found")
     
@@ -44,6 +45,7 @@ async def update_driver_status(status_update: DriverStatusUpdate):
     
     if status_update.location:
         driver["current_location"].update(status_update.location)
+        drivers_db.touch(driver, "current_location")
     
     # Log status change
     status_log = {
@@ -66,11 +68,10 @@ async def update_driver_status(status_update: DriverStatusUpdate):
 @router.post("/driver/assignment/respond")
 async def respond_to_assignment(response: AssignmentResponse):
     """Driver responds to delivery assignment"""
-    from main import orders_db, drivers_db
     from api.services.smart_assignment import SmartAssignmentService
     
-    order = next((o for o in orders_db if o["id"] == response.order_id), None)
-    driver = next((d for d in drivers_db if d["id"] == response.driver_id), None)
+    order = orders_db.get(response.order_id)
+    driver = drivers_db.get(response.driver_id)
     
     if not order or not driver:
         raise HTTPException(status_code=404, detail="Order or driver not found")
@@ -94,8 +95,7 @@ async def respond_to_assignment(response: AssignmentResponse):
         order["accepted_at"] = datetime.now().isoformat()
         order["estimated_pickup_time"] = response.estimated_pickup_time
         
-        if response.order_id not in driver["current_orders"]:
-            driver["current_orders"].append(response.order_id)
+        driver_load.attach(driver, response.order_id)
         
         driver["status"] = "busy"
         
@@ -141,10 +141,9 @@ async def respond_to_assignment(response: AssignmentResponse):
 @router.post("/driver/milestone/update")
 async def update_delivery_milestone(milestone: DeliveryMilestone):
     """Update delivery milestone (pickup, transit, delivery)"""
-    from main import orders_db, drivers_db
     
-    order = next((o for o in orders_db if o["id"] == milestone.order_id), None)
-    driver = next((d for d in drivers_db if d["id"] == milestone.driver_id), None)
+    order = orders_db.get(milestone.order_id)
+    driver = drivers_db.get(milestone.driver_id)
     
     if not order or not driver:
         raise HTTPException(status_code=404, detail="Order or driver not found")
@@ -177,8 +176,7 @@ async def update_delivery_milestone(milestone: DeliveryMilestone):
         order["delivery_confirmed"] = True
         
         # Remove from driver's current orders
-        if milestone.order_id in driver["current_orders"]:
-            driver["current_orders"].remove(milestone.order_id)
+        if driver_load.detach(driver, milestone.order_id):
             driver["total_deliveries"] += 1
         
         # Update driver status if no more orders
@@ -199,20 +197,18 @@ async def update_delivery_milestone(milestone: DeliveryMilestone):
 @router.get("/driver/{driver_id}/assignments")
 async def get_driver_assignments(driver_id: str):
     """Get current and pending assignments for driver"""
-    from main import orders_db
     
     # Current orders
+    driver_orders = orders_db.find("assigned_driver", driver_id)
     current_orders = [
-        o for o in orders_db 
-        if o.get("assigned_driver") == driver_id and 
-        o["status"] in ["accepted", "picked_up", "in_transit"]
+        o for o in driver_orders 
+        if o["status"] in ["accepted", "picked_up", "in_transit"]
     ]
     
     # Pending assignments
     pending_assignments = [
-        o for o in orders_db 
-        if o.get("assigned_driver") == driver_id and 
-        o["status"] == "pending_acceptance"
+        o for o in driver_orders 
+        if o["status"] == "pending_acceptance"
     ]
     
     # Assignment history
@@ -233,7 +229,6 @@ async def get_driver_assignments(driver_id: str):
 @router.get("/admin/assignments/overview")
 async def get_assignments_overview():
     """Admin overview of all assignments and driver statuses"""
-    from main import orders_db, drivers_db
     
     # Orders by status
     orders_by_status = {}
@@ -272,17 +267,16 @@ async def get_assignments_overview():
         "drivers_by_status": drivers_by_status,
         "recent_assignments": recent_assignments,
         "problem_orders": problem_orders,
-        "total_active_orders": len([o for o in orders_db if o["status"] in ["accepted", "picked_up", "in_transit"]]),
-        "available_drivers": len([d for d in drivers_db if d["status"] == "available"])
+        "total_active_orders": orders_db.count_in("status", ["accepted", "picked_up", "in_transit"]),
+        "available_drivers": drivers_db.count("status", "available")
     }
 
 @router.post("/admin/assignment/force")
 async def force_assignment(order_id: str, driver_id: str):
     """Admin force assignment of order to specific driver"""
-    from main import orders_db, drivers_db
     
-    order = next((o for o in orders_db if o["id"] == order_id), None)
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    order = orders_db.get(order_id)
+    driver = drivers_db.get(driver_id)
     
     if not order or not driver:
         raise HTTPException(status_code=404, detail="Order or driver not found")
@@ -293,8 +287,7 @@ async def force_assignment(order_id: str, driver_id: str):
     order["force_assigned"] = True
     order["force_assigned_at"] = datetime.now().isoformat()
     
-    if order_id not in driver["current_orders"]:
-        driver["current_orders"].append(order_id)
+    driver_load.attach(driver, order_id)
     
     driver["status"] = "busy"
     
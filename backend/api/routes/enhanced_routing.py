@@ -1,8 +1,16 @@
-from fastapi import APIRouter, HTTPException
+import json
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 from api.services.real_time_routing import RealTimeRoutingService
 from api.services.multi_package_optimizer import MultiPackageOptimizer
+from api.services.driver_route_cache import driver_route_cache
+from api.services.route_plan import route_plans
+from api.services.anytime_optimizer import anytime_optimizer
+from core.config import settings
+from core.polyline import shape_route
+from core.store import orders_db, drivers_db
 
 router = APIRouter(prefix="/api/route", tags=["enhanced_routing"])
 
@@ -12,8 +20,12 @@ class RouteRequest(BaseModel):
     vehicle_type: str = "car"
     optimize: bool = True
 
+class AnytimeSearchRequest(BaseModel):
+    budget_seconds: float = 30.0
+    seed: Optional[int] = None
+
 @router.post("/calculate")
-async def calculate_enhanced_route(request: RouteRequest):
+async def calculate_enhanced_route(request: RouteRequest, zoom: Optional[float] = None, geometry: str = "geojson"):
     try:
         routing_service = RealTimeRoutingService()
         route_data = await routing_service.calculate_optimized_route(
@@ -23,7 +35,7 @@ async def calculate_enhanced_route(request: RouteRequest):
         )
         return {
             "success": True,
-            "route": route_data,
+            "route": shape_route(route_data, zoom, geometry),
             "optimization_applied": request.optimize,
             "total_waypoints": len(request.waypoints)
         }
@@ -31,83 +43,97 @@ async def calculate_enhanced_route(request: RouteRequest):
         raise HTTPException(status_code=500, detail=f"Route calculation failed: {str(e)}")
 
 @router.get("/driver/{driver_id}/current")
-async def get_driver_current_route(driver_id: str):
-    from main import drivers_db, orders_db
+async def get_driver_current_route(driver_id: str, request: Request, response: Response,
+                                   zoom: Optional[float] = None, geometry: str = "geojson"):
     
     try:
-        driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+        driver = drivers_db.get(driver_id)
         if not driver:
             raise HTTPException(status_code=404, detail="Driver not found")
         
-        active_orders = [o for o in orders_db if 
-                        o.get("assigned_driver") == driver_id and 
-                        o["status"] in ["assigned", "accepted", "picked_up", "in_transit"]]
-        
-        if not active_orders:
-            return {"success": False, "message": "No active orders for driver"}
-        
-        optimizer = MultiPackageOptimizer()
-        routing_service = RealTimeRoutingService()
-        
-        multi_route = optimizer.optimize_multi_delivery_route(
+        # Repeated polls reuse the last result, OSRM geometry included, until the route version changes
+        key = f"current:{geometry}:{zoom}"
+        etag, cached = driver_route_cache.lookup(driver, key)
+        if driver_route_cache.not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        if cached is not None:
+            response.headers["ETag"] = etag
+            return cached
+        
+        result = await build_driver_current_route(driver, zoom, geometry)
+        # A straight-line fallback is not kept, so the next poll retries the routing servers
+        if result.get("route", {}).get("source") != "fallback":
+            result = driver_route_cache.store(driver_id, key, etag, result)
+            response.headers["ETag"] = etag
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Route generation failed: {str(e)}")
+
+async def build_driver_current_route(driver: Dict, zoom: Optional[float] = None,
+                                     geometry: str = "geojson") -> Dict:
+    active_orders = [o for o in orders_db.find("assigned_driver", driver["id"]) if 
+                    o["status"] in ["assigned", "accepted", "picked_up", "in_transit"]]
+    
+    if not active_orders:
+        return {"success": False, "message": "No active orders for driver"}
+    
+    routing_service = RealTimeRoutingService()
+    
+    # Stops in the driver's persistent plan order
+    multi_route = route_plans.route_for(driver)
+    
+    waypoints = []
+    for point in multi_route["route"]:
+        if point["type"] != "start":
+            waypoints.append(point["location"])
+    
+    if waypoints:
+        detailed_route = await routing_service.calculate_optimized_route(
             driver["current_location"],
-            active_orders
+            waypoints,
+            driver["vehicle_type"]
         )
         
-        waypoints = []
-        for point in multi_route["route"]:
-            if point["type"] != "start":
-                waypoints.append(point["location"])
-        
-        if waypoints:
-            detailed_route = await routing_service.calculate_optimized_route(
-                driver["current_location"],
-                waypoints,
-                driver["vehicle_type"]
-            )
-            
-            detailed_route.update({
-                "multi_package_optimization": {
-                    "total_packages": len(active_orders),
-                    "estimated_savings": multi_route["fuel_savings"],
-                    "efficiency_score": multi_route["efficiency_score"],
-                    "total_stops": len(multi_route["route"]) - 1
-                },
-                "waypoints": [
-                    {
-                        "lat": point["location"]["lat"],
-                        "lng": point["location"]["lng"],
-                        "type": point["type"],
-                        "order_id": point.get("order_id"),
-                        "address": point.get("order", {}).get("pickup_address" if point["type"] == "pickup" else "delivery_address", ""),
-                        "contact": point.get("order", {}).get("sender_name" if point["type"] == "pickup" else "receiver_name", ""),
-                        "phone": point.get("order", {}).get("sender_phone" if point["type"] == "pickup" else "receiver_phone", "")
-                    }
-                    for point in multi_route["route"] if point["type"] != "start"
-                ]
-            })
-            
-            return {
-                "success": True,
-                "route": detailed_route
-            }
-        
-        return {"success": False, "message": "Could not generate route"}
+        detailed_route.update({
+            "multi_package_optimization": {
+                "total_packages": len(active_orders),
+                "estimated_savings": multi_route["fuel_savings"],
+                "efficiency_score": multi_route["efficiency_score"],
+                "total_stops": len(multi_route["route"]) - 1
+            },
+            "waypoints": [
+                {
+                    "lat": point["location"]["lat"],
+                    "lng": point["location"]["lng"],
+                    "type": point["type"],
+                    "order_id": point.get("order_id"),
+                    "address": point.get("order", {}).get("pickup_address" if point["type"] == "pickup" else "delivery_address", ""),
+                    "contact": point.get("order", {}).get("sender_name" if point["type"] == "pickup" else "receiver_name", ""),
+                    "phone": point.get("order", {}).get("sender_phone" if point["type"] == "pickup" else "receiver_phone", "")
+                }
+                for point in multi_route["route"] if point["type"] != "start"
+            ]
+        })
         
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Route generation failed: {str(e)}")
+        return {
+            "success": True,
+            "route": shape_route(detailed_route, zoom, geometry)
+        }
+    
+    return {"success": False, "message": "Could not generate route"}
 
 @router.post("/optimize/{driver_id}")
-async def optimize_driver_route(driver_id: str):
-    from main import drivers_db, orders_db
+async def optimize_driver_route(driver_id: str, zoom: Optional[float] = None, geometry: str = "geojson"):
     
     try:
-        driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+        driver = drivers_db.get(driver_id)
         if not driver:
             raise HTTPException(status_code=404, detail="Driver not found")
         
-        active_orders = [o for o in orders_db if 
-                        o.get("assigned_driver") == driver_id and 
+        active_orders = [o for o in orders_db.find("assigned_driver", driver_id) if 
                         o["status"] in ["assigned", "accepted", "picked_up", "in_transit"]]
         
         if not active_orders:
@@ -116,9 +142,12 @@ async def optimize_driver_route(driver_id: str):
         optimizer = MultiPackageOptimizer()
         routing_service = RealTimeRoutingService()
         
+        await optimizer.prefetch_matrix(driver["current_location"], active_orders)
         current_route = optimizer.optimize_multi_delivery_route(
             driver["current_location"],
-            active_orders
+            active_orders,
+            capacity=driver.get("vehicle_capacity"),
+            search_budget=settings.ANYTIME_LIVE_BUDGET_SECONDS
         )
         
         waypoints = [point["location"] for point in current_route["route"] if point["type"] != "start"]
@@ -140,10 +169,60 @@ async def optimize_driver_route(driver_id: str):
                     "cost_savings": current_route["fuel_savings"],
                     "efficiency_improvement": current_route["efficiency_score"]
                 },
-                "route": optimized_route
+                "route": shape_route(optimized_route, zoom, geometry)
             }
         
         return {"success": False, "message": "Could not optimize route"}
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Route optimization failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Route optimization failed: {str(e)}")
+
+@router.post("/anytime/{driver_id}")
+async def start_anytime_search(driver_id: str, request: AnytimeSearchRequest):
+    """Start a long route search for the driver's active orders in a worker process"""
+    driver = drivers_db.get(driver_id)
+    if not driver:
+        raise HTTPException(status_code=404, detail="Driver not found")
+    
+    active_orders = [o for o in orders_db.find("assigned_driver", driver_id) if 
+                    o["status"] in ["assigned", "accepted", "picked_up", "in_transit"]]
+    if not active_orders:
+        return {"success": False, "message": "No orders to optimize"}
+    
+    job = anytime_optimizer.submit(driver["current_location"], active_orders,
+                                   capacity=driver.get("vehicle_capacity"),
+                                   budget=request.budget_seconds, seed=request.seed)
+    if job is None:
+        raise HTTPException(status_code=429, detail="Too many route searches running")
+    
+    return {"success": True, **job.to_dict(include_route=False)}
+
+@router.get("/anytime/jobs/{job_id}")
+async def get_anytime_search(job_id: str):
+    """Status and best route so far of a route search"""
+    job = anytime_optimizer.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Search not found")
+    return job.to_dict()
+
+@router.get("/anytime/jobs/{job_id}/stream")
+async def stream_anytime_search(job_id: str):
+    """Newline-delimited JSON: one line per better route, then the final job state"""
+    job = anytime_optimizer.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Search not found")
+    
+    async def lines():
+        async for event in anytime_optimizer.stream(job):
+            yield json.dumps(event, default=str) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.delete("/anytime/jobs/{job_id}")
+async def cancel_anytime_search(job_id: str):
+    """Stop a route search; its best route so far stays available"""
+    job = anytime_optimizer.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Search not found")
+    job.cancel()
+    return {"success": True, "job_id": job_id, "status": job.status}
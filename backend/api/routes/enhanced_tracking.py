@@ -3,6 +3,7 @@ from typing import Dict, List, Optional
 from datetime import datetime
 from core.database import get_database
 from core.auth import get_current_user
+from core.geo import to_arrays, path_length
 from api.services.gps_tracking import GPSTrackingService
 from api.services.real_time_routing import routing_service
 from api.services.notification_service import NotificationService
@@ -285,27 +286,8 @@ async def calculate_delivery_metrics(order_id: str, db):
     
     # Calculate total distance from location updates
     location_events = [e for e in events if e["event_type"] == "location_update" and e.get("location")]
-    total_distance = 0
-    
-    for i in range(1, len(location_events)):
-        prev_loc = location_events[i-1]["location"]
-        curr_loc = location_events[i]["location"]
-        
-        # Simple distance calculation (in production, use proper geospatial functions)
-        import math
-        lat1, lng1 = prev_loc["lat"], prev_loc["lng"]
-        lat2, lng2 = curr_loc["lat"], curr_loc["lng"]
-        
-        R = 6371000  # Earth radius in meters
-        lat1_rad, lat2_rad = math.radians(lat1), math.radians(lat2)
-        delta_lat, delta_lng = math.radians(lat2-lat1), math.radians(lng2-lng1)
-        
-        a = (math.sin(delta_lat/2)**2 + 
-             math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lng/2)**2)
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        distance = R * c
-        
-        total_distance += distance
+    lats, lngs = to_arrays(e["location"] for e in location_events)
+    total_distance = path_length(lats, lngs) * 1000  # meters
     
     # Get order and courier info
     order = await db.orders.find_one({"_id": order_id})
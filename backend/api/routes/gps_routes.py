@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from datetime import datetime
 from typing import Optional
+from core.geo import haversine
 
 router = APIRouter()
 
@@ -167,19 +168,7 @@ async def get_order_route_tracking(order_id: str):
 
 def calculate_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
     """Calculate distance between two GPS coordinates in kilometers"""
-    import math
-    
-    R = 6371  # Earth's radius in km
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lng = math.radians(lng2 - lng1)
-    
-    a = (math.sin(delta_lat/2)**2 + 
-         math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lng/2)**2)
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    
-    return R * c
+    return haversine(lat1, lng1, lat2, lng2)
 
 def get_tracking_quality(accuracy: float, speed: float) -> str:
     """Determine GPS tracking quality"""
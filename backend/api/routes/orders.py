@@ -1,22 +1,32 @@
 from fastapi import APIRouter, HTTPException
-from typing import List
+from typing import List, Optional
 import random
 import string
 
 from api.models.order import Order
 from api.models.tracking import TrackingEvent
 from api.schemas.order import OrderCreate, OrderResponse
+from core.config import settings
+from core.geo import haversine
+from core import polyline
 
 router = APIRouter(prefix="/api/orders", tags=["orders"])
 
 def generate_tracking_number():
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=12))
 
+def order_payload(order: Order, zoom: Optional[float] = None, geometry: str = "geojson") -> dict:
+    """Order as returned by the API; the stored polyline is expanded to [lng, lat] unless polyline is asked for"""
+    data = {**order.dict(), "id": str(order.id)}
+    coordinates = polyline.expand(order.route_geometry)
+    if coordinates:
+        tolerance = polyline.tolerance_for_zoom(zoom, coordinates[0][1]) if zoom is not None else 0
+        data["route_geometry"] = polyline.shape_geometry(coordinates, tolerance, geometry)
+    return data
+
 @router.post("/")
 async def create_order(order: OrderCreate):
     try:
-        import httpx
-        from math import radians, sin, cos, sqrt, atan2
         from backend.api.services.delivery_router import DeliveryRouter
         
         delivery_info = await DeliveryRouter.detect_delivery_type(
@@ -24,13 +34,6 @@ async def create_order(order: OrderCreate):
             order.receiver_lat, order.receiver_lng
         )
         
-        def haversine(lat1, lon1, lat2, lon2):
-            R = 6371
-            dlat = radians(lat2 - lat1)
-            dlon = radians(lon2 - lon1)
-            a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
-            return R * 2 * atan2(sqrt(a), sqrt(1-a))
-        
         distance = haversine(order.sender_lat, order.sender_lng, order.receiver_lat, order.receiver_lng)
         base_price = 15.0
         weight_cost = order.weight * 2.0
@@ -49,7 +52,8 @@ async def create_order(order: OrderCreate):
         
         if route_data and route_data.get('code') == 'Ok' and route_data.get('routes'):
             route = route_data['routes'][0]
-            route_geometry = route['geometry']['coordinates']
+            route_geometry = polyline.compact(polyline.decode(route['geometry']),
+                                              settings.ROUTE_GEOMETRY_STORE_TOLERANCE_METERS)
             route_duration = route.get('duration')
             route_distance = route.get('distance')
         
@@ -134,7 +138,7 @@ async def create_order(order: OrderCreate):
         print(f"Route: {delivery_info.get('sender_city')} -> {delivery_info.get('receiver_city')}")
         print(f"AI agents processing in background...")
         
-        return {**db_order.dict(), "id": str(db_order.id)}
+        return order_payload(db_order)
     except Exception as e:
         print(f"Order creation error: {e}")
         import traceback
@@ -142,24 +146,24 @@ async def create_order(order: OrderCreate):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/")
-async def get_orders(skip: int = 0, limit: int = 100):
+async def get_orders(skip: int = 0, limit: int = 100, zoom: Optional[float] = None, geometry: str = "geojson"):
     try:
         orders = await Order.find_all().sort(-Order.created_at).skip(skip).limit(limit).to_list()
-        return [{**order.dict(), "id": str(order.id)} for order in orders]
+        return [order_payload(order, zoom, geometry) for order in orders]
     except Exception as e:
         print(f"Error fetching orders: {e}")
         return []
 
 @router.get("/{order_id}")
-async def get_order(order_id: str):
+async def get_order(order_id: str, zoom: Optional[float] = None, geometry: str = "geojson"):
     order = await Order.get(order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    return {**order.dict(), "id": str(order.id)}
+    return order_payload(order, zoom, geometry)
 
 @router.get("/tracking/{tracking_number}")
-async def get_order_by_tracking(tracking_number: str):
+async def get_order_by_tracking(tracking_number: str, zoom: Optional[float] = None, geometry: str = "geojson"):
     order = await Order.find_one(Order.tracking_number == tracking_number)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    return {**order.dict(), "id": str(order.id)}
+    return order_payload(order, zoom, geometry)
@@ -1,7 +1,13 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from pydantic import BaseModel
 from typing import List, Optional
 from api.services.real_time_routing import RealTimeRoutingService
+from api.services.hedging import routing_hedger
+from api.services.route_cache import route_cache
+from api.services.driver_route_cache import driver_route_cache
+from core.store import orders_db, drivers_db
+from core.geo import haversine
+from core.polyline import shape_route
 
 router = APIRouter()
 
@@ -16,8 +22,11 @@ class RouteOptimizationRequest(BaseModel):
     order_ids: List[str]
 
 @router.post("/route/calculate")
-async def calculate_optimized_route(request: RouteRequest):
-    """Calculate optimized route with real-time conditions"""
+async def calculate_optimized_route(request: RouteRequest, zoom: Optional[float] = None, geometry: str = "geojson"):
+    """Calculate optimized route with real-time conditions.
+
+    Geometry is simplified for the map ``zoom``; ``geometry=polyline`` sends encoded polylines.
+    """
     
     routing_service = RealTimeRoutingService()
     
@@ -30,7 +39,7 @@ async def calculate_optimized_route(request: RouteRequest):
         
         return {
             "success": True,
-            "route": optimized_route,
+            "route": shape_route(optimized_route, zoom, geometry),
             "generated_at": routing_service.datetime.now().isoformat() if hasattr(routing_service, 'datetime') else None
         }
         
@@ -38,16 +47,16 @@ async def calculate_optimized_route(request: RouteRequest):
         raise HTTPException(status_code=500, detail=f"Route calculation failed: {str(e)}")
 
 @router.post("/route/optimize-multi-stop")
-async def optimize_multi_stop_route(request: RouteOptimizationRequest):
+async def optimize_multi_stop_route(request: RouteOptimizationRequest, zoom: Optional[float] = None,
+                                    geometry: str = "geojson"):
     """Optimize route for multiple pickup/delivery stops"""
-    from main import orders_db, drivers_db
     
     # Get driver and orders
-    driver = next((d for d in drivers_db if d["id"] == request.driver_id), None)
+    driver = drivers_db.get(request.driver_id)
     if not driver:
         raise HTTPException(status_code=404, detail="Driver not found")
     
-    orders = [o for o in orders_db if o["id"] in request.order_ids]
+    orders = [orders_db.get(oid) for oid in request.order_ids if oid in orders_db]
     if not orders:
         raise HTTPException(status_code=404, detail="No orders found")
     
@@ -101,7 +110,7 @@ async def optimize_multi_stop_route(request: RouteOptimizationRequest):
     return {
         "success": True,
         "driver": driver,
-        "route": optimized_route,
+        "route": shape_route(optimized_route, zoom, geometry),
         "optimization_summary": {
             "total_distance": f"{optimized_route['distance'] / 1000:.1f} km",
             "estimated_time": f"{optimized_route['optimized_duration'] // 60} minutes",
@@ -111,17 +120,25 @@ async def optimize_multi_stop_route(request: RouteOptimizationRequest):
     }
 
 @router.get("/route/driver/{driver_id}/current")
-async def get_current_driver_route(driver_id: str):
+async def get_current_driver_route(driver_id: str, request: Request, response: Response,
+                                   zoom: Optional[float] = None, geometry: str = "geojson"):
     """Get current optimized route for driver"""
-    from main import orders_db, drivers_db
     
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    driver = drivers_db.get(driver_id)
     if not driver:
         raise HTTPException(status_code=404, detail="Driver not found")
     
+    # Each geometry format and zoom is cached (and tagged) separately
+    key = f"multi-stop:{geometry}:{zoom}"
+    etag, cached = driver_route_cache.lookup(driver, key)
+    if driver_route_cache.not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    if cached is not None:
+        response.headers["ETag"] = etag
+        return cached
+    
     # Get active orders for driver
-    active_orders = [o for o in orders_db if 
-                    o.get("assigned_driver") == driver_id and 
+    active_orders = [o for o in orders_db.find("assigned_driver", driver_id) if 
                     o["status"] in ["accepted", "assigned", "picked_up", "in_transit"]]
     
     if not active_orders:
@@ -129,9 +146,12 @@ async def get_current_driver_route(driver_id: str):
     
     # Use multi-stop optimization
     order_ids = [o["id"] for o in active_orders]
-    request = RouteOptimizationRequest(driver_id=driver_id, order_ids=order_ids)
-    
-    return await optimize_multi_stop_route(request)
+    result = await optimize_multi_stop_route(RouteOptimizationRequest(driver_id=driver_id, order_ids=order_ids),
+                                             zoom=zoom, geometry=geometry)
+    if result.get("route", {}).get("source") != "fallback":
+        result = driver_route_cache.store(driver_id, key, etag, result)
+        response.headers["ETag"] = etag
+    return result
 
 @router.get("/route/weather/{lat}/{lng}")
 async def get_route_weather(lat: float, lng: float):
@@ -151,6 +171,16 @@ async def get_route_weather(lat: float, lng: float):
         }
     }
 
+@router.get("/route/servers")
+async def get_route_server_stats():
+    """Per-server latency, success and hedging stats used to pick the primary router"""
+    return routing_hedger.get_stats()
+
+@router.get("/route/cache")
+async def get_route_cache_stats():
+    """Hit rate and size of the route result cache"""
+    return route_cache.get_stats()
+
 def get_address_coordinates(address: str, city: str) -> dict:
     """Get coordinates for address (simplified)"""
     # City center coordinates as fallback
@@ -209,18 +239,7 @@ def optimize_waypoint_order(start_location: dict, waypoints: List[dict]) -> List
 
 def calculate_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
     """Calculate distance between coordinates"""
-    import math
-    R = 6371
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lng = math.radians(lng2 - lng1)
-    
-    a = (math.sin(delta_lat/2)**2 + 
-         math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lng/2)**2)
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    
-    return R * c
+    return haversine(lat1, lng1, lat2, lng2)
 
 def get_recommended_speed(weather: dict) -> str:
     """Get recommended speed based on weather"""
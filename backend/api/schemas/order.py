@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Union
 from datetime import datetime
 
 class OrderCreate(BaseModel):
@@ -37,7 +37,7 @@ class OrderResponse(BaseModel):
     current_location: Optional[str]
     current_lat: Optional[float]
     current_lng: Optional[float]
-    route_geometry: Optional[List]
+    route_geometry: Optional[Union[str, List]]
     route_duration: Optional[float]
     route_distance: Optional[float]
     created_at: datetime
@@ -0,0 +1,178 @@
+import asyncio
+import multiprocessing
+import queue
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+from api.services.lns import search_worker
+from api.services.local_search import route_cost
+from api.services.multi_package_optimizer import MultiPackageOptimizer
+from core.config import settings
+
+
+class SearchJob:
+    """One anytime route search running in its own process.
+
+    A reader thread collects each better route the worker posts; ``best``
+    is always the latest of them, so the job can be read or cancelled at any
+    point and still give a valid route.
+    """
+
+    def __init__(self, job_id: str, points: List[Dict], solver, budget: float, optimizer: MultiPackageOptimizer):
+        self.id = job_id
+        self.points = points
+        self.solver = solver
+        self.budget = budget
+        self.optimizer = optimizer
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.created_at = datetime.now().isoformat()
+        self.finished_at: Optional[str] = None
+        self.best: Optional[List[int]] = None
+        self.history: List[Dict] = []
+        self.stats: Dict = {}
+        self._updates = multiprocessing.Queue()
+        self._cancel = multiprocessing.Event()
+        self._process: Optional[multiprocessing.Process] = None
+
+    def start(self, problem: Dict, seed: Optional[int] = None) -> None:
+        self._process = multiprocessing.Process(target=search_worker, daemon=True,
+                                                args=(problem, self.budget, seed, self._updates, self._cancel))
+        self._process.start()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self) -> None:
+        while True:
+            try:
+                message = self._updates.get(timeout=1.0)
+            except queue.Empty:
+                if self._process is not None and not self._process.is_alive():
+                    self._finish("failed", error="Search process exited unexpectedly")
+                    return
+                continue
+            if message.get("done"):
+                self.stats = message.get("stats", {})
+                if message.get("error"):
+                    self._finish("failed", error=message["error"])
+                else:
+                    self._finish("cancelled" if self.stats.get("cancelled") else "completed")
+                return
+            self.best = message["route"]
+            self.history.append({key: value for key, value in message.items() if key != "route"})
+
+    def _finish(self, status: str, error: Optional[str] = None) -> None:
+        self.status = status
+        self.error = error
+        self.finished_at = datetime.now().isoformat()
+        if self._process is not None:
+            self._process.join(timeout=1.0)
+
+    @property
+    def running(self) -> bool:
+        return self.status == "running"
+
+    def cancel(self) -> None:
+        """Ask the worker to stop; it reports its best route so far and exits"""
+        self._cancel.set()
+
+    def result(self) -> Optional[Dict]:
+        """Best route so far in the optimizer's route format"""
+        if self.best is None:
+            return None
+        metrics = {
+            "final_km": round(route_cost(self.solver.dist, self.best), 3),
+            "feasible": self.solver.is_feasible(self.best),
+            **self.solver.lateness_summary(self.best)
+        }
+        return self.optimizer._route_result(self.points, self.solver, self.best, metrics)
+
+    def to_dict(self, include_route: bool = True) -> Dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "budget_seconds": self.budget,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "improvements": len(self.history),
+            "best": self.history[-1] if self.history else None,
+            "stats": self.stats,
+            **({"route": self.result()} if include_route else {})
+        }
+
+
+class AnytimeOptimizer:
+    """Runs long route searches in worker processes and tracks them as jobs.
+
+    Live requests should call MultiPackageOptimizer.optimize_multi_delivery_route
+    with a small ``search_budget`` instead; a process start costs more than
+    a few milliseconds of search.
+    """
+
+    def __init__(self, max_running: int = 2, keep_finished: int = 50,
+                 optimizer: Optional[MultiPackageOptimizer] = None):
+        self.max_running = max_running
+        self.keep_finished = keep_finished
+        self.optimizer = optimizer or MultiPackageOptimizer()
+        self.jobs: "OrderedDict[str, SearchJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, driver_location: Dict, orders: List[Dict], capacity: Optional[float] = None,
+               budget: float = 30.0, seed: Optional[int] = None) -> Optional[SearchJob]:
+        """Start a search over the orders' stops; None when too many searches are running"""
+        with self._lock:
+            if sum(1 for job in self.jobs.values() if job.running) >= self.max_running:
+                return None
+            stops = [stop for order in orders for stop in self.optimizer.order_stops(order)]
+            points, solver = self.optimizer.build_problem(driver_location, stops, capacity, datetime.now())
+            problem = {
+                "dist": solver.dist,
+                "requests": solver.requests,
+                "capacity": capacity,
+                "travel": solver.travel,
+                "windows": list(zip(solver.earliest.tolist(), solver.due.tolist())),
+                "service": solver.service
+            }
+            job = SearchJob(uuid.uuid4().hex[:12], points, solver, budget, self.optimizer)
+            self.jobs[job.id] = job
+            self._prune()
+        job.start(problem, seed)
+        return job
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self.jobs.items() if not job.running]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[SearchJob]:
+        return self.jobs.get(job_id)
+
+    async def stream(self, job: SearchJob, poll_interval: float = 0.1) -> AsyncIterator[Dict]:
+        """Yield each improvement as it arrives, then the final job state"""
+        sent = 0
+        while True:
+            running = job.running
+            while sent < len(job.history):
+                yield {"event": "improvement", **job.history[sent]}
+                sent += 1
+            if not running:
+                yield {"event": job.status, **job.to_dict()}
+                return
+            await asyncio.sleep(poll_interval)
+
+    def cancel_all(self) -> None:
+        for job in list(self.jobs.values()):
+            if job.running:
+                job.cancel()
+
+    def get_stats(self) -> Dict:
+        statuses: Dict[str, int] = {}
+        for job in self.jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {"jobs": len(self.jobs), "by_status": statuses, "max_running": self.max_running}
+
+
+anytime_optimizer = AnytimeOptimizer(max_running=settings.ANYTIME_MAX_RUNNING_JOBS)
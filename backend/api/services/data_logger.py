@@ -72,66 +72,68 @@ class DataLogger:
     async def log_route_api_call(order_id: str, sender_lat: float, sender_lng: float,
                                  receiver_lat: float, receiver_lng: float):
         """Log OSRM API call and response"""
-        import httpx
-        start_time = time.time()
+        from core.http import http_client
+        from api.services.route_cache import route_cache
         
-        try:
-            async with httpx.AsyncClient() as client:
-                url = f"http://router.project-osrm.org/route/v1/driving/{sender_lng},{sender_lat};{receiver_lng},{receiver_lat}"
-                response = await client.get(
-                    url,
-                    params={"overview": "full", "geometries": "geojson"},
-                    timeout=3.0
+        async def fetch():
+            start_time = time.time()
+            url = f"http://router.project-osrm.org/route/v1/driving/{sender_lng},{sender_lat};{receiver_lng},{receiver_lat}"
+            response = await http_client.get(
+                url,
+                params={"overview": "full", "geometries": "polyline"},
+                deadline=3.0
+            )
+            response_time = time.time() - start_time
+            
+            if order_id:
+                await DataLogger.log_api_call(
+                    order_id=order_id,
+                    api_name="OSRM",
+                    endpoint=url,
+                    request_params={"start": f"{sender_lng},{sender_lat}", "end": f"{receiver_lng},{receiver_lat}"},
+                    response_data=response.json() if response.status_code == 200 else {},
+                    response_time=response_time,
+                    status_code=response.status_code
                 )
-                response_time = time.time() - start_time
-                
-                if order_id:
-                    await DataLogger.log_api_call(
-                        order_id=order_id,
-                        api_name="OSRM",
-                        endpoint=url,
-                        request_params={"start": f"{sender_lng},{sender_lat}", "end": f"{receiver_lng},{receiver_lat}"},
-                        response_data=response.json() if response.status_code == 200 else {},
-                        response_time=response_time,
-                        status_code=response.status_code
-                    )
-                
-                return response.json() if response.status_code == 200 else None
+            
+            return response.json() if response.status_code == 200 else None
+        
+        try:
+            # Repeated lookups are answered from the route cache and are not logged as API calls
+            return await route_cache.get_or_fetch(
+                [{"lat": sender_lat, "lng": sender_lng}, {"lat": receiver_lat, "lng": receiver_lng}],
+                "osrm-raw:driving:polyline",
+                fetch,
+                cacheable=lambda data: bool(data) and data.get("code") == "Ok"
+            )
         except Exception as e:
             print(f"Route API logging error: {e}")
             return None
     
     @staticmethod
     async def log_weather_api_call(order_id: str, lat: float, lng: float):
-        """Log weather API call and response"""
-        import httpx
+        """Log weather lookup (served from the shared weather cache) and response"""
+        from api.services.weather import weather_provider, OPEN_METEO_URL
         start_time = time.time()
         
         try:
-            async with httpx.AsyncClient() as client:
-                url = f"https://api.open-meteo.com/v1/forecast"
-                response = await client.get(
-                    url,
-                    params={
-                        "latitude": lat,
-                        "longitude": lng,
-                        "current": "temperature_2m,weather_code,wind_speed_10m"
-                    },
-                    timeout=3.0
-                )
-                response_time = time.time() - start_time
-                
-                await DataLogger.log_api_call(
-                    order_id=order_id,
-                    api_name="OpenMeteo",
-                    endpoint=url,
-                    request_params={"lat": lat, "lng": lng},
-                    response_data=response.json() if response.status_code == 200 else {},
-                    response_time=response_time,
-                    status_code=response.status_code
-                )
-                
-                return response.json() if response.status_code == 200 else None
+            entry = await weather_provider.get_entry(lat, lng)
+            response_time = time.time() - start_time
+            data = {"current": entry["current"]} if entry else None
+            
+            await DataLogger.log_api_call(
+                order_id=order_id,
+                api_name="OpenMeteo",
+                endpoint=OPEN_METEO_URL,
+                request_params={"lat": lat, "lng": lng,
+                                "geohash": entry["geohash"] if entry else None,
+                                "cached": entry["cached"] if entry else False},
+                response_data=data or {},
+                response_time=response_time,
+                status_code=200 if entry else 503
+            )
+            
+            return data
         except Exception as e:
             print(f"Weather API logging error: {e}")
             return None
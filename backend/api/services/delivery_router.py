@@ -1,4 +1,6 @@
-import httpx
+import asyncio
+from core.geo import haversine
+from core.http import http_client
 
 class DeliveryRouter:
     """Determines if delivery is intra-city or inter-city and routes to appropriate workflow"""
@@ -8,12 +10,7 @@ class DeliveryRouter:
         """Detect if addresses are in same city or different cities"""
         
         # Calculate distance first
-        from math import radians, sin, cos, sqrt, atan2
-        R = 6371
-        dlat = radians(receiver_lat - sender_lat)
-        dlon = radians(receiver_lng - sender_lng)
-        a = sin(dlat/2)**2 + cos(radians(sender_lat)) * cos(radians(receiver_lat)) * sin(dlon/2)**2
-        distance = R * 2 * atan2(sqrt(a), sqrt(1-a))
+        distance = haversine(sender_lat, sender_lng, receiver_lat, receiver_lng)
         
         # If distance < 30km, assume intra-city (same city)
         if distance < 30:
@@ -26,36 +23,34 @@ class DeliveryRouter:
         
         # For longer distances, check city names
         try:
-            async with httpx.AsyncClient() as client:
-                sender_response = await client.get(
-                    f"https://nominatim.openstreetmap.org/reverse",
+            sender_response, receiver_response = await asyncio.gather(
+                http_client.get(
+                    "https://nominatim.openstreetmap.org/reverse",
                     params={"lat": sender_lat, "lon": sender_lng, "format": "json"},
-                    headers={"User-Agent": "DeliveryApp/1.0"},
-                    timeout=3.0
-                )
-                
-                receiver_response = await client.get(
-                    f"https://nominatim.openstreetmap.org/reverse",
+                    deadline=3.0
+                ),
+                http_client.get(
+                    "https://nominatim.openstreetmap.org/reverse",
                     params={"lat": receiver_lat, "lon": receiver_lng, "format": "json"},
-                    headers={"User-Agent": "DeliveryApp/1.0"},
-                    timeout=3.0
+                    deadline=3.0
                 )
+            )
+            
+            if sender_response.status_code == 200 and receiver_response.status_code == 200:
+                sender_data = sender_response.json()
+                receiver_data = receiver_response.json()
+                
+                sender_city = sender_data.get('address', {}).get('city') or sender_data.get('address', {}).get('town') or "Unknown"
+                receiver_city = receiver_data.get('address', {}).get('city') or receiver_data.get('address', {}).get('town') or "Unknown"
+                
+                is_same_city = sender_city.lower() == receiver_city.lower()
                 
-                if sender_response.status_code == 200 and receiver_response.status_code == 200:
-                    sender_data = sender_response.json()
-                    receiver_data = receiver_response.json()
-                    
-                    sender_city = sender_data.get('address', {}).get('city') or sender_data.get('address', {}).get('town') or "Unknown"
-                    receiver_city = receiver_data.get('address', {}).get('city') or receiver_data.get('address', {}).get('town') or "Unknown"
-                    
-                    is_same_city = sender_city.lower() == receiver_city.lower()
-                    
-                    return {
-                        "type": "intra_city" if is_same_city else "inter_city",
-                        "sender_city": sender_city,
-                        "receiver_city": receiver_city,
-                        "distance": distance
-                    }
+                return {
+                    "type": "intra_city" if is_same_city else "inter_city",
+                    "sender_city": sender_city,
+                    "receiver_city": receiver_city,
+                    "distance": distance
+                }
         except Exception as e:
             print(f"City detection error: {e}")
         
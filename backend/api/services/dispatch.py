@@ -0,0 +1,274 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.config import settings
+from api.services.fleet_snapshot import FleetSnapshot, ultimate_scores
+from core.fleet_rules import get_city_coordinates, get_max_orders_for_vehicle
+from core.geo import distances_from
+from core.store import orders_db, drivers_db
+
+INFEASIBLE = 1e6  # cost of an order/driver pair that violates a constraint
+MAX_SCORE = 100.0  # calculate_ultimate_driver_score is bounded by 100
+CANDIDATES_PER_ORDER = 20  # best drivers per order kept for the matching step
+NEARBY_CITY_KM = 100  # other-city drivers further than this are never offered a pickup (as in assign_best_driver)
+
+
+def solve_assignment(cost: np.ndarray) -> List[Tuple[int, int]]:
+    """Min-cost rectangular assignment (Hungarian method, shortest augmenting paths).
+
+    Returns (row, col) pairs; every row is matched when rows <= cols, otherwise
+    every column is. The inner relaxation runs over all columns with NumPy, so
+    the Python loop is O(rows^2) for an O(rows^2 * cols) solve.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.size == 0:
+        return []
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=np.int64)  # match[j] = row (1-based) assigned to column j
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+
+            u[match[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+
+    pairs = [(int(match[j]) - 1, j - 1) for j in range(1, m + 1) if match[j]]
+    if transposed:
+        pairs = [(col, row) for row, col in pairs]
+    return sorted(pairs)
+
+
+def _rejected_drivers(order: dict) -> set:
+    return {h["driver_id"] for h in order.get("assignment_history", []) if not h.get("accepted")}
+
+
+def _outstanding_offers() -> Dict[str, Tuple[int, float]]:
+    """Per driver: number and total weight of orders offered but not yet accepted"""
+    offers: Dict[str, Tuple[int, float]] = {}
+    for order in orders_db.find("status", "pending_acceptance"):
+        driver_id = order.get("assigned_driver")
+        if driver_id:
+            count, weight = offers.get(driver_id, (0, 0.0))
+            offers[driver_id] = (count + 1, weight + (order.get("weight", 0) or 0))
+    return offers
+
+
+def out_of_range(orders: List[dict], fleet: FleetSnapshot) -> np.ndarray:
+    """orders x drivers mask of drivers outside the pickup city and more than NEARBY_CITY_KM away"""
+    lat = np.where(np.isnan(fleet.lat), fleet.home_lat, fleet.lat)
+    lng = np.where(np.isnan(fleet.lng), fleet.home_lng, fleet.lng)
+    mask = np.zeros((len(orders), len(fleet)), dtype=bool)
+    by_city: Dict[str, np.ndarray] = {}
+    for i, order in enumerate(orders):
+        city = order["pickup_city"].lower()
+        if city not in by_city:
+            pickup = get_city_coordinates(order["pickup_city"])
+            by_city[city] = ~fleet.in_city(city) & (distances_from(pickup["lat"], pickup["lng"], lat, lng) > NEARBY_CITY_KM)
+        mask[i] = by_city[city]
+    return mask
+
+
+def build_score_matrix(orders: List[dict], fleet: FleetSnapshot) -> np.ndarray:
+    """orders x drivers matrix of calculate_ultimate_driver_score, one vectorized row per order"""
+    return np.vstack([ultimate_scores(fleet, order, get_city_coordinates(order["pickup_city"])) for order in orders])
+
+
+class DispatchEngine:
+    """Windowed batch dispatcher matching pending orders to drivers globally.
+
+    Orders waiting in ``pending_assignment`` are collected every window and
+    matched in one min-cost assignment over calculate_ultimate_driver_score,
+    respecting per-vehicle order limits and weight capacity, instead of
+    greedily one order at a time.
+    """
+
+    def __init__(self, window_seconds: float = 2.0, max_batch: int = 500):
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self._queued_at: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._started = time.monotonic()
+        self._latencies = deque(maxlen=1000)
+        self._solve_times = deque(maxlen=200)
+        self.metrics = {
+            "windows": 0,
+            "orders_seen": 0,
+            "orders_assigned": 0,
+            "orders_unassigned": 0,
+            "last_window": None
+        }
+        orders_db.add_listener(self.on_order_change)
+
+    def on_order_change(self, event: str, order: dict, field: Optional[str], old, new) -> None:
+        """Forget queued orders that leave pending_assignment some other way (assigned, cancelled, removed)"""
+        if event == "remove" or (field == "status" and new != "pending_assignment"):
+            self._queued_at.pop(order["id"], None)
+
+    def submit(self, order_id: str) -> None:
+        """Queue an order for the next dispatch window"""
+        self._queued_at.setdefault(order_id, time.monotonic())
+
+    def _pending_orders(self) -> List[dict]:
+        pending = orders_db.find("status", "pending_assignment")
+        for order in pending:
+            self.submit(order["id"])
+        pending.sort(key=lambda o: self._queued_at[o["id"]])
+        return pending[:self.max_batch]
+
+    def run_window(self) -> dict:
+        """Match every pending order in one global assignment"""
+        started = time.perf_counter()
+        orders = self._pending_orders()
+        offers = _outstanding_offers()
+        drivers = [d for d in drivers_db.find_in("status", ["available", "busy"])
+                   if len(d["current_orders"]) + offers.get(d["id"], (0, 0.0))[0]
+                   < get_max_orders_for_vehicle(d["vehicle_type"])]
+
+        assignments = []
+        if orders and drivers:
+            fleet = FleetSnapshot(drivers)
+            score = build_score_matrix(orders, fleet)
+            cost = MAX_SCORE - score
+
+            # Hard constraints: weight capacity (including offers awaiting acceptance), distance
+            # to the pickup city and drivers who already rejected the order
+            offered_count = np.array([offers.get(d["id"], (0, 0.0))[0] for d in drivers], dtype=np.float64)
+            load = fleet.load_weight + np.array([offers.get(d["id"], (0, 0.0))[1] for d in drivers])
+            capacity = fleet.capacity
+            weight = np.array([o.get("weight", 0) for o in orders], dtype=np.float64)
+            cost[load[None, :] + weight[:, None] > capacity[None, :]] = INFEASIBLE
+            cost[out_of_range(orders, fleet)] = INFEASIBLE
+            driver_column = {d["id"]: j for j, d in enumerate(drivers)}
+            for i, order in enumerate(orders):
+                for driver_id in _rejected_drivers(order):
+                    if driver_id in driver_column:
+                        cost[i, driver_column[driver_id]] = INFEASIBLE
+
+            # Keep the best candidates per order, then give each driver one column per free slot
+            keep = min(CANDIDATES_PER_ORDER, len(drivers))
+            top = np.argpartition(cost, keep - 1, axis=1)[:, :keep]
+            wanted = np.bincount(top.ravel(), minlength=len(drivers))
+            slots = (fleet.vehicle_table(get_max_orders_for_vehicle) - fleet.order_count - offered_count).astype(np.int64)
+            slots = np.minimum(slots, wanted)
+            columns = np.repeat(np.arange(len(drivers)), slots)
+
+            for i, col in solve_assignment(cost[:, columns]):
+                j = int(columns[col])
+                if cost[i, j] < INFEASIBLE:
+                    assignments.append((i, j))
+
+            # Several orders can land on one driver: re-check cumulative weight
+            assignments.sort(key=lambda pair: cost[pair])
+            for i, j in list(assignments):
+                if load[j] + weight[i] > capacity[j]:
+                    assignments.remove((i, j))
+                else:
+                    load[j] += weight[i]
+
+            now = time.monotonic()
+            for i, j in assignments:
+                order, driver = orders[i], drivers[j]
+                self._latencies.append(now - self._queued_at.pop(order["id"], now))
+                order["assigned_driver"] = driver["id"]
+                order["status"] = "pending_acceptance"
+                order["assignment_attempts"] = order.get("assignment_attempts", 0) + 1
+                order["assignment_method"] = "batch_dispatch"
+                order["assignment_score"] = float(score[i, j])
+
+        elapsed = time.perf_counter() - started
+        self._solve_times.append(elapsed)
+        self.metrics["windows"] += 1
+        self.metrics["orders_seen"] += len(orders)
+        self.metrics["orders_assigned"] += len(assignments)
+        self.metrics["orders_unassigned"] = len(orders) - len(assignments)
+        self.metrics["last_window"] = {
+            "orders": len(orders),
+            "drivers": len(drivers),
+            "assigned": len(assignments),
+            "total_score": round(float(sum(score[i, j] for i, j in assignments)), 2) if assignments else 0,
+            "solve_ms": round(elapsed * 1000, 2),
+            "at": datetime.now().isoformat()
+        }
+        return self.metrics["last_window"]
+
+    async def run(self) -> None:
+        """Dispatch loop: one window every window_seconds"""
+        while True:
+            await asyncio.sleep(self.window_seconds)
+            try:
+                self.run_window()
+            except Exception as e:
+                print(f"❌ Dispatch window failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_metrics(self) -> dict:
+        """Throughput and latency of the dispatcher"""
+        uptime = time.monotonic() - self._started
+        latencies = np.array(self._latencies) if self._latencies else None
+        solves = np.array(self._solve_times) if self._solve_times else None
+        return {
+            **self.metrics,
+            "running": self._task is not None and not self._task.done(),
+            "window_seconds": self.window_seconds,
+            "queued": len(self._queued_at),
+            "throughput_orders_per_min": round(self.metrics["orders_assigned"] / uptime * 60, 2) if uptime else 0,
+            "assignment_latency_s": {
+                "p50": round(float(np.percentile(latencies, 50)), 3),
+                "p95": round(float(np.percentile(latencies, 95)), 3),
+                "max": round(float(latencies.max()), 3)
+            } if latencies is not None else None,
+            "solve_ms": {
+                "p50": round(float(np.percentile(solves, 50)) * 1000, 2),
+                "p95": round(float(np.percentile(solves, 95)) * 1000, 2)
+            } if solves is not None else None
+        }
+
+
+dispatch_engine = DispatchEngine(window_seconds=settings.DISPATCH_WINDOW_SECONDS)
@@ -0,0 +1,134 @@
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+from api.services.route_plan import route_plans
+from core import json_patch
+from core.config import settings
+from core.geo import point_distance
+from core.store import IndexedStore, orders_db, drivers_db
+
+# Order fields written by location tracking; the driver's own movement is handled by distance
+TRACKING_FIELDS = ("current_location", "route_history")
+
+
+class DriverRouteCache:
+    """Computed route responses per driver, valid for one route version.
+
+    A driver's version bumps when one of their orders changes (status,
+    assignment or details), when the driver record changes, or when the
+    driver has moved more than ``move_threshold_m`` since the last bump. The
+    route plan's own version is part of the ETag, so a background re-solve
+    also invalidates. Polls within one version reuse the stored payload,
+    and clients that send the ETag back get a 304.
+    """
+
+    def __init__(self, orders: IndexedStore, drivers: IndexedStore, move_threshold_m: float = 150):
+        self.drivers = drivers
+        self.move_threshold_m = move_threshold_m
+        self._versions: Dict[str, int] = {}
+        self._anchors: Dict[str, dict] = {}
+        self._entries: Dict[Tuple[str, str], dict] = {}
+        self._lock = threading.RLock()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "bumps": 0, "moves": 0}
+        orders.add_listener(self.on_order_change)
+        drivers.add_listener(self.on_driver_change)
+
+    def bump(self, driver_id: Optional[str]) -> None:
+        """Start a new version for the driver and drop their cached responses"""
+        if not driver_id:
+            return
+        with self._lock:
+            self._versions[driver_id] = self._versions.get(driver_id, 0) + 1
+            self._anchors.pop(driver_id, None)
+            for key in [k for k in self._entries if k[0] == driver_id]:
+                del self._entries[key]
+            self.stats["bumps"] += 1
+
+    def on_order_change(self, event: str, record, field, old, new) -> None:
+        if event == "update" and field in TRACKING_FIELDS:
+            return
+        self.bump(record.get("assigned_driver"))
+        if field == "assigned_driver" and old:
+            self.bump(old)
+
+    def on_driver_change(self, event: str, record, field, old, new) -> None:
+        if event == "update" and field == "current_location":
+            return
+        self.bump(record.get("id"))
+
+    def _check_movement(self, driver: dict) -> None:
+        location = driver.get("current_location") or {}
+        if "lat" not in location or "lng" not in location:
+            return
+        anchor = self._anchors.get(driver["id"])
+        if anchor is None:
+            self._anchors[driver["id"]] = {"lat": location["lat"], "lng": location["lng"]}
+        elif point_distance(anchor, location) * 1000 > self.move_threshold_m:
+            self.bump(driver["id"])
+            self.stats["moves"] += 1
+            self._anchors[driver["id"]] = {"lat": location["lat"], "lng": location["lng"]}
+
+    def etag(self, driver_id: str, key: str) -> str:
+        plan = route_plans.get_plan(driver_id)
+        plan_version = plan["version"] if plan else 0
+        return f'W/"{key}-{driver_id}-{self._versions.get(driver_id, 0)}.{plan_version}"'
+
+    def lookup(self, driver: dict, key: str) -> Tuple[str, Optional[dict]]:
+        """(current ETag, cached payload or None) for one of the driver's responses"""
+        with self._lock:
+            self._check_movement(driver)
+            etag = self.etag(driver["id"], key)
+            entry = self._entries.get((driver["id"], key))
+            if entry and entry["etag"] == etag:
+                self.stats["hits"] += 1
+                return etag, entry["payload"]
+            self.stats["misses"] += 1
+            return etag, None
+
+    def store(self, driver_id: str, key: str, etag: str, payload: dict) -> dict:
+        """Keep a payload computed under ``etag`` unless the version moved on meanwhile.
+
+        The payload is copied to plain JSON first: it may reference live store
+        records, whose later edits must not leak into a body served under this ETag.
+        """
+        payload = json_patch.plain(payload)
+        with self._lock:
+            if self.etag(driver_id, key) == etag:
+                self._entries[(driver_id, key)] = {"etag": etag, "payload": payload}
+        return payload
+
+    def not_modified(self, request: Request, etag: str) -> bool:
+        header = request.headers.get("if-none-match")
+        if not header:
+            return False
+        # Weak comparison, as for GET
+        tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+        if "*" in tags or etag.removeprefix("W/") in tags:
+            self.stats["not_modified"] += 1
+            return True
+        return False
+
+    def serve(self, request: Request, response: Response, driver: dict, key: str,
+              build: Callable[[], dict]):
+        """Conditional GET for a driver route response: 304, cached payload, or build and cache"""
+        etag, payload = self.lookup(driver, key)
+        if self.not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        if payload is None:
+            payload = self.store(driver["id"], key, etag, build())
+        response.headers["ETag"] = etag
+        return payload
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0,
+            "cached_responses": len(self._entries),
+            "move_threshold_m": self.move_threshold_m
+        }
+
+
+driver_route_cache = DriverRouteCache(orders_db, drivers_db, move_threshold_m=settings.DRIVER_ROUTE_MOVE_THRESHOLD_METERS)
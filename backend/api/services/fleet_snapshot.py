@@ -0,0 +1,135 @@
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from core.driver_load import current_load
+from core.fleet_rules import get_city_coordinates, get_enhanced_vehicle_score, get_max_orders_for_vehicle
+from core.geo import distances_from
+
+STATUS_CODES = {"available": 0, "busy": 1, "online": 2, "offline": 3}
+OTHER_STATUS = len(STATUS_CODES)
+
+SPECIALTY_BITS = {
+    name: 1 << bit for bit, name in enumerate([
+        "express_delivery", "fast_delivery", "fragile_items", "heavy_cargo",
+        "inter_city", "city_center", "residential"
+    ])
+}
+
+
+class FleetSnapshot:
+    """Columnar copy of a driver list for vectorized scoring.
+
+    Each attribute the scorers read becomes one NumPy array (index i is
+    ``drivers[i]``); vehicle types and cities are integer codes and specialties
+    a bitmask, so a whole fleet is scored with array expressions. Missing live
+    coordinates are NaN so each scorer can apply its own fallback.
+    """
+
+    def __init__(self, drivers: List[dict]):
+        self.drivers = list(drivers)
+        n = len(self.drivers)
+
+        self.vehicle_types = sorted({d.get("vehicle_type", "bike") for d in self.drivers})
+        vehicle_index = {vt: i for i, vt in enumerate(self.vehicle_types)}
+        self.cities = sorted({(d.get("assigned_city") or "").lower() for d in self.drivers})
+        city_index = {city: i for i, city in enumerate(self.cities)}
+
+        self.lat = np.empty(n)
+        self.lng = np.empty(n)
+        self.has_location = np.zeros(n, dtype=bool)
+        self.home_lat = np.empty(n)
+        self.home_lng = np.empty(n)
+        self.city_code = np.empty(n, dtype=np.int64)
+        self.vehicle_code = np.empty(n, dtype=np.int64)
+        self.status_code = np.empty(n, dtype=np.int64)
+        self.specialties = np.zeros(n, dtype=np.int64)
+        self.rating = np.empty(n)
+        self.total_deliveries = np.empty(n)
+        self.order_count = np.empty(n)
+        self.load_weight = np.empty(n)
+        self.capacity = np.empty(n)
+
+        home_cache: Dict[str, dict] = {}
+        for i, d in enumerate(self.drivers):
+            city = (d.get("assigned_city") or "").lower()
+            if city not in home_cache:
+                home_cache[city] = get_city_coordinates(city)
+            home = home_cache[city]
+            location = d.get("current_location") or {}
+
+            self.has_location[i] = bool(location)
+            self.lat[i] = location.get("lat", np.nan)
+            self.lng[i] = location.get("lng", np.nan)
+            self.home_lat[i] = home["lat"]
+            self.home_lng[i] = home["lng"]
+            self.city_code[i] = city_index[city]
+            self.vehicle_code[i] = vehicle_index[d.get("vehicle_type", "bike")]
+            self.status_code[i] = STATUS_CODES.get(d.get("status"), OTHER_STATUS)
+            mask = 0
+            for specialty in d.get("specialties", []):
+                mask |= SPECIALTY_BITS.get(specialty, 0)
+            self.specialties[i] = mask
+            self.rating[i] = d.get("rating", 4.0)
+            self.total_deliveries[i] = d.get("total_deliveries", 0)
+            self.order_count[i] = len(d.get("current_orders", []))
+            self.load_weight[i] = current_load(d)["weight"]
+            self.capacity[i] = d.get("vehicle_capacity", 50)
+
+    def __len__(self) -> int:
+        return len(self.drivers)
+
+    def vehicle_table(self, fn: Callable[[str], float]) -> np.ndarray:
+        """Per-driver values of a function of the vehicle type (called once per type)"""
+        return np.array([fn(vt) for vt in self.vehicle_types], dtype=np.float64)[self.vehicle_code]
+
+    def has_specialty(self, name: str) -> np.ndarray:
+        return (self.specialties & SPECIALTY_BITS[name]) != 0
+
+    def in_city(self, city: str) -> np.ndarray:
+        city = city.lower()
+        if city not in self.cities:
+            return np.zeros(len(self), dtype=bool)
+        return self.city_code == self.cities.index(city)
+
+    def status_in(self, statuses: List[str]) -> np.ndarray:
+        return np.isin(self.status_code, [STATUS_CODES.get(s, -1) for s in statuses])
+
+
+def specialty_bonus(fleet: FleetSnapshot, order: dict) -> np.ndarray:
+    """Vectorized calculate_enhanced_specialty_bonus"""
+    bonus = np.zeros(len(fleet))
+    if order.get("service_type") == "express":
+        bonus += np.where(fleet.has_specialty("express_delivery"), 3,
+                          np.where(fleet.has_specialty("fast_delivery"), 2, 0))
+    if order.get("fragile"):
+        bonus += np.where(fleet.has_specialty("fragile_items"), 2, 0)
+    if order.get("weight", 0) > 20:
+        bonus += np.where(fleet.has_specialty("heavy_cargo"), 2, 0)
+    if order.get("is_inter_city"):
+        bonus += np.where(fleet.has_specialty("inter_city"), 3, 0)
+    bonus += np.where(fleet.has_specialty("city_center"), 0.5, 0)
+    bonus += np.where(fleet.has_specialty("residential"), 0.5, 0)
+    return np.minimum(5, bonus)
+
+
+def ultimate_scores(fleet: FleetSnapshot, order: dict, pickup_coords: dict) -> np.ndarray:
+    """calculate_ultimate_driver_score for every driver of the snapshot at once"""
+    lat, lng = pickup_coords["lat"], pickup_coords["lng"]
+    same_city = fleet.in_city(order["pickup_city"])
+    live_km = distances_from(lat, lng, np.where(np.isnan(fleet.lat), fleet.home_lat, fleet.lat),
+                             np.where(np.isnan(fleet.lng), fleet.home_lng, fleet.lng))
+    home_km = distances_from(lat, lng, fleet.home_lat, fleet.home_lng)
+    location = np.where(same_city, np.maximum(10, 50 - live_km * 5), np.maximum(0, 20 - home_km * 0.2))
+
+    max_orders = fleet.vehicle_table(get_max_orders_for_vehicle)
+    availability = np.select(
+        [fleet.status_code == STATUS_CODES["available"], fleet.status_code == STATUS_CODES["busy"]],
+        [20, np.maximum(5, 15 - fleet.order_count / max_orders * 10)],
+        default=0
+    )
+
+    vehicle = np.minimum(15, fleet.vehicle_table(lambda vt: get_enhanced_vehicle_score(vt, order)))
+    rating = fleet.rating / 5.0 * 10
+
+    return np.round(location + availability + vehicle + rating + specialty_bonus(fleet, order), 2)
@@ -0,0 +1,245 @@
+import asyncio
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from api.services.local_search import EPSILON, build_matrix, route_cost
+from api.services.pickup_delivery import PickupDeliverySolver
+from core.config import settings
+
+
+def solve_city(problem: Dict) -> Dict:
+    """Split one city's pending orders across its drivers; runs in a worker process.
+
+    ``problem`` is plain data so it pickles cheaply:
+    {"city", "time_budget", "vehicles": [{"id", "start", "max_orders", "capacity",
+    "stops": [{"type", "order_id", "location", "weight"}]}], "orders": [{"id",
+    "pickup", "delivery", "weight"}]}. A vehicle's ``stops`` are the work it
+    already has, in plan order; they stay on that vehicle.
+
+    Orders are placed by regret insertion (the order that would lose most by
+    not getting its best vehicle goes first), then moved between vehicles
+    while that shortens the fleet's total distance and the budget lasts.
+    """
+    started = time.perf_counter()
+    deadline = started + problem["time_budget"]
+    vehicles, orders = problem["vehicles"], problem["orders"]
+
+    locations, nodes, routes, own_requests = [], [], [], []
+    for vehicle in vehicles:
+        route = [len(locations)]
+        locations.append(vehicle["start"])
+        nodes.append({"type": "start", "order_id": None})
+        pickups, requests = {}, []
+        for stop in vehicle["stops"]:
+            node = len(locations)
+            locations.append(stop["location"])
+            nodes.append({"type": stop["type"], "order_id": stop["order_id"]})
+            route.append(node)
+            if stop["type"] == "pickup":
+                pickups[stop["order_id"]] = node
+            else:
+                requests.append((pickups.get(stop["order_id"]), node, stop.get("weight", 0) or 0))
+        routes.append(route)
+        own_requests.append(requests)
+
+    order_requests = []
+    for order in orders:
+        node = len(locations)
+        locations += [order["pickup"], order["delivery"]]
+        nodes += [{"type": "pickup", "order_id": order["id"]}, {"type": "delivery", "order_id": order["id"]}]
+        order_requests.append((node, node + 1, order.get("weight", 0) or 0))
+
+    dist = build_matrix(locations)
+    solvers = [PickupDeliverySolver(dist, own + order_requests, capacity=vehicle.get("capacity"))
+               for vehicle, own in zip(vehicles, own_requests)]
+    slots = [vehicle["max_orders"] - len({s["order_id"] for s in vehicle["stops"]}) for vehicle in vehicles]
+
+    def best(v: int, r: int, route: Optional[List[int]] = None):
+        if route is None and slots[v] <= 0:
+            return None
+        return solvers[v].best_insertion(routes[v] if route is None else route, order_requests[r])
+
+    # Regret insertion; only the vehicle that changed is re-evaluated after each step
+    table = {r: [best(v, r) for v in range(len(vehicles))] for r in range(len(orders))}
+    assignment: Dict[int, int] = {}
+    pending = set(table)
+    while pending:
+        chosen = None
+        for r in pending:
+            costs = sorted(option[0] for option in table[r] if option is not None)
+            if not costs:
+                continue
+            regret = (costs[1] if len(costs) > 1 else math.inf) - costs[0]
+            key = (regret, -costs[0])
+            if chosen is None or key > chosen[0]:
+                chosen = (key, r)
+        if chosen is None:
+            break
+        r = chosen[1]
+        v = min((v for v, option in enumerate(table[r]) if option is not None), key=lambda v: table[r][v][0])
+        _, i, j = table[r][v]
+        PickupDeliverySolver._insert(routes[v], order_requests[r], i, j)
+        slots[v] -= 1
+        assignment[r] = v
+        pending.discard(r)
+        for q in pending:
+            table[q][v] = best(v, q)
+    constructed = sum(route_cost(dist, route) for route in routes)
+
+    # Relocate orders between (or within) vehicles until nothing improves or time runs out
+    passes = relocations = 0
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        passes += 1
+        for r, v in list(assignment.items()):
+            if time.perf_counter() >= deadline:
+                break
+            pickup, delivery, _ = order_requests[r]
+            reduced = [node for node in routes[v] if node != pickup and node != delivery]
+            saving = route_cost(dist, routes[v]) - route_cost(dist, reduced)
+            move = None
+            for w in range(len(vehicles)):
+                found = best(w, r, reduced) if w == v else best(w, r)
+                if found is not None and found[0] < saving - EPSILON and (move is None or found[0] < move[0]):
+                    move = (found[0], w, found[1], found[2])
+            if move is None:
+                continue
+            _, w, i, j = move
+            routes[v] = reduced
+            PickupDeliverySolver._insert(routes[w], order_requests[r], i, j)
+            slots[v] += 1
+            slots[w] -= 1
+            assignment[r] = w
+            relocations += 1
+            improved = True
+
+    final = sum(route_cost(dist, route) for route in routes)
+    elapsed = time.perf_counter() - started
+    return {
+        "city": problem["city"],
+        "routes": [
+            {
+                "driver_id": vehicle["id"],
+                "orders": [orders[r]["id"] for r, v in sorted(assignment.items()) if v == index],
+                "stops": [{**nodes[node], "location": locations[node]} for node in route[1:]],
+                "distance_km": round(route_cost(dist, route), 3)
+            }
+            for index, (vehicle, route) in enumerate(zip(vehicles, routes))
+        ],
+        "unassigned": [orders[r]["id"] for r in sorted(pending)],
+        "stats": {
+            "orders": len(orders),
+            "vehicles": len(vehicles),
+            "assigned": len(assignment),
+            "construction_km": round(constructed, 3),
+            "final_km": round(final, 3),
+            "passes": passes,
+            "relocations": relocations,
+            "solve_ms": round(elapsed * 1000, 1),
+            "time_budget_ms": round(problem["time_budget"] * 1000, 1),
+            "budget_exhausted": elapsed >= problem["time_budget"],
+            "worker_pid": os.getpid()
+        }
+    }
+
+
+class FleetOptimizer:
+    """Fleet-wide routing of pending orders, one process-pool task per city.
+
+    Each city is an independent multi-vehicle pickup-and-delivery problem, so
+    cities solve in parallel without sharing the GIL. The pool is created on
+    first use and shut down with the app.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, time_budget: float = 2.0, grace: float = 30.0):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.time_budget = time_budget
+        self.grace = grace
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.stats = {"runs": 0, "cities_solved": 0, "cities_failed": 0}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def build_problems(self, orders: Iterable[Dict], drivers: Iterable[Dict], cities: Optional[List[str]] = None,
+                       time_budget: Optional[float] = None) -> List[Dict]:
+        """One problem per city that has both pending same-city orders and available drivers.
+
+        Inter-city orders go through the warehouse flow and are left out.
+        """
+        from api.services.multi_package_optimizer import MultiPackageOptimizer
+        from api.services.route_plan import route_plans
+
+        optimizer = MultiPackageOptimizer()
+        wanted = {city.lower() for city in cities} if cities else None
+        problems: Dict[str, Dict] = {}
+        for order in orders:
+            city = order.get("pickup_city", "")
+            if order.get("assigned_driver") or city.lower() != order.get("delivery_city", "").lower():
+                continue
+            if wanted is not None and city.lower() not in wanted:
+                continue
+            problem = problems.setdefault(city.lower(), {"city": city, "vehicles": [], "orders": [],
+                                                         "time_budget": time_budget or self.time_budget})
+            problem["orders"].append({
+                "id": order["id"],
+                "pickup": optimizer._get_coordinates(order["pickup_address"], order["pickup_city"]),
+                "delivery": optimizer._get_coordinates(order["delivery_address"], order["delivery_city"]),
+                "weight": order.get("weight", 0) or 0
+            })
+
+        for driver in drivers:
+            problem = problems.get((driver.get("assigned_city") or "").lower())
+            if problem is None:
+                continue
+            plan = route_plans.get_plan(driver["id"])
+            location = driver["current_location"]
+            problem["vehicles"].append({
+                "id": driver["id"],
+                "start": {"lat": location["lat"], "lng": location["lng"]},
+                "max_orders": optimizer._get_max_capacity(driver["vehicle_type"]),
+                "capacity": driver.get("vehicle_capacity"),
+                "stops": [
+                    {"type": stop["type"], "order_id": stop["order_id"], "location": dict(stop["location"]),
+                     "weight": stop["order"].get("weight", 0) or 0}
+                    for stop in (plan["stops"] if plan else [])
+                ]
+            })
+        return [problem for problem in problems.values() if problem["vehicles"]]
+
+    async def optimize(self, problems: List[Dict]) -> List[Dict]:
+        """Solve every city concurrently; a city that fails or overruns reports an error instead"""
+        loop = asyncio.get_running_loop()
+        pool = self._pool()
+
+        async def run(problem: Dict) -> Dict:
+            try:
+                result = await asyncio.wait_for(loop.run_in_executor(pool, solve_city, problem),
+                                                problem["time_budget"] + self.grace)
+                self.stats["cities_solved"] += 1
+                return result
+            except Exception as e:
+                self.stats["cities_failed"] += 1
+                return {"city": problem["city"], "error": str(e) or type(e).__name__}
+
+        self.stats["runs"] += 1
+        return await asyncio.gather(*(run(problem) for problem in problems))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "max_workers": self.max_workers, "time_budget": self.time_budget,
+                "pool_started": self._executor is not None}
+
+
+fleet_optimizer = FleetOptimizer(max_workers=settings.FLEET_VRP_WORKERS or None,
+                                 time_budget=settings.FLEET_VRP_TIME_BUDGET_SECONDS)
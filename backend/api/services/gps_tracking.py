@@ -3,6 +3,7 @@ import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from core.websocket import manager
+from core.geo import point_distance
 from api.models.tracking import TrackingEvent
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
@@ -130,26 +131,8 @@ class GPSTrackingService:
         return events
     
     def _calculate_distance(self, loc1: Dict, loc2: Dict) -> float:
-        """Calculate distance between two GPS coordinates (Haversine formula)"""
-        import math
-        
-        lat1, lon1 = loc1.get("lat", 0), loc1.get("lng", 0)
-        lat2, lon2 = loc2.get("lat", 0), loc2.get("lng", 0)
-        
-        R = 6371000  # Earth radius in meters
-        
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        delta_lat = math.radians(lat2 - lat1)
-        delta_lon = math.radians(lon2 - lon1)
-        
-        a = (math.sin(delta_lat/2) * math.sin(delta_lat/2) + 
-             math.cos(lat1_rad) * math.cos(lat2_rad) * 
-             math.sin(delta_lon/2) * math.sin(delta_lon/2))
-        
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        
-        return R * c
+        """Calculate distance between two GPS coordinates in meters"""
+        return point_distance(loc1, loc2) * 1000
     
     async def _calculate_eta(self, tracking: Dict, current_location: Dict) -> Dict:
         """Calculate estimated time of arrival"""
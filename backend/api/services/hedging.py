@@ -0,0 +1,163 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from core.config import settings
+
+Attempt = Tuple[str, Callable[[], Awaitable]]
+
+
+class ServerStats:
+    """Rolling latency and outcome counters for one upstream server"""
+
+    def __init__(self, window: int = 200):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.successes = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.wins = 0
+
+    def record(self, ok: bool, latency: float) -> None:
+        self.outcomes.append(ok)
+        if ok:
+            self.successes += 1
+            self.latencies.append(latency)
+        else:
+            self.failures += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def success_rate(self) -> float:
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 1.0
+
+    def expected_latency(self, default: float) -> float:
+        """Median latency inflated by the recent failure rate (lower is better)"""
+        p50 = self.percentile(0.5)
+        return (default if p50 is None else p50) / max(self.success_rate, 0.05)
+
+    def to_dict(self) -> dict:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "successes": self.successes,
+            "failures": self.failures,
+            "cancelled": self.cancelled,
+            "wins": self.wins,
+            "success_rate": round(self.success_rate, 3),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None
+        }
+
+
+class HedgedRequester:
+    """Race equivalent requests against several servers with hedging.
+
+    The fastest server by recent stats goes first. If it has not answered
+    within its own p95 latency (clamped to [min_delay, max_delay]) the next
+    server is started as well; a failure starts the next one immediately.
+    The first successful result wins and the remaining attempts are cancelled.
+    """
+
+    def __init__(self, default_delay: float = 1.0, min_delay: float = 0.1, max_delay: float = 3.0,
+                 deadline: float = 10.0):
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all server stats"""
+        self.servers: Dict[str, ServerStats] = {}
+        self.totals = {"requests": 0, "hedged": 0, "all_failed": 0}
+
+    def _stats(self, name: str) -> ServerStats:
+        if name not in self.servers:
+            self.servers[name] = ServerStats()
+        return self.servers[name]
+
+    def rank(self, names: Sequence[str]) -> List[str]:
+        """Servers ordered by expected latency; unknown servers keep their given order"""
+        position = {name: i for i, name in enumerate(names)}
+        return sorted(names, key=lambda n: (self._stats(n).expected_latency(self.default_delay), position[n]))
+
+    def hedge_delay(self, name: str) -> float:
+        p95 = self._stats(name).percentile(0.95)
+        delay = self.default_delay if p95 is None else p95
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    async def _timed(self, name: str, factory: Callable[[], Awaitable]):
+        start = time.perf_counter()
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            self._stats(name).cancelled += 1
+            raise
+        except Exception:
+            self._stats(name).record(False, time.perf_counter() - start)
+            raise
+        self._stats(name).record(True, time.perf_counter() - start)
+        return result
+
+    async def run(self, attempts: Sequence[Attempt], deadline: Optional[float] = None):
+        """Result of the first attempt to succeed; raises the last error if all fail"""
+        factories = dict(attempts)
+        queue = self.rank([name for name, _ in attempts])
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + (deadline or self.deadline)
+        pending: Dict[asyncio.Task, str] = {}
+        last_error: Exception = RuntimeError("no servers configured")
+        self.totals["requests"] += 1
+
+        def launch() -> float:
+            name = queue.pop(0)
+            pending[asyncio.create_task(self._timed(name, factories[name]))] = name
+            return loop.time() + self.hedge_delay(name)
+
+        try:
+            hedge_at = launch()
+            while pending:
+                now = loop.time()
+                if now >= give_up_at:
+                    raise asyncio.TimeoutError("hedged request deadline exceeded")
+                wake_at = min(hedge_at, give_up_at) if queue else give_up_at
+                done, _ = await asyncio.wait(pending, timeout=max(0.0, wake_at - now),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = pending.pop(task)
+                    if task.exception() is None:
+                        self._stats(name).wins += 1
+                        return task.result()
+                    last_error = task.exception()
+                    print(f"Server {name} failed: {last_error}")
+
+                # Everything in `done` failed here: start the next server now, or hedge on timeout
+                if queue and (done or loop.time() >= hedge_at):
+                    if pending:
+                        self.totals["hedged"] += 1
+                    hedge_at = launch()
+            self.totals["all_failed"] += 1
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        return {
+            **self.totals,
+            "ranking": self.rank(list(self.servers)),
+            "servers": {name: {**stats.to_dict(), "hedge_delay_ms": round(self.hedge_delay(name) * 1000, 1)}
+                        for name, stats in self.servers.items()}
+        }
+
+
+# Shared by every RealTimeRoutingService instance so stats survive across requests
+routing_hedger = HedgedRequester(default_delay=settings.ROUTING_HEDGE_DELAY_SECONDS)
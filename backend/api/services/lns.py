@@ -0,0 +1,156 @@
+import math
+import random
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from api.services.local_search import EPSILON, route_cost
+from api.services.pickup_delivery import PickupDeliverySolver, Request
+
+# Route cost of one minute of lateness, in km
+LATENESS_KM_PER_MIN = 1.0
+
+
+class LargeNeighborhoodSearch:
+    """Anytime ruin-and-recreate search over a PickupDeliverySolver route.
+
+    Each iteration removes a few requests (random, worst-placed, or related to
+    a random seed request) and re-inserts them at their cheapest feasible
+    positions. Candidates are accepted by simulated annealing with a
+    temperature that cools over the wall-clock budget, so the search can be
+    stopped at any time and the best route found so far is always valid.
+    Cost is distance plus lateness against the original windows.
+    """
+
+    def __init__(self, solver: PickupDeliverySolver, seed: Optional[int] = None,
+                 max_remove_share: float = 0.3, start_temperature: float = 0.05, end_temperature: float = 0.001):
+        self.solver = solver
+        self.rng = random.Random(seed)
+        self.max_remove_share = max_remove_share
+        self.start_temperature = start_temperature
+        self.end_temperature = end_temperature
+        self.requests = list(solver.requests)
+        self.stats = {"iterations": 0, "accepted": 0, "improvements": 0, "random": 0, "worst": 0, "related": 0}
+
+    def cost(self, route: List[int]) -> float:
+        km = route_cost(self.solver.dist, route)
+        if self.solver.travel is None:
+            return km
+        _, late = self.solver.lateness(route)
+        return km + LATENESS_KM_PER_MIN * float(late.sum())
+
+    def _fit_windows(self, route: List[int]) -> None:
+        """Allow each stop its lateness in ``route``, but no more, while repairing"""
+        if self.solver.timed:
+            _, begin = self.solver.schedule(route)
+            self.solver.latest = self.solver.due.copy()
+            self.solver.latest[route] = np.maximum(self.solver.due[route], begin)
+
+    # Ruin
+
+    def _remove_random(self, route: List[int], k: int) -> List[Request]:
+        return self.rng.sample(self.requests, k)
+
+    def _remove_worst(self, route: List[int], k: int) -> List[Request]:
+        """Requests whose stops add the most length, with some noise"""
+        d = self.solver.dist
+        position = {node: index for index, node in enumerate(route)}
+
+        def detour(node: int) -> float:
+            index = position[node]
+            prev = route[index - 1]
+            if index + 1 == len(route):
+                return d[prev][node]
+            nxt = route[index + 1]
+            return d[prev][node] + d[node][nxt] - d[prev][nxt]
+
+        scored = sorted(self.requests, reverse=True,
+                        key=lambda r: sum(detour(n) for n in r[:2] if n is not None) * self.rng.uniform(0.7, 1.3))
+        return scored[:k]
+
+    def _remove_related(self, route: List[int], k: int) -> List[Request]:
+        """A random request and the ones whose deliveries are nearest to it"""
+        d = self.solver.dist
+        seed = self.rng.choice(self.requests)
+        return sorted(self.requests, key=lambda r: d[seed[1]][r[1]])[:k]
+
+    # Search
+
+    def run(self, route: List[int], budget: float,
+            on_improvement: Optional[Callable[[Dict], None]] = None,
+            should_stop: Optional[Callable[[], bool]] = None) -> Tuple[List[int], Dict]:
+        """Improve ``route`` for up to ``budget`` seconds; returns the best route and search stats"""
+        started = time.perf_counter()
+        current = list(route)
+        current_cost = best_cost = initial_cost = self.cost(current)
+        best = list(current)
+        cancelled = False
+        operators = (("random", self._remove_random), ("worst", self._remove_worst), ("related", self._remove_related))
+        max_remove = max(1, min(len(self.requests), round(len(self.requests) * self.max_remove_share)))
+
+        while self.requests:
+            elapsed = time.perf_counter() - started
+            if elapsed >= budget:
+                break
+            if should_stop is not None and should_stop():
+                cancelled = True
+                break
+            self.stats["iterations"] += 1
+            progress = elapsed / budget if budget > 0 else 1.0
+            temperature = initial_cost * self.start_temperature * \
+                (self.end_temperature / self.start_temperature) ** progress
+
+            name, remove = self.rng.choice(operators)
+            self.stats[name] += 1
+            removed = remove(current, self.rng.randint(1, max_remove))
+            nodes = {n for r in removed for n in r[:2] if n is not None}
+            self._fit_windows(current)
+            candidate = [node for node in current if node not in nodes]
+            self.rng.shuffle(removed)
+            for request in removed:
+                self.solver.insert(candidate, request)
+            if not self.solver.is_feasible(candidate):
+                continue
+
+            candidate_cost = self.cost(candidate)
+            delta = candidate_cost - current_cost
+            if delta < -EPSILON or (temperature > 0 and self.rng.random() < math.exp(-max(delta, 0) / temperature)):
+                current, current_cost = candidate, candidate_cost
+                self.stats["accepted"] += 1
+                if current_cost < best_cost - EPSILON:
+                    best, best_cost = list(current), current_cost
+                    self.stats["improvements"] += 1
+                    if on_improvement is not None:
+                        on_improvement({"route": best, "cost": round(best_cost, 3),
+                                        "km": round(route_cost(self.solver.dist, best), 3),
+                                        "iteration": self.stats["iterations"],
+                                        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)})
+
+        self.solver.latest = self.solver.due.copy()
+        return best, {
+            **self.stats,
+            "initial_cost": round(initial_cost, 3),
+            "best_cost": round(best_cost, 3),
+            "budget_ms": round(budget * 1000, 1),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "cancelled": cancelled
+        }
+
+
+def search_worker(problem: Dict, budget: float, seed: Optional[int], updates, cancel) -> None:
+    """Process entry point: construct, then search, posting each better route to ``updates``.
+
+    ``problem`` holds the PickupDeliverySolver arguments; ``cancel`` is a
+    multiprocessing Event. The last message carries ``done`` and the stats.
+    """
+    try:
+        solver = PickupDeliverySolver(**problem)
+        route, metrics = solver.solve()
+        search = LargeNeighborhoodSearch(solver, seed=seed)
+        updates.put({"route": route, "cost": round(search.cost(route), 3), "km": metrics["final_km"],
+                     "iteration": 0, "elapsed_ms": metrics["solve_ms"]})
+        _, stats = search.run(route, budget, on_improvement=updates.put, should_stop=cancel.is_set)
+        updates.put({"done": True, "stats": stats})
+    except Exception as e:
+        updates.put({"done": True, "error": str(e)})
@@ -0,0 +1,185 @@
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from core.geo import distance_matrix, to_arrays
+
+EPSILON = 1e-9
+
+
+def build_matrix(locations: Iterable[Dict]) -> np.ndarray:
+    """Symmetric haversine distance matrix in km between {"lat", "lng"} dicts"""
+    lats, lngs = to_arrays(locations)
+    return distance_matrix(lats, lngs)
+
+
+def route_cost(dist, route: List[int]) -> float:
+    """Length of an open path through the matrix"""
+    return float(sum(dist[a][b] for a, b in zip(route, route[1:])))
+
+
+def nearest_neighbor_route(dist: np.ndarray, start: int = 0) -> List[int]:
+    """Greedy open path from ``start`` through every node"""
+    n = len(dist)
+    visited = np.zeros(n, dtype=bool)
+    route = [start]
+    visited[start] = True
+    current = start
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, dist[current])
+        current = int(np.argmin(row))
+        visited[current] = True
+        route.append(current)
+    return route
+
+
+class LocalSearch:
+    """2-opt, Or-opt and relocate on an open path with a fixed first node.
+
+    Moves are scored by their cost delta from a precomputed matrix, so each
+    evaluation is O(1). Only moves that create an edge from a node to one of
+    its ``neighbors`` nearest nodes are tried, and don't-look bits keep the
+    search on nodes whose surroundings changed since they were last examined.
+    Relocate is Or-opt with a segment of one.
+    """
+
+    def __init__(self, dist: np.ndarray, neighbors: int = 10, max_segment: int = 3):
+        self.n = len(dist)
+        self.d = np.asarray(dist, dtype=np.float64).tolist()  # list indexing beats numpy scalars in the inner loop
+        k = max(0, min(neighbors, self.n - 1))
+        order = np.argsort(dist, axis=1, kind="stable")
+        self.neighbors = [[int(c) for c in row if c != i][:k] for i, row in enumerate(order)]
+        self.max_segment = max_segment
+        self.stats = {"evaluations": 0, "two_opt": 0, "or_opt": 0, "relocate": 0}
+
+    def optimize(self, route: List[int]) -> List[int]:
+        """Improve the route until no neighbor move shortens it"""
+        route = list(route)
+        if len(route) < 3:
+            return route
+        pos = [0] * self.n
+        for index, node in enumerate(route):
+            pos[node] = index
+
+        queue = deque(route)
+        active = [True] * self.n
+        while queue:
+            node = queue.popleft()
+            active[node] = False
+            touched = self._improve_node(route, pos, node)
+            if touched:
+                for t in touched:
+                    if not active[t]:
+                        active[t] = True
+                        queue.append(t)
+        return route
+
+    def _improve_node(self, route: List[int], pos: List[int], a: int) -> Optional[Tuple[int, ...]]:
+        return self._try_two_opt(route, pos, a) or self._try_or_opt(route, pos, a)
+
+    def _try_two_opt(self, route, pos, a):
+        d = self.d
+        n = len(route)
+        p = pos[a]
+        for c in self.neighbors[a]:
+            q = pos[c]
+            self.stats["evaluations"] += 1
+            if q > p + 1:
+                # New edges (a, c) and (succ a, succ c): reverse route[p+1..q]
+                b = route[p + 1]
+                delta = d[a][c] - d[a][b]
+                if q + 1 < n:
+                    e = route[q + 1]
+                    delta += d[b][e] - d[c][e]
+                if delta < -EPSILON:
+                    self._reverse(route, pos, p + 1, q)
+                    return (a, b, c) + ((route[q + 1],) if q + 1 < n else ())
+            elif 1 <= q < p - 1:
+                # New edges (c, a) and (pred c, pred a): reverse route[q..p-1]
+                pc, pa = route[q - 1], route[p - 1]
+                delta = d[pc][pa] + d[c][a] - d[pc][c] - d[pa][a]
+                if delta < -EPSILON:
+                    self._reverse(route, pos, q, p - 1)
+                    return a, c, pc, pa
+        return None
+
+    def _try_or_opt(self, route, pos, a):
+        d = self.d
+        n = len(route)
+        p = pos[a]
+        if p == 0:
+            return None
+        for length in range(1, self.max_segment + 1):
+            end = p + length - 1
+            if end >= n:
+                break
+            s0, s1 = route[p], route[end]
+            prev = route[p - 1]
+            nxt = route[end + 1] if end + 1 < n else None
+            removal = d[prev][s0] + (d[s1][nxt] - d[prev][nxt] if nxt is not None else 0.0)
+
+            for endpoint in ((s0,) if length == 1 else (s0, s1)):
+                for c in self.neighbors[endpoint]:
+                    q = pos[c]
+                    if p <= q <= end:
+                        continue
+                    self.stats["evaluations"] += 1
+                    other = s1 if endpoint == s0 else s0
+
+                    # Insert after c so that c is adjacent to this endpoint
+                    if q != p - 1:
+                        c_next = route[q + 1] if q + 1 < n else None
+                        added = d[c][endpoint]
+                        if c_next is not None:
+                            added += d[other][c_next] - d[c][c_next]
+                        if added - removal < -EPSILON:
+                            return self._move_segment(route, pos, p, end, c, after=True,
+                                                      reverse=endpoint != s0, length=length,
+                                                      touched=(prev, nxt, c, c_next, s0, s1))
+
+                    # Insert before c so that this endpoint is adjacent to c
+                    if q >= 1 and q != end + 1:
+                        c_prev = route[q - 1]
+                        added = d[c_prev][other] + d[endpoint][c] - d[c_prev][c]
+                        if added - removal < -EPSILON:
+                            return self._move_segment(route, pos, p, end, c, after=False,
+                                                      reverse=endpoint != s1, length=length,
+                                                      touched=(prev, nxt, c, c_prev, s0, s1))
+        return None
+
+    def _reverse(self, route, pos, i, j):
+        route[i:j + 1] = route[i:j + 1][::-1]
+        for index in range(i, j + 1):
+            pos[route[index]] = index
+        self.stats["two_opt"] += 1
+
+    def _move_segment(self, route, pos, start, end, anchor, after, reverse, length, touched):
+        segment = route[start:end + 1]
+        if reverse:
+            segment.reverse()
+        del route[start:end + 1]
+        index = route.index(anchor) + (1 if after else 0)
+        route[index:index] = segment
+        for i in range(min(start, index), len(route)):
+            pos[route[i]] = i
+        self.stats["relocate" if length == 1 else "or_opt"] += 1
+        return tuple(t for t in touched if t is not None)
+
+
+def optimize_path(locations: List[Dict], neighbors: int = 10,
+                  dist: Optional[np.ndarray] = None) -> Tuple[List[int], Dict]:
+    """Short open path from locations[0] through all locations.
+
+    ``dist`` replaces the straight-line matrix, e.g. with road travel times;
+    it is symmetrized because the moves assume a symmetric matrix. Returns the
+    visiting order as indices into ``locations`` and search stats.
+    """
+    if len(locations) <= 2:
+        return list(range(len(locations))), {"initial_km": 0, "final_km": 0}
+    dist = build_matrix(locations) if dist is None else (dist + dist.T) / 2
+    route = nearest_neighbor_route(dist)
+    initial = route_cost(dist, route)
+    search = LocalSearch(dist, neighbors=neighbors)
+    route = search.optimize(route)
+    return route, {**search.stats, "initial_km": round(initial, 3), "final_km": round(route_cost(dist, route), 3)}
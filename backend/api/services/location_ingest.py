@@ -0,0 +1,135 @@
+import math
+import struct
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from core.config import settings
+from core.store import IndexedStore, orders_db, drivers_db
+
+# One GPS fix on the binary channel, little-endian, 28 bytes:
+# lat and lng in 1e-7 degrees (int32), speed km/h, heading degrees and
+# accuracy metres (float32), unix timestamp in seconds (float64)
+FIX_STRUCT = struct.Struct("<iifffd")
+COORD_SCALE = 1e7
+
+
+def encode_fixes(fixes: List[dict]) -> bytes:
+    """Pack fixes into one binary frame (used by clients and the benchmark)"""
+    return b"".join(FIX_STRUCT.pack(round(f["lat"] * COORD_SCALE), round(f["lng"] * COORD_SCALE),
+                                    f.get("speed", 0.0), f.get("heading", 0.0), f.get("accuracy", 5.0),
+                                    f.get("timestamp") or time.time())
+                    for f in fixes)
+
+
+def decode_fixes(frame: bytes) -> List[dict]:
+    """Unpack a binary frame of one or more fixes; ValueError if it is not a whole number of fixes"""
+    if not frame or len(frame) % FIX_STRUCT.size:
+        raise ValueError(f"Frame must be a non-empty multiple of {FIX_STRUCT.size} bytes, got {len(frame)}")
+    return [
+        {"lat": lat / COORD_SCALE, "lng": lng / COORD_SCALE, "speed": speed, "heading": heading,
+         "accuracy": accuracy, "timestamp": timestamp}
+        for lat, lng, speed, heading, accuracy, timestamp in FIX_STRUCT.iter_unpack(frame)
+    ]
+
+
+def fix_error(fix: dict, now: float) -> Optional[str]:
+    """Why a decoded fix cannot be applied, or None if it is usable"""
+    if not all(math.isfinite(fix[field]) for field in ("lat", "lng", "speed", "heading", "accuracy", "timestamp")):
+        return "non-finite value"
+    if not -90 <= fix["lat"] <= 90 or not -180 <= fix["lng"] <= 180:
+        return "coordinates out of range"
+    if fix["timestamp"] > now + settings.GPS_MAX_FUTURE_SKEW_SECONDS:
+        return "timestamp in the future"
+    if fix["timestamp"] < now - settings.GPS_MAX_FIX_AGE_SECONDS:
+        return "timestamp too old"
+    return None
+
+
+class LocationIngest:
+    """Applies GPS fixes to a driver and the orders they carry.
+
+    The HTTP location endpoint and the binary websocket channel both go
+    through ``apply``: every fix is appended to the orders' route history and
+    the latest one becomes the driver's and orders' current location, so a
+    frame of several fixes costs one set of store updates.
+    """
+
+    def __init__(self, drivers: IndexedStore, orders: IndexedStore):
+        self.drivers = drivers
+        self.orders = orders
+        self._last_fix: Dict[str, float] = {}
+        self.stats = {"fixes": 0, "frames": 0, "stale_fixes": 0, "rejected_fixes": 0, "rejected_frames": 0}
+
+    def apply(self, driver: dict, fixes: List[dict]) -> int:
+        """Apply fixes (lat, lng, speed, heading, accuracy, timestamp) in order; returns how many were applied"""
+        if not fixes:
+            return 0
+        latest = fixes[-1]
+        last_update = datetime.fromtimestamp(latest["timestamp"]).isoformat()
+        driver["current_location"].update({
+            "lat": latest["lat"],
+            "lng": latest["lng"],
+            "accuracy": latest["accuracy"],
+            "speed": latest["speed"],
+            "heading": latest["heading"],
+            "last_update": last_update
+        })
+        self.drivers.touch(driver, "current_location")
+
+        history = [{
+            "lat": fix["lat"],
+            "lng": fix["lng"],
+            "timestamp": datetime.fromtimestamp(fix["timestamp"]).isoformat(),
+            "speed": fix["speed"]
+        } for fix in fixes]
+        for order_id in driver["current_orders"]:
+            order = self.orders.get(order_id)
+            if order:
+                if "route_history" not in order:
+                    order["route_history"] = []
+                order["route_history"].extend(dict(point) for point in history)
+                order["current_location"] = {"lat": latest["lat"], "lng": latest["lng"], "timestamp": last_update}
+
+        self.stats["fixes"] += len(fixes)
+        return len(fixes)
+
+    def ingest_frame(self, driver: dict, frame: bytes) -> dict:
+        """Decode a binary frame and apply its valid fixes, skipping any not newer than the driver's last one.
+
+        Fixes with non-finite values, out-of-range coordinates or a timestamp
+        outside the allowed clock skew are rejected before the staleness check,
+        so they can neither reach the stores nor move the driver's last fix time.
+        """
+        try:
+            fixes = decode_fixes(frame)
+        except ValueError:
+            self.stats["rejected_frames"] += 1
+            raise
+        self.stats["frames"] += 1
+        now = time.time()
+        valid, errors = [], []
+        for fix in fixes:
+            error = fix_error(fix, now)
+            if error:
+                errors.append(error)
+            else:
+                valid.append(fix)
+        self.stats["rejected_fixes"] += len(errors)
+
+        last = self._last_fix.get(driver["id"], float("-inf"))
+        fresh = sorted((f for f in valid if f["timestamp"] > last), key=lambda f: f["timestamp"])
+        self.stats["stale_fixes"] += len(valid) - len(fresh)
+        applied = self.apply(driver, fresh)
+        if fresh:
+            self._last_fix[driver["id"]] = fresh[-1]["timestamp"]
+        result = {"applied": applied, "stale": len(valid) - len(fresh), "rejected": len(errors)}
+        if errors:
+            result["error"] = ", ".join(sorted(set(errors)))
+        return result
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "drivers_streaming": len(self._last_fix), "fix_bytes": FIX_STRUCT.size}
+
+
+location_ingest = LocationIngest(drivers_db, orders_db)
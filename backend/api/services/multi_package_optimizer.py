@@ -1,7 +1,11 @@
-import math
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 import itertools
+from core.geo import point_distance, to_arrays, path_length
+from api.services.local_search import route_cost
+from api.services.pickup_delivery import PickupDeliverySolver
+from api.services.lns import LargeNeighborhoodSearch
+from api.services.travel_matrix import travel_matrix
 
 class MultiPackageOptimizer:
     def __init__(self):
@@ -9,42 +13,101 @@ class MultiPackageOptimizer:
         self.time_cost_per_minute = 0.5  # MAD per minute
         self.pickup_time = 5  # minutes
         self.delivery_time = 8  # minutes
-        
-    def optimize_multi_delivery_route(self, driver_location: Dict, orders: List[Dict]) -> Dict:
-        """Optimize route for multiple packages using TSP algorithm"""
+        self.minutes_per_km = 2
+        # Delivery deadline from now when an order has no usable slot or estimate
+        self.delivery_sla = {"express": 120, "standard": 480}
+        
+    def optimize_multi_delivery_route(self, driver_location: Dict, orders: List[Dict],
+                                      capacity: Optional[float] = None, now: Optional[datetime] = None,
+                                      search_budget: float = 0.0) -> Dict:
+        """Optimize route for multiple packages as a pickup-and-delivery problem with time windows.
+
+        Orders not yet collected get a pickup and a delivery stop; orders on
+        board get a delivery stop. ``capacity`` is the vehicle's weight limit in kg.
+        Each stop gets an ETA and its lateness against the order's time window.
+        With ``search_budget`` seconds, large neighborhood search keeps improving
+        the constructed route in this thread until the budget is spent.
+        """
+        now = now or datetime.now()
         if not orders:
             return {"route": [], "total_distance": 0, "total_time": 0, "total_cost": 0}
         
-        # Separate pickups and deliveries
+        # Orders waiting for pickup first, then packages already on board
         pickups = [o for o in orders if o["status"] in ["assigned", "accepted"]]
         deliveries = [o for o in orders if o["status"] in ["picked_up", "in_transit"]]
-        
-        # Create location points
-        points = [{"type": "start", "location": driver_location, "order_id": None}]
-        
-        # Add pickup points
-        for order in pickups:
-            points.append({
-                "type": "pickup",
-                "location": self._get_coordinates(order["pickup_address"], order["pickup_city"]),
-                "order_id": order["id"],
-                "order": order
+        stops = [stop for order in pickups + deliveries for stop in self.order_stops(order)]
+        
+        # Precedence, capacity and time windows are enforced while the route is built and improved
+        points, solver = self.build_problem(driver_location, stops, capacity, now)
+        order, solver_metrics = solver.solve()
+        if search_budget > 0:
+            order, search_stats = LargeNeighborhoodSearch(solver).run(order, search_budget)
+            solver_metrics.update({
+                "final_km": round(route_cost(solver.dist, order), 3),
+                "feasible": solver.is_feasible(order),
+                **solver.lateness_summary(order),
+                "search": search_stats
             })
-        
-        # Add delivery points
-        for order in deliveries:
-            points.append({
-                "type": "delivery", 
-                "location": self._get_coordinates(order["delivery_address"], order["delivery_city"]),
-                "order_id": order["id"],
-                "order": order
-            })
-        
-        # Optimize route using nearest neighbor with 2-opt improvement
-        optimized_sequence = self._optimize_tsp(points)
+        return self._route_result(points, solver, order, solver_metrics)
+    
+    def evaluate_route(self, driver_location: Dict, stops: List[Dict],
+                       capacity: Optional[float] = None, now: Optional[datetime] = None) -> Dict:
+        """Schedule and cost stops in the given order without re-optimizing them"""
+        if not stops:
+            return {"route": [], "total_distance": 0, "total_time": 0, "total_cost": 0}
+        points, solver = self.build_problem(driver_location, stops, capacity, now or datetime.now())
+        route = list(range(len(points)))
+        metrics = {
+            "final_km": round(route_cost(solver.dist, route), 3),
+            "max_load": round(float(solver._loads(route).max()), 2),
+            "capacity": capacity,
+            "feasible": solver.is_feasible(route),
+            **solver.lateness_summary(route)
+        }
+        return self._route_result(points, solver, route, metrics)
+    
+    async def prefetch_matrix(self, driver_location: Dict, orders: List[Dict]) -> None:
+        """Fetch road distances between the orders' stops so the next solve uses them"""
+        stops = [stop for order in orders for stop in self.order_stops(order)]
+        if stops:
+            await travel_matrix.matrix([driver_location] + [stop["location"] for stop in stops])
+    
+    def order_stops(self, order: Dict) -> List[Dict]:
+        """Stops still to visit for an active order: pickup and delivery, or delivery once on board"""
+        if order["status"] in ["assigned", "accepted"]:
+            return [self._stop("pickup", order), self._stop("delivery", order)]
+        if order["status"] in ["picked_up", "in_transit"]:
+            return [self._stop("delivery", order)]
+        return []
+    
+    def build_problem(self, driver_location: Dict, stops: List[Dict], capacity: Optional[float],
+                      now: datetime) -> Tuple[List[Dict], PickupDeliverySolver]:
+        """Route points (start first) and a solver over them with one request per order"""
+        points = [{"type": "start", "location": driver_location, "order_id": None}] + list(stops)
+        pickup_nodes = {p["order_id"]: i for i, p in enumerate(points) if p["type"] == "pickup"}
+        requests = [
+            (pickup_nodes.get(p["order_id"]), i, p["order"].get("weight", 0) or 0)
+            for i, p in enumerate(points) if p["type"] == "delivery"
+        ]
+        # Road km and minutes from the matrix service; estimated for pairs it has not fetched yet
+        matrix = travel_matrix.cached_matrix([p["location"] for p in points])
+        windows = [(0.0, float("inf"))] + [self._time_window(p["type"], p["order"], now) for p in points[1:]]
+        service = [0] + [self.pickup_time if p["type"] == "pickup" else self.delivery_time for p in points[1:]]
+        solver = PickupDeliverySolver(matrix["distances"], requests, capacity, travel=matrix["durations"],
+                                      windows=windows, service=service)
+        return points, solver
+    
+    def _route_result(self, points: List[Dict], solver: PickupDeliverySolver, order: List[int],
+                      solver_metrics: Dict) -> Dict:
+        begin, late = solver.lateness(order)
+        optimized_sequence = [
+            {**points[i], "eta_minutes": round(float(eta), 1), "lateness_minutes": round(float(minutes), 1)}
+            for i, eta, minutes in zip(order, begin, late)
+        ]
         
         # Calculate route metrics
-        route_data = self._calculate_route_metrics(optimized_sequence)
+        route_data = self._calculate_route_metrics(optimized_sequence, distance=route_cost(solver.dist, order),
+                                                   travel_time=route_cost(solver.travel, order))
         
         return {
             "route": optimized_sequence,
@@ -52,107 +115,46 @@ class MultiPackageOptimizer:
             "total_time": route_data["time"],
             "total_cost": route_data["cost"],
             "fuel_savings": route_data["savings"],
-            "efficiency_score": route_data["efficiency"]
+            "efficiency_score": route_data["efficiency"],
+            "solver": solver_metrics
         }
     
-    def _optimize_tsp(self, points: List[Dict]) -> List[Dict]:
-        """Traveling Salesman Problem optimization with constraints"""
-        if len(points) <= 3:
-            return points
-        
-        # Start with nearest neighbor
-        route = self._nearest_neighbor(points)
-        
-        # Apply 2-opt improvement
-        route = self._two_opt_improvement(route)
-        
-        # Apply pickup-delivery constraints
-        route = self._apply_constraints(route)
-        
-        return route
-    
-    def _nearest_neighbor(self, points: List[Dict]) -> List[Dict]:
-        """Nearest neighbor algorithm for initial route"""
-        unvisited = points[1:].copy()  # Exclude start point
-        route = [points[0]]  # Start with driver location
-        current = points[0]
-        
-        while unvisited:
-            nearest = min(unvisited, key=lambda p: self._calculate_distance(
-                current["location"], p["location"]
-            ))
-            route.append(nearest)
-            unvisited.remove(nearest)
-            current = nearest
-        
-        return route
-    
-    def _two_opt_improvement(self, route: List[Dict]) -> List[Dict]:
-        """2-opt algorithm to improve route efficiency"""
-        best_route = route.copy()
-        best_distance = self._calculate_total_distance(route)
-        improved = True
-        
-        while improved:
-            improved = False
-            for i in range(1, len(route) - 2):
-                for j in range(i + 1, len(route)):
-                    if j - i == 1: continue
-                    
-                    new_route = route.copy()
-                    new_route[i:j] = route[i:j][::-1]  # Reverse segment
-                    
-                    new_distance = self._calculate_total_distance(new_route)
-                    if new_distance < best_distance:
-                        best_route = new_route
-                        best_distance = new_distance
-                        improved = True
-            
-            route = best_route
-        
-        return best_route
+    def _stop(self, stop_type: str, order: Dict) -> Dict:
+        prefix = "pickup" if stop_type == "pickup" else "delivery"
+        return {
+            "type": stop_type,
+            "location": self._get_coordinates(order[f"{prefix}_address"], order[f"{prefix}_city"]),
+            "order_id": order["id"],
+            "order": order
+        }
     
-    def _apply_constraints(self, route: List[Dict]) -> List[Dict]:
-        """Apply pickup-before-delivery constraints"""
-        # Group by order_id
-        order_points = {}
-        for point in route:
-            if point["order_id"]:
-                if point["order_id"] not in order_points:
-                    order_points[point["order_id"]] = {}
-                order_points[point["order_id"]][point["type"]] = point
-        
-        # Ensure pickup comes before delivery for each order
-        constrained_route = [route[0]]  # Start point
-        remaining = route[1:].copy()
-        
-        while remaining:
-            # Find next valid point
-            for point in remaining:
-                if point["type"] == "pickup":
-                    constrained_route.append(point)
-                    remaining.remove(point)
-                    break
-                elif point["type"] == "delivery":
-                    # Check if pickup is already done
-                    order_id = point["order_id"]
-                    pickup_done = any(p["order_id"] == order_id and p["type"] == "pickup" 
-                                    for p in constrained_route)
-                    if pickup_done:
-                        constrained_route.append(point)
-                        remaining.remove(point)
-                        break
-            else:
-                # If no valid point found, add first remaining
-                if remaining:
-                    constrained_route.append(remaining.pop(0))
-        
-        return constrained_route
+    def _time_window(self, stop_type: str, order: Dict, now: datetime) -> Tuple[float, float]:
+        """(earliest, latest) start of service in minutes from now.
+
+        Uses the order's ``pickup_window``/``delivery_window`` slot when present.
+        Otherwise deliveries are due by ``estimated_delivery`` if it is still
+        ahead, else by the service-type SLA; pickups are open.
+        """
+        def minutes(value) -> Optional[float]:
+            try:
+                return (datetime.fromisoformat(value) - now).total_seconds() / 60
+            except (TypeError, ValueError):
+                return None
+        
+        slot = order.get(f"{stop_type}_window") or {}
+        earliest = max(0.0, minutes(slot.get("start")) or 0.0)
+        latest = minutes(slot.get("end"))
+        if latest is None and stop_type == "delivery":
+            latest = minutes(order.get("estimated_delivery"))
+            if latest is None or latest <= 0:
+                latest = self.delivery_sla.get(order.get("service_type"))
+        return earliest, latest if latest is not None else float("inf")
     
-    def _calculate_route_metrics(self, route: List[Dict]) -> Dict:
-        """Calculate comprehensive route metrics"""
-        total_distance = self._calculate_total_distance(route)
-        total_time = self._calculate_total_time(route)
+    def _calculate_route_metrics(self, route: List[Dict], distance: Optional[float] = None,
+                                 travel_time: Optional[float] = None) -> Dict:
+        """Calculate comprehensive route metrics, from road distance and driving time when given"""
+        total_distance = self._calculate_total_distance(route) if distance is None else distance
+        total_time = self._calculate_total_time(route, travel_time)
         
         # Cost calculation
         fuel_cost = total_distance * self.fuel_cost_per_km
@@ -160,7 +162,7 @@ class MultiPackageOptimizer:
         total_cost = fuel_cost + time_cost
         
         # Calculate savings vs individual deliveries
-        individual_cost = len([p for p in route if p["order_id"]]) * 25.0  # Base cost per delivery
+        individual_cost = len({p["order_id"] for p in route if p["order_id"]}) * 25.0  # Base cost per delivery
         savings = max(0, individual_cost - total_cost)
         
         # Efficiency score (0-100)
@@ -176,17 +178,13 @@ class MultiPackageOptimizer:
     
     def _calculate_total_distance(self, route: List[Dict]) -> float:
         """Calculate total route distance"""
-        total = 0
-        for i in range(len(route) - 1):
-            total += self._calculate_distance(
-                route[i]["location"], 
-                route[i + 1]["location"]
-            )
-        return total
+        lats, lngs = to_arrays(point["location"] for point in route)
+        return path_length(lats, lngs)
     
-    def _calculate_total_time(self, route: List[Dict]) -> float:
+    def _calculate_total_time(self, route: List[Dict], travel_time: Optional[float] = None) -> float:
         """Calculate total route time including stops"""
-        travel_time = self._calculate_total_distance(route) * 2  # 2 min per km
+        if travel_time is None:
+            travel_time = self._calculate_total_distance(route) * self.minutes_per_km
         
         stop_time = 0
         for point in route[1:]:  # Exclude start point
@@ -199,18 +197,7 @@ class MultiPackageOptimizer:
     
     def _calculate_distance(self, loc1: Dict, loc2: Dict) -> float:
         """Calculate distance between two coordinates"""
-        R = 6371  # Earth radius in km
-        lat1, lng1 = math.radians(loc1["lat"]), math.radians(loc1["lng"])
-        lat2, lng2 = math.radians(loc2["lat"]), math.radians(loc2["lng"])
-        
-        dlat = lat2 - lat1
-        dlng = lng2 - lng1
-        
-        a = (math.sin(dlat/2)**2 + 
-             math.cos(lat1) * math.cos(lat2) * math.sin(dlng/2)**2)
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        
-        return R * c
+        return point_distance(loc1, loc2)
     
     def _get_coordinates(self, address: str, city: str) -> Dict:
         """Get coordinates for address"""
@@ -225,12 +212,13 @@ class MultiPackageOptimizer:
         
         base_coords = city_coords.get(city.lower(), city_coords["casablanca"])
         
-        # Add small random offset for different addresses
+        # Small offset for different addresses, stable per address so routes don't shift between calls
         import random
+        rng = random.Random(f"{city.lower()}|{address}")
         offset = 0.01
         return {
-            "lat": base_coords["lat"] + random.uniform(-offset, offset),
-            "lng": base_coords["lng"] + random.uniform(-offset, offset)
+            "lat": base_coords["lat"] + rng.uniform(-offset, offset),
+            "lng": base_coords["lng"] + rng.uniform(-offset, offset)
         }
     
     def calculate_batch_assignment_score(self, driver: Dict, new_orders: List[Dict]) -> float:
@@ -244,7 +232,8 @@ class MultiPackageOptimizer:
         # Calculate optimized route
         route_data = self.optimize_multi_delivery_route(
             driver["current_location"], 
-            all_orders
+            all_orders,
+            capacity=driver.get("vehicle_capacity")
         )
         
         # Score based on efficiency and capacity utilization
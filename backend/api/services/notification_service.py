@@ -208,6 +208,7 @@ class NotificationService:
         await manager.broadcast({
             "type": "notification",
             "user_id": user_id,
+            "order_id": order_data.get("order_id"),
             "notification": notification,
             "order_data": order_data,
             "timestamp": datetime.now().isoformat()
@@ -0,0 +1,329 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from api.services.local_search import EPSILON, route_cost
+
+# (pickup node or None when the package is already on board, delivery node, demand)
+Request = Tuple[Optional[int], int, float]
+
+# Minutes of lateness tried, in order, for a request that cannot be served on time
+RELAX_STEPS_MIN = (15, 30, 60, 120, 240, np.inf)
+
+
+class PickupDeliverySolver:
+    """Pickup-and-delivery routing on an open path starting at node 0.
+
+    Every pickup precedes its delivery and the on-board load never exceeds
+    ``capacity``; both are enforced while building and improving the route,
+    never repaired afterwards. Construction is cheapest insertion of whole
+    requests, improvement relocates one request (pickup and delivery together)
+    to its cheapest feasible position until no move helps.
+    """
+
+    def __init__(self, dist: np.ndarray, requests: List[Request], capacity: Optional[float] = None,
+                 travel: Optional[np.ndarray] = None, windows: Optional[List[Tuple[float, float]]] = None,
+                 service: Optional[List[float]] = None):
+        self.dist = np.asarray(dist, dtype=np.float64)
+        self.requests = list(requests)
+        self.capacity = capacity
+        n = len(self.dist)
+        # Optional time dimension: travel minutes between nodes, [earliest, latest] begin of
+        # service per node (minutes from departure) and service minutes per node
+        self.travel = np.asarray(travel, dtype=np.float64) if travel is not None else None
+        self.earliest = np.zeros(n)
+        self.latest = np.full(n, np.inf)
+        if windows is not None:
+            for node, (earliest, latest) in enumerate(windows):
+                self.earliest[node] = earliest
+                self.latest[node] = latest
+        self.due = self.latest.copy()
+        self.service = np.asarray(service, dtype=np.float64) if service is not None else np.zeros(n)
+        self.timed = self.travel is not None and windows is not None
+        self.demand = np.zeros(n)
+        for pickup, delivery, demand in self.requests:
+            if pickup is not None:
+                self.demand[pickup] = demand
+            self.demand[delivery] = -demand
+        # Packages already on board count against capacity until delivered
+        self.initial_load = sum(demand for pickup, _, demand in self.requests if pickup is None)
+        self.stats = {"insertions": 0, "relocations": 0, "passes": 0, "capacity_violations": 0,
+                      "window_relaxations": 0}
+
+    def _loads(self, route: List[int]) -> np.ndarray:
+        """Load on board after each stop of the route"""
+        return self.initial_load + np.cumsum(self.demand[route])
+
+    def schedule(self, route: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(arrival, begin of service) minutes for each stop; waits at early arrivals"""
+        arrival = np.zeros(len(route))
+        begin = np.zeros(len(route))
+        begin[0] = self.earliest[route[0]]
+        for k in range(1, len(route)):
+            prev, node = route[k - 1], route[k]
+            arrival[k] = begin[k - 1] + self.service[prev] + self.travel[prev, node]
+            begin[k] = max(arrival[k], self.earliest[node])
+        return arrival, begin
+
+    def _time_state(self, route: List[int]):
+        """Begin times, waits, own slack and forward time slack of each stop.
+
+        Forward slack F[k] is the largest delay of service at stop k that keeps
+        every later stop within its window: F[k] = min(L[k], W[k+1] + F[k+1]).
+        """
+        arrival, begin = self.schedule(route)
+        wait = begin - arrival
+        wait[0] = 0.0
+        own = self.latest[route] - begin
+        forward = own.copy()
+        for k in range(len(route) - 2, -1, -1):
+            forward[k] = min(own[k], wait[k + 1] + forward[k + 1])
+        return begin, wait, own, forward
+
+    def _tail_ok(self, stops: np.ndarray, begin: np.ndarray, forward: np.ndarray,
+                 node: int, node_begin: np.ndarray, after: np.ndarray) -> np.ndarray:
+        """Whether the stops following ``after`` absorb the delay of serving ``node`` first"""
+        ok = np.ones(len(after), dtype=bool)
+        has_next = after + 1 < len(stops)
+        k = after[has_next] + 1
+        arrive = node_begin[has_next] + self.service[node] + self.travel[node, stops[k]]
+        delay = np.maximum(arrive, self.earliest[stops[k]]) - begin[k]
+        ok[has_next] = delay <= forward[k] + EPSILON
+        return ok
+
+    def _insertion_costs(self, route: np.ndarray, node: int) -> np.ndarray:
+        """Added length of inserting ``node`` right after each route position"""
+        d = self.dist
+        costs = d[route, node].copy()
+        costs[:-1] += d[node, route[1:]] - d[route[:-1], route[1:]]
+        return costs
+
+    def best_insertion(self, route: List[int], request: Request, respect_capacity: bool = True,
+                       respect_windows: bool = True):
+        """(added length, pickup position, delivery position) of the cheapest feasible insertion.
+
+        Positions are indices after which the stop goes, in the route before
+        insertion; returns None when no feasible position exists.
+        """
+        pickup, delivery, demand = request
+        stops = np.asarray(route)
+        n = len(stops)
+        positions = np.arange(n)
+        delivery_costs = self._insertion_costs(stops, delivery)
+        timed = respect_windows and self.timed
+        if timed:
+            begin, wait, own, forward = self._time_state(route)
+            depart = begin + self.service[stops]
+
+        if pickup is None:
+            if respect_capacity and self.capacity is not None:
+                # The package stays on board until its delivery, so the load up to there must fit
+                peak = np.maximum.accumulate(self._loads(route))
+                delivery_costs = np.where(peak <= self.capacity + EPSILON, delivery_costs, np.inf)
+            if timed:
+                delivery_begin = np.maximum(depart + self.travel[stops, delivery], self.earliest[delivery])
+                ok = (delivery_begin <= self.latest[delivery] + EPSILON) & \
+                    self._tail_ok(stops, begin, forward, delivery, delivery_begin, positions)
+                delivery_costs = np.where(ok, delivery_costs, np.inf)
+            j = int(np.argmin(delivery_costs))
+            if not np.isfinite(delivery_costs[j]):
+                return None
+            return float(delivery_costs[j]), None, j
+
+        costs = self._insertion_costs(stops, pickup)[:, None] + delivery_costs[None, :]
+        # Delivery straight after the pickup (same gap)
+        d = self.dist
+        adjacent = d[stops, pickup] + d[pickup, delivery]
+        adjacent[:-1] += d[delivery, stops[1:]] - d[stops[:-1], stops[1:]]
+        costs[np.diag_indices(n)] = adjacent
+        upper = np.triu(np.ones((n, n), dtype=bool))
+        feasible = upper
+        if respect_capacity and self.capacity is not None:
+            # Peak load between the two insertion points must leave room for the package
+            loads = self._loads(route)
+            peak = np.maximum.accumulate(np.where(upper, loads[None, :], -np.inf), axis=1)
+            feasible = upper & (peak + demand <= self.capacity + EPSILON)
+        if timed:
+            feasible = feasible & self._pair_time_ok(stops, begin, wait, own, forward, depart, pickup, delivery)
+        costs = np.where(feasible, costs, np.inf)
+        flat = int(np.argmin(costs))
+        i, j = divmod(flat, n)
+        if not np.isfinite(costs[i, j]):
+            return None
+        return float(costs[i, j]), i, j
+
+    def _pair_time_ok(self, stops, begin, wait, own, forward, depart, pickup, delivery) -> np.ndarray:
+        """[i, j] -> whether pickup after position i and delivery after position j keep every window.
+
+        The pickup delays stop i+1 by D[i]; waiting absorbs it along the way, so the
+        delay left at stop m is max(0, D[i] - waits between i+2 and m). That delay
+        must fit each stop's own slack up to j; after the delivery, forward slack
+        of stop j+1 covers the rest of the route.
+        """
+        n = len(stops)
+        positions = np.arange(n)
+        pickup_begin = np.maximum(depart + self.travel[stops, pickup], self.earliest[pickup])
+        pickup_ok = pickup_begin <= self.latest[pickup] + EPSILON
+
+        # Delivery straight after the pickup
+        adjacent_begin = np.maximum(pickup_begin + self.service[pickup] + self.travel[pickup, delivery],
+                                    self.earliest[delivery])
+        ok = np.zeros((n, n), dtype=bool)
+        ok[positions, positions] = pickup_ok & (adjacent_begin <= self.latest[delivery] + EPSILON) & \
+            self._tail_ok(stops, begin, forward, delivery, adjacent_begin, positions)
+        if n < 2:
+            return ok
+
+        # Delay the pickup pushes onto each following stop m > i
+        first = positions[:-1]
+        arrive_next = pickup_begin[:-1] + self.service[pickup] + self.travel[pickup, stops[1:]]
+        initial_delay = np.maximum(arrive_next, self.earliest[stops[1:]]) - begin[1:]
+        cumulative_wait = np.cumsum(wait)
+        later = positions[None, :] > first[:, None]
+        absorbed = cumulative_wait[None, :] - cumulative_wait[first + 1][:, None]
+        delay = np.where(later, np.maximum(0.0, initial_delay[:, None] - absorbed), 0.0)
+        span_ok = np.minimum.accumulate(np.where(later, own[None, :] - delay, np.inf), axis=1) >= -EPSILON
+
+        delivery_begin = np.maximum(depart[None, :] + delay + self.travel[stops, delivery][None, :],
+                                    self.earliest[delivery])
+        delivery_ok = delivery_begin <= self.latest[delivery] + EPSILON
+        tail_ok = np.ones_like(delivery_ok)
+        following = stops[1:]
+        arrive_after = delivery_begin[:, :-1] + self.service[delivery] + self.travel[delivery, following][None, :]
+        tail_delay = np.maximum(arrive_after, self.earliest[following][None, :]) - begin[None, 1:]
+        tail_ok[:, :-1] = tail_delay <= forward[None, 1:] + EPSILON
+        ok[:-1] |= later & pickup_ok[:-1, None] & span_ok & delivery_ok & tail_ok
+        return ok
+
+    def _relax_windows(self, route: List[int], request: Request):
+        """Insertion for a request whose window cannot be met, keeping its lateness small.
+
+        Its deadlines are pushed back step by step until it fits without making
+        any other stop late.
+        """
+        self.stats["window_relaxations"] += 1
+        nodes = [node for node in request[:2] if node is not None]
+        for extra in RELAX_STEPS_MIN:
+            for node in nodes:
+                self.latest[node] = self.due[node] + extra
+            found = self.best_insertion(route, request)
+            if found is not None:
+                return found
+        return None
+
+    @staticmethod
+    def _insert(route: List[int], request: Request, i: Optional[int], j: int) -> None:
+        pickup, delivery, _ = request
+        if pickup is None:
+            route.insert(j + 1, delivery)
+        elif i == j:
+            route[i + 1:i + 1] = [pickup, delivery]
+        else:
+            route.insert(j + 1, delivery)
+            route.insert(i + 1, pickup)
+
+    def _place(self, route: List[int], request: Request) -> float:
+        found = self.best_insertion(route, request)
+        if found is None and self.timed:
+            # Its window cannot be met anywhere: serve it late without making other stops late
+            found = self._relax_windows(route, request)
+        if found is None:
+            # Cannot fit at any point: keep it routable and report the violation
+            self.stats["capacity_violations"] += 1
+            found = self.best_insertion(route, request, respect_capacity=False, respect_windows=False)
+        cost, i, j = found
+        self._insert(route, request, i, j)
+        return cost
+
+    def insert(self, route: List[int], request: Request) -> float:
+        """Add one request to an existing route at its cheapest feasible position; returns the added length"""
+        self.stats["insertions"] += 1
+        return self._place(route, request)
+
+    def construct(self) -> List[int]:
+        """Cheapest insertion: repeatedly add the request whose best insertion is cheapest.
+
+        Packages already on board are routed first so their deliveries free
+        capacity before pickups are placed.
+        """
+        route = [0]
+        pending = sorted(self.requests, key=lambda request: request[0] is not None)
+        while pending:
+            best = None
+            onboard_left = pending[0][0] is None
+            for index, request in enumerate(pending):
+                if onboard_left and request[0] is not None:
+                    break
+                found = self.best_insertion(route, request)
+                if found is not None and (best is None or found[0] < best[0]):
+                    best = (found[0], index, found[1], found[2])
+            if best is None:
+                self._place(route, pending.pop(0))
+            else:
+                _, index, i, j = best
+                self._insert(route, pending.pop(index), i, j)
+            self.stats["insertions"] += 1
+        return route
+
+    def improve(self, route: List[int], max_passes: int = 50) -> List[int]:
+        """Pair relocate: move a request to its cheapest feasible position while that shortens the route"""
+        route = list(route)
+        for _ in range(max_passes):
+            self.stats["passes"] += 1
+            improved = False
+            for request in self.requests:
+                pickup, delivery, _ = request
+                before = route_cost(self.dist, route)
+                reduced = [node for node in route if node != pickup and node != delivery]
+                found = self.best_insertion(reduced, request)
+                if found is None:
+                    continue
+                if route_cost(self.dist, reduced) + found[0] < before - EPSILON:
+                    self._insert(reduced, request, found[1], found[2])
+                    route = reduced
+                    self.stats["relocations"] += 1
+                    improved = True
+            if not improved:
+                break
+        return route
+
+    def is_feasible(self, route: List[int]) -> bool:
+        position = {node: index for index, node in enumerate(route)}
+        for pickup, delivery, _ in self.requests:
+            if pickup is not None and position[pickup] > position[delivery]:
+                return False
+        if self.capacity is not None and len(route) > 1:
+            return bool(self._loads(route).max() <= self.capacity + EPSILON)
+        return True
+
+    def solve(self) -> Tuple[List[int], Dict]:
+        """Construct and improve; returns the route and solve metrics"""
+        started = time.perf_counter()
+        route = self.construct()
+        constructed = route_cost(self.dist, route)
+        route = self.improve(route)
+        return route, {
+            **self.stats,
+            "construction_km": round(constructed, 3),
+            "final_km": round(route_cost(self.dist, route), 3),
+            "max_load": round(float(self._loads(route).max()), 2) if len(route) > 1 else self.initial_load,
+            "capacity": self.capacity,
+            "feasible": self.is_feasible(route),
+            **(self.lateness_summary(route) if self.travel is not None else {}),
+            "solve_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+
+    def lateness(self, route: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(begin of service, minutes late against the original windows) per stop"""
+        _, begin = self.schedule(route)
+        return begin, np.maximum(0.0, begin - self.due[route])
+
+    def lateness_summary(self, route: List[int]) -> Dict:
+        begin, late = self.lateness(route)
+        return {
+            "late_stops": int((late > EPSILON).sum()),
+            "total_lateness_min": round(float(late.sum()), 1),
+            "max_lateness_min": round(float(late.max()), 1) if len(late) else 0.0,
+            "completion_min": round(float(begin[-1] + self.service[route[-1]]), 1)
+        }
@@ -1,13 +1,25 @@
-import requests
 import asyncio
 from datetime import datetime
 from typing import List, Dict, Optional
-import math
+from core.geo import haversine
+from core.config import settings
+from core.http import http_client
+from core import polyline
+from api.services.hedging import routing_hedger
+from api.services.route_cache import route_cache
+from api.services.local_search import LocalSearch, build_matrix, optimize_path
+from api.services.travel_matrix import travel_matrix
+from api.services.road_graph import road_graph
+from api.services.weather import weather_provider
 
 class RealTimeRoutingService:
     def __init__(self):
         self.osrm_base = "https://router.project-osrm.org/route/v1"
-        self.weather_cache = {}
+        self.route_servers = [
+            "https://router.project-osrm.org/route/v1",
+            "https://routing.openstreetmap.de/routed-car/route/v1",
+            "https://api.openrouteservice.org/v2/directions"
+        ]
         self.traffic_cache = {}
         
     async def calculate_optimized_route(self, driver_location: dict, waypoints: List[dict], 
@@ -20,8 +32,13 @@ class RealTimeRoutingService:
         # Get traffic conditions (simulated based on time and weather)
         traffic = self.get_traffic_conditions(weather)
         
-        # Calculate base route using OSRM
-        route_data = await self.get_osrm_route(driver_location, waypoints, vehicle_type)
+        # Calculate base route using OSRM (served from the route cache when the same stops repeat)
+        route_data = await route_cache.get_or_fetch(
+            [driver_location, *waypoints],
+            self.get_osrm_profile(vehicle_type),
+            lambda: self.get_osrm_route(driver_location, waypoints, vehicle_type),
+            cacheable=lambda route: route.get("source") in ("osrm", "ors")
+        )
         
         # Apply real-time optimizations
         optimized_route = await self.apply_real_time_optimizations(
@@ -36,21 +53,26 @@ class RealTimeRoutingService:
             profile = self.get_osrm_profile(vehicle_type)
             
             # Try multiple OSRM servers for reliability
-            servers = [
-                "https://router.project-osrm.org/route/v1",
-                "https://routing.openstreetmap.de/routed-car/route/v1",
-                "https://api.openrouteservice.org/v2/directions"
+            attempts = [
+                (server_url, (lambda: self.get_ors_route(start, waypoints, vehicle_type))
+                 if "openrouteservice" in server_url else
+                 (lambda url=server_url: self.get_osrm_server_route(url, start, waypoints, profile)))
+                for server_url in self.route_servers
             ]
             
-            for server_url in servers:
+            if settings.ROUTING_HEDGING_ENABLED:
+                # Fastest server first, hedged to the next one past its p95 latency
                 try:
-                    if "openrouteservice" in server_url:
-                        return await self.get_ors_route(start, waypoints, vehicle_type)
-                    else:
-                        return await self.get_osrm_server_route(server_url, start, waypoints, profile)
+                    return await routing_hedger.run(attempts)
                 except Exception as e:
-                    print(f"Server {server_url} failed: {e}")
-                    continue
+                    print(f"All routing servers failed: {e}")
+            else:
+                for server_url, attempt in attempts:
+                    try:
+                        return await attempt()
+                    except Exception as e:
+                        print(f"Server {server_url} failed: {e}")
+                        continue
             
             # All servers failed, use enhanced fallback
             return await self.get_enhanced_fallback_route(start, waypoints, vehicle_type)
@@ -67,22 +89,22 @@ class RealTimeRoutingService:
         
         coordinates = ";".join(coords)
         url = f"{server_url}/{profile}/{coordinates}"
+        # Encoded geometry is several times smaller on the wire; per-node annotations are never used
         params = {
             "overview": "full",
-            "geometries": "geojson",
+            "geometries": "polyline6",
             "steps": "true",
-            "annotations": "true",
             "alternatives": "true"
         }
         
-        response = requests.get(url, params=params, timeout=8)
+        response = await http_client.get(url, params=params, deadline=8)
         data = response.json()
         
         if data.get("routes"):
             # Select best route from alternatives
             best_route = self.select_best_route(data["routes"])
             return {
-                "coordinates": best_route["geometry"]["coordinates"],
+                "coordinates": polyline.decode(best_route["geometry"], precision=6),
                 "distance": best_route["distance"],
                 "duration": best_route["duration"],
                 "steps": self.parse_route_steps(best_route.get("legs", [])),
@@ -113,7 +135,7 @@ class RealTimeRoutingService:
             "elevation": False
         }
         
-        response = requests.post(url, json=payload, timeout=8)
+        response = await http_client.post(url, json=payload, deadline=8)
         data = response.json()
         
         if data.get("features"):
@@ -192,7 +214,7 @@ class RealTimeRoutingService:
                     "instruction": self.get_instruction_text(instruction),
                     "distance": step.get("distance", 0),
                     "duration": step.get("duration", 0),
-                    "coordinates": step.get("geometry", {}).get("coordinates", []),
+                    "coordinates": polyline.decode(step.get("geometry") or "", precision=6),
                     "type": instruction.get("type", "straight")
                 })
         
@@ -218,47 +240,10 @@ class RealTimeRoutingService:
         return instructions.get(maneuver_type, "Continue")
     
     async def get_weather_conditions(self, location: dict) -> dict:
-        """Get current weather conditions"""
-        cache_key = f"{location['lat']:.2f},{location['lng']:.2f}"
-        
-        if cache_key in self.weather_cache:
-            cached = self.weather_cache[cache_key]
-            if (datetime.now() - cached['timestamp']).seconds < 1800:  # 30 min cache
-                return cached['data']
+        """Get current weather conditions (shared process-wide cache)"""
+        current = await weather_provider.get_current(location['lat'], location['lng'])
         
-        try:
-            url = f"https://api.open-meteo.com/v1/current"
-            params = {
-                "latitude": location['lat'],
-                "longitude": location['lng'],
-                "current": "temperature_2m,precipitation,weather_code,wind_speed_10m,visibility"
-            }
-            
-            response = requests.get(url, params=params, timeout=5)
-            data = response.json()
-            
-            current = data.get("current", {})
-            weather = {
-                "temperature": current.get("temperature_2m", 20),
-                "precipitation": current.get("precipitation", 0),
-                "weather_code": current.get("weather_code", 0),
-                "wind_speed": current.get("wind_speed_10m", 0),
-                "visibility": current.get("visibility", 10000),
-                "condition": self.get_weather_condition(current.get("weather_code", 0)),
-                "is_rainy": current.get("precipitation", 0) > 0.1,
-                "is_foggy": current.get("visibility", 10000) < 1000,
-                "is_windy": current.get("wind_speed_10m", 0) > 20
-            }
-            
-            self.weather_cache[cache_key] = {
-                "data": weather,
-                "timestamp": datetime.now()
-            }
-            
-            return weather
-            
-        except Exception as e:
-            print(f"Weather API error: {e}")
+        if current is None:
             return {
                 "temperature": 20,
                 "condition": "clear",
@@ -266,6 +251,18 @@ class RealTimeRoutingService:
                 "is_foggy": False,
                 "is_windy": False
             }
+        
+        return {
+            "temperature": current.get("temperature_2m", 20),
+            "precipitation": current.get("precipitation", 0),
+            "weather_code": current.get("weather_code", 0),
+            "wind_speed": current.get("wind_speed_10m", 0),
+            "visibility": current.get("visibility", 10000),
+            "condition": self.get_weather_condition(current.get("weather_code", 0)),
+            "is_rainy": current.get("precipitation", 0) > 0.1,
+            "is_foggy": current.get("visibility", 10000) < 1000,
+            "is_windy": current.get("wind_speed_10m", 0) > 20
+        }
     
     def get_weather_condition(self, code: int) -> str:
         """Convert weather code to condition"""
@@ -422,89 +419,78 @@ class RealTimeRoutingService:
         # Use A* pathfinding for better route estimation
         optimized_order = self.optimize_waypoint_order(all_points)
         
+        # Legs go over the local road graph when one is loaded (off the event loop), else straight
+        return await asyncio.to_thread(self.build_fallback_route, optimized_order, vehicle_type)
+    
+    def build_fallback_route(self, points: List[dict], vehicle_type: str) -> dict:
+        """Route through points in order over the local road graph, straight where it cannot route"""
         coordinates = []
         total_distance = 0
         total_duration = 0
         steps = []
+        routed_legs = 0
         
-        for i in range(len(optimized_order) - 1):
-            current = optimized_order[i]
-            next_point = optimized_order[i + 1]
-            
-            # Generate intermediate points for smoother route
-            segment_coords = self.generate_route_segment(current, next_point)
-            coordinates.extend(segment_coords)
+        for i in range(len(points) - 1):
+            current = points[i]
+            next_point = points[i + 1]
             
             distance = self.calculate_distance(current['lat'], current['lng'], 
                                              next_point['lat'], next_point['lng'])
-            total_distance += distance
-            
-            # Estimate duration based on vehicle type and conditions
             speed = self.get_vehicle_speed(vehicle_type, distance)
-            duration = (distance / speed) * 3600  # Convert to seconds
+            cycling = self.get_osrm_profile(vehicle_type) == "cycling"
+            leg = road_graph.route_leg(current, next_point, max_speed_kmh=speed if cycling else None)
+            
+            if leg is not None:
+                routed_legs += 1
+                segment_coords = leg["coordinates"]
+                distance = leg["distance"] / 1000
+                duration = leg["duration"]
+            else:
+                # Generate intermediate points for smoother route
+                segment_coords = self.generate_route_segment(current, next_point)
+                # Estimate duration based on vehicle type and conditions
+                duration = (distance / speed) * 3600  # Convert to seconds
+            
+            coordinates.extend(segment_coords if not coordinates else segment_coords[1:])
+            total_distance += distance
             total_duration += duration
             
-            steps.append({
+            step = {
                 "instruction": f"Head towards {next_point.get('address', 'destination')}",
                 "distance": distance * 1000,
                 "duration": duration,
                 "type": "straight"
-            })
+            }
+            if leg is not None:
+                step.update({"coordinates": segment_coords, "type": "road"})
+            steps.append(step)
         
+        all_routed = routed_legs and routed_legs == len(steps)
         return {
             "coordinates": coordinates,
             "distance": total_distance * 1000,
             "duration": total_duration,
             "steps": steps,
-            "confidence": "low",
-            "source": "fallback"
+            "confidence": "medium" if all_routed else "low",
+            "source": "local_graph" if all_routed else "fallback"
         }
     
     def optimize_waypoint_order(self, points: List[dict]) -> List[dict]:
-        """Optimize waypoint order using nearest neighbor with 2-opt"""
+        """Optimize waypoint order by road travel time using nearest neighbor with 2-opt/Or-opt local search"""
         if len(points) <= 2:
             return points
         
-        # Start with nearest neighbor
-        unvisited = points[1:].copy()
-        route = [points[0]]
-        current = points[0]
-        
-        while unvisited:
-            nearest = min(unvisited, key=lambda p: self.calculate_distance(
-                current['lat'], current['lng'], p['lat'], p['lng']
-            ))
-            route.append(nearest)
-            unvisited.remove(nearest)
-            current = nearest
-        
-        # Apply 2-opt improvement
-        return self.two_opt_optimize(route)
+        matrix = travel_matrix.cached_matrix(points)
+        order, _ = optimize_path(points, dist=matrix["durations"])
+        return [points[i] for i in order]
     
     def two_opt_optimize(self, route: List[dict]) -> List[dict]:
-        """2-opt optimization for route improvement"""
-        best_route = route.copy()
-        best_distance = self.calculate_route_distance(route)
-        improved = True
-        
-        while improved:
-            improved = False
-            for i in range(1, len(route) - 2):
-                for j in range(i + 1, len(route)):
-                    if j - i == 1: continue
-                    
-                    new_route = route.copy()
-                    new_route[i:j] = route[i:j][::-1]
-                    
-                    new_distance = self.calculate_route_distance(new_route)
-                    if new_distance < best_distance:
-                        best_route = new_route
-                        best_distance = new_distance
-                        improved = True
-            
-            route = best_route
+        """Delta-evaluated 2-opt/Or-opt improvement of a route (first point stays fixed)"""
+        if len(route) <= 3:
+            return route
         
-        return best_route
+        search = LocalSearch(build_matrix(route))
+        return [route[i] for i in search.optimize(list(range(len(route))))]
     
     def calculate_route_distance(self, route: List[dict]) -> float:
         """Calculate total distance for route"""
@@ -557,14 +543,4 @@ class RealTimeRoutingService:
     
     def calculate_distance(self, lat1: float, lng1: float, lat2: float, lng2: float) -> float:
         """Calculate distance between coordinates in km"""
-        R = 6371
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        delta_lat = math.radians(lat2 - lat1)
-        delta_lng = math.radians(lng2 - lng1)
-        
-        a = (math.sin(delta_lat/2)**2 + 
-             math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lng/2)**2)
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        
-        return R * c
\ No newline at end of file
+        return haversine(lat1, lng1, lat2, lng2)
\ No newline at end of file
@@ -0,0 +1,384 @@
+import bz2
+import gzip
+import heapq
+import json
+import math
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.config import settings
+from core.geo import haversine
+
+# Free-flow car speeds in km/h for the roads the graph keeps; anything else is not routable
+HIGHWAY_SPEEDS_KMH = {
+    "motorway": 100, "motorway_link": 60,
+    "trunk": 80, "trunk_link": 50,
+    "primary": 60, "primary_link": 40,
+    "secondary": 50, "secondary_link": 35,
+    "tertiary": 40, "tertiary_link": 30,
+    "unclassified": 30, "residential": 25, "living_street": 10,
+    "service": 15, "road": 25
+}
+NO_ACCESS = {"no", "private"}
+# Speed for the straight hop between a requested point and its snapped graph node
+SNAP_SPEED_MPS = 5.0
+
+ARRAYS = ("lat", "lng", "fwd_ptr", "fwd_to", "fwd_len", "fwd_time",
+          "rev_ptr", "rev_from", "rev_len", "rev_time", "cell_ptr")
+
+
+def _open(path: str):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _maxspeed(value: Optional[str]) -> Optional[float]:
+    """km/h from an OSM maxspeed tag ("50", "30 mph"); None when not numeric"""
+    if not value:
+        return None
+    number = value.split()[0]
+    try:
+        speed = float(number)
+    except ValueError:
+        return None
+    return speed * 1.609 if "mph" in value else speed
+
+
+def _read_ways(path: str) -> List[Tuple[List[int], float, int]]:
+    """(node ids, speed in m/s, oneway as 1, -1 or 0) for every routable way"""
+    ways = []
+    for _, element in ET.iterparse(_open(path), events=("end",)):
+        if element.tag == "way":
+            tags = {tag.get("k"): tag.get("v") for tag in element.iter("tag")}
+            highway = tags.get("highway")
+            if highway in HIGHWAY_SPEEDS_KMH and tags.get("access") not in NO_ACCESS and tags.get("area") != "yes":
+                refs = [int(nd.get("ref")) for nd in element.iter("nd")]
+                speed = _maxspeed(tags.get("maxspeed")) or HIGHWAY_SPEEDS_KMH[highway]
+                oneway = tags.get("oneway")
+                if oneway in ("yes", "1", "true") or tags.get("junction") == "roundabout" or \
+                        (highway == "motorway" and oneway != "no"):
+                    direction = 1
+                elif oneway == "-1":
+                    direction = -1
+                else:
+                    direction = 0
+                if len(refs) >= 2:
+                    ways.append((refs, speed / 3.6, direction))
+            element.clear()
+        elif element.tag in ("node", "relation"):
+            element.clear()
+    return ways
+
+
+def _read_nodes(path: str, wanted: set) -> Dict[int, Tuple[float, float]]:
+    coords = {}
+    for _, element in ET.iterparse(_open(path), events=("end",)):
+        if element.tag == "node":
+            node_id = int(element.get("id"))
+            if node_id in wanted:
+                coords[node_id] = (float(element.get("lat")), float(element.get("lon")))
+            element.clear()
+        elif element.tag in ("way", "relation"):
+            element.clear()
+    return coords
+
+
+def _largest_component(n: int, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """Mask of the nodes in the largest weakly connected component"""
+    parent = list(range(n))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in zip(src.tolist(), dst.tolist()):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[ra] = rb
+    roots = np.fromiter((find(x) for x in range(n)), dtype=np.int64, count=n)
+    return roots == np.bincount(roots).argmax()
+
+
+def _csr(n: int, src: np.ndarray, dst: np.ndarray, *weights: np.ndarray):
+    order = np.argsort(src, kind="stable")
+    ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=ptr[1:])
+    return (ptr, dst[order].astype(np.int32)) + tuple(w[order].astype(np.float32) for w in weights)
+
+
+def build_road_graph(source: str, out_dir: str, cell_size: float = 0.01) -> Dict:
+    """Preprocess an OSM XML extract (.osm, .osm.bz2 or .osm.gz) into ``out_dir``.
+
+    Every way node becomes a graph node; only the largest connected part of
+    the network is kept so snapped points can always reach each other.
+    Nodes are ordered by grid cell, which makes nearest-node lookups a
+    slice of ``cell_ptr`` and keeps each city's nodes close together on
+    disk. Arrays are written as .npy files so they can be memory-mapped.
+    """
+    started = time.perf_counter()
+    ways = _read_ways(source)
+    coords = _read_nodes(source, {ref for refs, _, _ in ways for ref in refs})
+
+    index: Dict[int, int] = {}
+    edges: List[Tuple[int, int, float, float]] = []
+    for refs, speed, direction in ways:
+        refs = [ref for ref in refs if ref in coords]
+        for a, b in zip(refs, refs[1:]):
+            if a == b:
+                continue
+            ia, ib = index.setdefault(a, len(index)), index.setdefault(b, len(index))
+            meters = haversine(*coords[a], *coords[b]) * 1000
+            if direction >= 0:
+                edges.append((ia, ib, meters, meters / speed))
+            if direction <= 0:
+                edges.append((ib, ia, meters, meters / speed))
+    if not index:
+        raise ValueError(f"No routable roads in {source}")
+
+    ids = np.fromiter(index.keys(), dtype=np.int64, count=len(index))
+    lat = np.array([coords[i][0] for i in ids.tolist()])
+    lng = np.array([coords[i][1] for i in ids.tolist()])
+    columns = np.array(edges, dtype=np.float64).T
+    src, dst = columns[0].astype(np.int64), columns[1].astype(np.int64)
+    length, duration = columns[2], columns[3]
+
+    keep = _largest_component(len(ids), src, dst)
+    edge_keep = keep[src] & keep[dst]
+    src, dst, length, duration = src[edge_keep], dst[edge_keep], length[edge_keep], duration[edge_keep]
+    lat, lng = lat[keep], lng[keep]
+
+    # Renumber kept nodes in grid-cell order
+    lat0, lng0 = math.floor(lat.min() / cell_size), math.floor(lng.min() / cell_size)
+    rows = int(math.floor(lat.max() / cell_size)) - lat0 + 1
+    cols = int(math.floor(lng.max() / cell_size)) - lng0 + 1
+    cells = (np.floor(lat / cell_size).astype(np.int64) - lat0) * cols + (np.floor(lng / cell_size).astype(np.int64) - lng0)
+    order = np.argsort(cells, kind="stable")
+    renumber = np.full(len(keep), -1, dtype=np.int64)
+    renumber[np.flatnonzero(keep)[order]] = np.arange(len(order))
+    src, dst = renumber[src], renumber[dst]
+    n = len(order)
+    cell_ptr = np.zeros(rows * cols + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cells[order], minlength=rows * cols), out=cell_ptr[1:])
+
+    fwd_ptr, fwd_to, fwd_len, fwd_time = _csr(n, src, dst, length, duration)
+    rev_ptr, rev_from, rev_len, rev_time = _csr(n, dst, src, length, duration)
+    arrays = {
+        "lat": lat[order], "lng": lng[order],
+        "fwd_ptr": fwd_ptr, "fwd_to": fwd_to, "fwd_len": fwd_len, "fwd_time": fwd_time,
+        "rev_ptr": rev_ptr, "rev_from": rev_from, "rev_len": rev_len, "rev_time": rev_time,
+        "cell_ptr": cell_ptr
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    for name in ARRAYS:
+        np.save(os.path.join(out_dir, f"{name}.npy"), arrays[name])
+    meta = {
+        "source": os.path.basename(source),
+        "built_at": datetime.now().isoformat(),
+        "nodes": n,
+        "edges": int(len(src)),
+        "cell_size": cell_size,
+        "lat0": lat0, "lng0": lng0, "rows": rows, "cols": cols,
+        "max_speed_mps": float((length / np.maximum(duration, 1e-9)).max()),
+        "build_seconds": round(time.perf_counter() - started, 2)
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class RoadGraph:
+    """Offline shortest-path router over a preprocessed OSM road graph.
+
+    The graph is forward and reverse CSR adjacency with per-edge length (m)
+    and free-flow time (s), memory-mapped from the directory written by
+    ``build_road_graph``, so loading costs a few file opens and pages are
+    read on demand. Queries snap both ends to the nearest graph node and run
+    bidirectional A* on travel time with the average of the forward and
+    backward straight-line potentials, which keeps both searches consistent
+    and lets them stop as soon as their frontiers can no longer improve the
+    best meeting point.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_snap_m: float = 500):
+        self.path = path
+        self.max_snap_m = max_snap_m
+        self.meta: Optional[Dict] = None
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self.stats = {"queries": 0, "no_path": 0, "snap_failures": 0, "settled": 0, "query_ms": 0.0}
+
+    def load(self, path: Optional[str] = None) -> bool:
+        """Memory-map a built graph; False when there is none at the path"""
+        path = path or self.path
+        if not path or not os.path.exists(os.path.join(path, "meta.json")):
+            return False
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+        with self._lock:
+            self.path, self.meta, self._arrays = path, meta, arrays
+        return True
+
+    @property
+    def available(self) -> bool:
+        return self.meta is not None
+
+    def nearest(self, lat: float, lng: float) -> Optional[Tuple[int, float]]:
+        """(node, distance in m) of the closest graph node within ``max_snap_m``"""
+        meta, a = self.meta, self._arrays
+        size = meta["cell_size"]
+        row = math.floor(lat / size) - meta["lat0"]
+        col = math.floor(lng / size) - meta["lng0"]
+        reach = int(self.max_snap_m / (size * 111_000 * max(0.1, math.cos(math.radians(lat))))) + 1
+        best: Optional[Tuple[int, float]] = None
+        for ring in range(reach + 1):
+            for r in range(row - ring, row + ring + 1):
+                if not 0 <= r < meta["rows"]:
+                    continue
+                for c in range(col - ring, col + ring + 1):
+                    if not 0 <= c < meta["cols"] or max(abs(r - row), abs(c - col)) != ring:
+                        continue
+                    cell = r * meta["cols"] + c
+                    start, end = int(a["cell_ptr"][cell]), int(a["cell_ptr"][cell + 1])
+                    if start == end:
+                        continue
+                    lats, lngs = np.asarray(a["lat"][start:end]), np.asarray(a["lng"][start:end])
+                    d2 = (lats - lat) ** 2 + ((lngs - lng) * math.cos(math.radians(lat))) ** 2
+                    k = int(d2.argmin())
+                    meters = haversine(lat, lng, float(lats[k]), float(lngs[k])) * 1000
+                    if best is None or meters < best[1]:
+                        best = (start + k, meters)
+            # Anything in a further ring is at least ``ring`` cells away
+            if best is not None and best[1] <= ring * size * 111_000 * math.cos(math.radians(lat)):
+                break
+        return best if best is not None and best[1] <= self.max_snap_m else None
+
+    def shortest_path(self, s: int, t: int,
+                      max_speed_mps: Optional[float] = None) -> Optional[Tuple[List[int], float, float]]:
+        """(nodes, meters, seconds) of the fastest path from node s to node t, or None.
+
+        ``max_speed_mps`` caps edge speeds when timing the path (not when choosing it).
+        """
+        a = self._arrays
+        lat, lng = a["lat"], a["lng"]
+        if s == t:
+            return [s], 0.0, 0.0
+        slat, slng, tlat, tlng = float(lat[s]), float(lng[s]), float(lat[t]), float(lng[t])
+        inverse_speed = 1000 / self.meta["max_speed_mps"]
+        potentials: Dict[int, float] = {}
+
+        def potential(v: int) -> float:
+            p = potentials.get(v)
+            if p is None:
+                vlat, vlng = float(lat[v]), float(lng[v])
+                p = (haversine(vlat, vlng, tlat, tlng) - haversine(slat, slng, vlat, vlng)) * inverse_speed / 2
+                potentials[v] = p
+            return p
+
+        ptr = (a["fwd_ptr"], a["rev_ptr"])
+        adj = (a["fwd_to"], a["rev_from"])
+        cost = (a["fwd_time"], a["rev_time"])
+        dist: Tuple[Dict[int, float], Dict[int, float]] = ({s: 0.0}, {t: 0.0})
+        parent: Tuple[Dict, Dict] = ({s: None}, {t: None})
+        settled = (set(), set())
+        heaps = ([(potential(s), s)], [(-potential(t), t)])
+        best, meet = math.inf, -1
+
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+            _, u = heapq.heappop(heaps[side])
+            if u in settled[side]:
+                continue
+            settled[side].add(u)
+            du, own, other = dist[side][u], dist[side], dist[1 - side]
+            start, end = int(ptr[side][u]), int(ptr[side][u + 1])
+            sign = 1 if side == 0 else -1
+            for e, v, w in zip(range(start, end), adj[side][start:end].tolist(), cost[side][start:end].tolist()):
+                nd = du + w
+                if nd < own.get(v, math.inf):
+                    own[v] = nd
+                    parent[side][v] = (u, e)
+                    heapq.heappush(heaps[side], (nd + sign * potential(v), v))
+                    if v in other and nd + other[v] < best:
+                        best, meet = nd + other[v], v
+
+        self.stats["settled"] += len(settled[0]) + len(settled[1])
+        if meet < 0:
+            return None
+        nodes, forward, backward = [meet], [], []
+        v = meet
+        while parent[0][v] is not None:
+            v, e = parent[0][v]
+            nodes.append(v)
+            forward.append(e)
+        nodes.reverse()
+        v = meet
+        while parent[1][v] is not None:
+            v, e = parent[1][v]
+            nodes.append(v)
+            backward.append(e)
+        lengths = np.concatenate((a["fwd_len"][forward], a["rev_len"][backward])).astype(np.float64)
+        seconds = best
+        if max_speed_mps:
+            times = np.concatenate((a["fwd_time"][forward], a["rev_time"][backward])).astype(np.float64)
+            seconds = float(np.maximum(times, lengths / max_speed_mps).sum())
+        return nodes, float(lengths.sum()), seconds
+
+    def route_leg(self, start: Dict, end: Dict, max_speed_kmh: Optional[float] = None) -> Optional[Dict]:
+        """Road geometry, distance (m) and duration (s) between two points; None when not routable.
+
+        ``max_speed_kmh`` caps edge speeds for slower vehicles.
+        """
+        if not self.available:
+            return None
+        started = time.perf_counter()
+        self.stats["queries"] += 1
+        try:
+            source, target = self.nearest(start["lat"], start["lng"]), self.nearest(end["lat"], end["lng"])
+            if source is None or target is None:
+                self.stats["snap_failures"] += 1
+                return None
+            found = self.shortest_path(source[0], target[0], max_speed_kmh / 3.6 if max_speed_kmh else None)
+            if found is None:
+                self.stats["no_path"] += 1
+                return None
+            nodes, meters, seconds = found
+            lat, lng = self._arrays["lat"], self._arrays["lng"]
+            index = np.asarray(nodes)
+            coordinates = [[start["lng"], start["lat"]]] + \
+                np.column_stack((lng[index], lat[index])).astype(float).tolist() + [[end["lng"], end["lat"]]]
+            snap = source[1] + target[1]
+            return {
+                "coordinates": coordinates,
+                "distance": meters + snap,
+                "duration": seconds + snap / SNAP_SPEED_MPS
+            }
+        finally:
+            self.stats["query_ms"] += (time.perf_counter() - started) * 1000
+
+    def get_stats(self) -> dict:
+        queries = self.stats["queries"]
+        return {
+            **{k: v for k, v in self.stats.items() if k != "query_ms"},
+            "available": self.available,
+            "path": self.path,
+            "graph": self.meta,
+            "avg_query_ms": round(self.stats["query_ms"] / queries, 2) if queries else 0,
+            "avg_settled": round(self.stats["settled"] / queries) if queries else 0
+        }
+
+
+road_graph = RoadGraph(path=settings.ROAD_GRAPH_PATH or None, max_snap_m=settings.ROAD_GRAPH_MAX_SNAP_METERS)
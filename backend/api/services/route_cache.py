@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from core.config import settings
+
+
+def _copy(value):
+    # Callers get their own top-level dict so adding keys never touches the cached entry
+    return dict(value) if isinstance(value, dict) else value
+
+
+class RouteCache:
+    """Bounded LRU + TTL cache of routing results.
+
+    Keys combine the profile, a time-of-day bucket and every point snapped to
+    ``precision`` decimals (3 is about 110 m), so a driver polling the same
+    stops from roughly the same spot is answered from memory. Cached values are
+    shared and must be treated as read-only. The cache can be saved to and
+    loaded from a JSON file to survive restarts.
+    """
+
+    def __init__(self, max_entries: int = 2000, ttl: float = 900, precision: int = 3,
+                 bucket_minutes: int = 30, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.precision = precision
+        self.bucket_minutes = bucket_minutes
+        self.path = path
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "stores": 0, "evictions": 0, "expired": 0, "loaded": 0}
+
+    def key(self, points: Iterable[dict], profile: str, when: Optional[datetime] = None) -> str:
+        when = when or datetime.now()
+        bucket = (when.hour * 60 + when.minute) // self.bucket_minutes
+        snapped = ";".join(f"{round(p['lat'], self.precision)},{round(p['lng'], self.precision)}" for p in points)
+        return f"{profile}|{bucket}|{snapped}"
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires"] <= time.time():
+            del self._entries[key]
+            self.stats["expired"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry["value"]
+
+    def put(self, key: str, value: dict) -> None:
+        self._entries[key] = {"value": value, "expires": time.time() + self.ttl}
+        self._entries.move_to_end(key)
+        self.stats["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    async def get_or_fetch(self, points: Iterable[dict], profile: str, fetch: Callable[[], Awaitable[dict]],
+                           cacheable: Callable[[dict], bool] = lambda value: bool(value)) -> Optional[dict]:
+        """Cached result for the points, or fetch it once for all concurrent callers.
+
+        Results failing ``cacheable`` (e.g. straight-line fallbacks) are
+        returned but not stored.
+        """
+        key = self.key(points, profile)
+        value = self.get(key)
+        if value is not None:
+            self.stats["hits"] += 1
+            return _copy(value)
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return _copy(await asyncio.shield(pending))
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await fetch()
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            if cacheable(value):
+                self.put(key, value)
+            future.set_result(value)
+            return _copy(value)
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    # Persistence
+
+    def save(self, path: Optional[str] = None) -> int:
+        """Write unexpired entries to disk atomically; returns the number saved"""
+        path = path or self.path
+        if not path:
+            return 0
+        now = time.time()
+        entries = {k: e for k, e in self._entries.items() if e["expires"] > now}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"saved_at": now, "entries": entries}, f)
+        os.replace(tmp_path, path)
+        return len(entries)
+
+    def load(self, path: Optional[str] = None) -> int:
+        """Restore unexpired entries from disk (oldest first, so LRU order is kept)"""
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with open(path) as f:
+                entries = json.load(f).get("entries", {})
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Route cache file unreadable ({path}): {e}")
+            return 0
+        now = time.time()
+        loaded = 0
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]["expires"]):
+            if entry["expires"] > now:
+                self._entries[key] = entry
+                loaded += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.stats["loaded"] += loaded
+        return loaded
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "hit_rate": round((self.stats["hits"] + self.stats["coalesced"]) / lookups, 3) if lookups else 0,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "persist_path": self.path
+        }
+
+
+route_cache = RouteCache(
+    max_entries=settings.ROUTE_CACHE_MAX_ENTRIES,
+    ttl=settings.ROUTE_CACHE_TTL_SECONDS,
+    path=settings.ROUTE_CACHE_FILE or None
+)
@@ -1,6 +1,8 @@
-import httpx
 from api.models.order import Order
 from api.services.data_logger import DataLogger
+from api.services.weather import weather_provider
+from core import polyline
+from core.config import settings
 
 class RouteMonitor:
     """Monitor routes for traffic and weather changes, trigger rerouting"""
@@ -35,7 +37,8 @@ class RouteMonitor:
             )
             
             if new_route:
-                order.route_geometry = new_route['geometry']
+                order.route_geometry = polyline.compact(new_route['geometry'],
+                                                        settings.ROUTE_GEOMETRY_STORE_TOLERANCE_METERS)
                 order.route_duration = new_route['duration']
                 order.route_distance = new_route['distance']
                 await order.save()
@@ -60,23 +63,9 @@ class RouteMonitor:
     
     @staticmethod
     async def get_weather(lat: float, lng: float):
-        """Get current weather conditions"""
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    "https://api.open-meteo.com/v1/forecast",
-                    params={
-                        "latitude": lat,
-                        "longitude": lng,
-                        "current": "temperature_2m,weather_code,wind_speed_10m"
-                    },
-                    timeout=3.0
-                )
-                if response.status_code == 200:
-                    return response.json()
-        except:
-            pass
-        return None
+        """Get current weather conditions from the shared weather cache"""
+        current = await weather_provider.get_current(lat, lng)
+        return {"current": current} if current is not None else None
     
     @staticmethod
     async def calculate_new_route(from_lat: float, from_lng: float, 
@@ -90,7 +79,7 @@ class RouteMonitor:
             if route_data and route_data.get('code') == 'Ok' and route_data.get('routes'):
                 route = route_data['routes'][0]
                 return {
-                    'geometry': route['geometry']['coordinates'],
+                    'geometry': polyline.decode(route['geometry']),
                     'duration': route.get('duration'),
                     'distance': route.get('distance')
                 }
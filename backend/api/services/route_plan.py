@@ -0,0 +1,281 @@
+import asyncio
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from api.services.lns import LargeNeighborhoodSearch
+from api.services.local_search import EPSILON, route_cost
+from api.services.multi_package_optimizer import MultiPackageOptimizer
+from api.services.travel_matrix import travel_matrix
+from core.config import settings
+from core.store import IndexedStore, orders_db, drivers_db
+
+ACTIVE_STATUSES = ("accepted", "assigned", "picked_up", "in_transit")
+
+
+class RoutePlanManager:
+    """Persistent stop sequence per driver, kept in step with order changes.
+
+    A plan is built with a full solve the first time a driver's route is
+    read. After that, an accepted order has its pickup and delivery inserted
+    at the cheapest feasible positions and finished stops are dropped, so
+    reads only re-time the existing sequence. Insertions add to the plan's
+    drift: the share of its length that comes from incremental edits since
+    the last full solve. A background task re-solves plans whose drift passes
+    ``drift_threshold``, with ``search_budget`` seconds of large neighborhood
+    search on top, and keeps the result when it is better.
+    """
+
+    def __init__(self, orders: IndexedStore, drivers: IndexedStore, drift_threshold: float = 0.2,
+                 interval: float = 10.0, search_budget: float = 0.0,
+                 optimizer: Optional[MultiPackageOptimizer] = None):
+        self.orders = orders
+        self.drivers = drivers
+        self.drift_threshold = drift_threshold
+        self.interval = interval
+        self.search_budget = search_budget
+        self.optimizer = optimizer or MultiPackageOptimizer()
+        self.plans: Dict[str, dict] = {}
+        self._lock = threading.RLock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"built": 0, "insertions": 0, "removals": 0, "reoptimized": 0, "improved": 0,
+                      "stale": 0, "errors": 0}
+        orders.add_listener(self.on_change)
+
+    # Plans
+
+    def get_plan(self, driver_id: str) -> Optional[dict]:
+        """The driver's plan, built from their active orders on first use"""
+        with self._lock:
+            plan = self.plans.get(driver_id)
+            if plan is None:
+                plan = self._build(driver_id)
+            return plan
+
+    def _build(self, driver_id: str) -> Optional[dict]:
+        driver = self.drivers.get(driver_id)
+        if not driver:
+            return None
+        orders = [o for o in self.orders.find("assigned_driver", driver_id) if o["status"] in ACTIVE_STATUSES]
+        route_data = self.optimizer.optimize_multi_delivery_route(
+            driver["current_location"], orders, capacity=driver.get("vehicle_capacity"))
+        now = datetime.now().isoformat()
+        plan = {
+            "driver_id": driver_id,
+            "stops": [self._bare(point) for point in route_data["route"][1:]],
+            "version": 1,
+            "cost_km": route_data["total_distance"],
+            "inserted_km": 0.0,
+            "inserted": {},
+            "optimized_at": now,
+            "updated_at": now
+        }
+        self.plans[driver_id] = plan
+        self.stats["built"] += 1
+        return plan
+
+    @staticmethod
+    def _bare(point: dict) -> dict:
+        return {key: point[key] for key in ("type", "location", "order_id", "order")}
+
+    @staticmethod
+    def drift(plan: dict) -> float:
+        return plan["inserted_km"] / plan["cost_km"] if plan["cost_km"] > EPSILON else 0.0
+
+    def _touch(self, plan: dict, stops: List[dict], cost_km: float) -> None:
+        plan["stops"] = stops
+        plan["cost_km"] = round(cost_km, 3)
+        plan["version"] += 1
+        plan["updated_at"] = datetime.now().isoformat()
+
+    def insert_order(self, driver_id: str, order: dict) -> None:
+        """Add the order's remaining stops at their cheapest feasible positions"""
+        with self._lock:
+            plan = self.plans.get(driver_id)
+            driver = self.drivers.get(driver_id)
+            new_stops = self.optimizer.order_stops(order)
+            if plan is None or driver is None or not new_stops:
+                return
+            stops = plan["stops"]
+            points, solver = self.optimizer.build_problem(
+                driver["current_location"], stops + new_stops, driver.get("vehicle_capacity"), datetime.now())
+            route = list(range(len(stops) + 1))
+            request = next(r for r in solver.requests if r[1] == len(points) - 1)
+            added = solver.insert(route, request)
+            cost = route_cost(solver.dist, route)
+            # Inserting into an empty plan is already optimal
+            if stops:
+                plan["inserted"][order["id"]] = plan["inserted"].get(order["id"], 0.0) + added
+            else:
+                plan["inserted"] = {}
+            plan["inserted_km"] = sum(plan["inserted"].values())
+            self._touch(plan, [points[i] for i in route[1:]], cost)
+            self.stats["insertions"] += 1
+
+    def remove_stops(self, driver_id: str, order_id: str, stop_type: Optional[str] = None) -> None:
+        """Drop the order's stops (or only those of ``stop_type``) from the driver's plan"""
+        with self._lock:
+            plan = self.plans.get(driver_id)
+            driver = self.drivers.get(driver_id)
+            if plan is None:
+                return
+            stops = [s for s in plan["stops"]
+                     if s["order_id"] != order_id or (stop_type is not None and s["type"] != stop_type)]
+            if len(stops) == len(plan["stops"]):
+                return
+            cost = 0.0
+            if stops and driver:
+                matrix = travel_matrix.cached_matrix([driver["current_location"]] + [s["location"] for s in stops])
+                cost = route_cost(matrix["distances"], list(range(len(stops) + 1)))
+            # An inserted order takes its detour with it; other removals keep the drift
+            # ratio, and one stop left is trivially optimal
+            if len(stops) <= 1 or plan["cost_km"] <= EPSILON:
+                plan["inserted"] = {}
+            elif order_id in plan["inserted"] and not any(s["order_id"] == order_id for s in stops):
+                del plan["inserted"][order_id]
+            else:
+                scale = min(1.0, cost / plan["cost_km"])
+                plan["inserted"] = {key: km * scale for key, km in plan["inserted"].items()}
+            plan["inserted_km"] = sum(plan["inserted"].values())
+            self._touch(plan, stops, cost)
+            self.stats["removals"] += 1
+
+    def _sync_order(self, driver_id: str, order: dict) -> None:
+        with self._lock:
+            plan = self.plans.get(driver_id)
+            if plan is None:
+                return
+            current = [s["type"] for s in plan["stops"] if s["order_id"] == order["id"]]
+            wanted = [s["type"] for s in self.optimizer.order_stops(order)]
+            if sorted(current) == sorted(wanted):
+                return
+            if current and set(wanted) < set(current):
+                # Picked up: only the delivery is left
+                for stop_type in set(current) - set(wanted):
+                    self.remove_stops(driver_id, order["id"], stop_type)
+                return
+            self.remove_stops(driver_id, order["id"])
+            self.insert_order(driver_id, order)
+
+    def on_change(self, event: str, record, field, old, new) -> None:
+        """Store listener: keep plans in step with order status and driver assignment"""
+        if event == "update" and field not in ("status", "assigned_driver"):
+            return
+        try:
+            if event == "remove":
+                if record.get("assigned_driver"):
+                    self.remove_stops(record["assigned_driver"], record["id"])
+                return
+            if field == "assigned_driver" and old:
+                self.remove_stops(old, record["id"])
+            if record.get("assigned_driver"):
+                self._sync_order(record["assigned_driver"], record)
+        except Exception as e:
+            # A plan that could not be updated is rebuilt from scratch on its next read
+            print(f"❌ Route plan update failed for order {record.get('id')}: {e}")
+            self.stats["errors"] += 1
+            with self._lock:
+                self.plans.pop(record.get("assigned_driver"), None)
+                if field == "assigned_driver":
+                    self.plans.pop(old, None)
+
+    # Reads
+
+    def route_for(self, driver: dict) -> Dict:
+        """Route data for the driver's plan, timed from their current location"""
+        plan = self.get_plan(driver["id"])
+        stops = list(plan["stops"]) if plan else []
+        route_data = self.optimizer.evaluate_route(driver["current_location"], stops,
+                                                   capacity=driver.get("vehicle_capacity"))
+        if plan:
+            route_data["plan"] = {
+                "version": plan["version"],
+                "drift": round(self.drift(plan), 3),
+                "optimized_at": plan["optimized_at"],
+                "updated_at": plan["updated_at"]
+            }
+        return route_data
+
+    # Background re-optimization
+
+    def reoptimize(self, driver_id: str) -> bool:
+        """Re-solve the plan from scratch; True if the new sequence replaced it"""
+        with self._lock:
+            plan = self.plans.get(driver_id)
+            driver = self.drivers.get(driver_id)
+            if plan is None or driver is None:
+                return False
+            version = plan["version"]
+            stops = list(plan["stops"])
+            location = dict(driver["current_location"])
+            capacity = driver.get("vehicle_capacity")
+
+        # Solve outside the lock; the result is dropped if the plan changed meanwhile
+        points, solver = self.optimizer.build_problem(location, stops, capacity, datetime.now())
+        current = list(range(len(points)))
+        current_late = float(solver.lateness(current)[1].sum())
+        current_km = route_cost(solver.dist, current)
+        route, _ = solver.solve()
+        if self.search_budget > 0:
+            route, _ = LargeNeighborhoodSearch(solver).run(route, self.search_budget)
+        _, late = solver.lateness(route)
+        km = route_cost(solver.dist, route)
+        better = float(late.sum()) < current_late - EPSILON or \
+            (float(late.sum()) <= current_late + EPSILON and km < current_km - EPSILON)
+
+        with self._lock:
+            self.stats["reoptimized"] += 1
+            if self.plans.get(driver_id) is not plan or plan["version"] != version:
+                self.stats["stale"] += 1
+                return False
+            plan["inserted_km"] = 0.0
+            plan["inserted"] = {}
+            plan["optimized_at"] = datetime.now().isoformat()
+            if better:
+                self._touch(plan, [points[i] for i in route[1:]], km)
+                self.stats["improved"] += 1
+            return better
+
+    def drifted(self) -> List[str]:
+        with self._lock:
+            return [driver_id for driver_id, plan in self.plans.items() if self.drift(plan) > self.drift_threshold]
+
+    async def run(self) -> None:
+        while True:
+            for driver_id in self.drifted():
+                try:
+                    await asyncio.to_thread(self.reoptimize, driver_id)
+                except Exception as e:
+                    print(f"❌ Route plan re-optimization failed for {driver_id}: {e}")
+                    self.stats["errors"] += 1
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            drifts = [self.drift(plan) for plan in self.plans.values()]
+        return {
+            **self.stats,
+            "plans": len(drifts),
+            "drifted": sum(1 for d in drifts if d > self.drift_threshold),
+            "max_drift": round(max(drifts), 3) if drifts else 0.0,
+            "drift_threshold": self.drift_threshold,
+            "reoptimizer_running": self._task is not None and not self._task.done()
+        }
+
+
+route_plans = RoutePlanManager(orders_db, drivers_db, drift_threshold=settings.ROUTE_PLAN_DRIFT_THRESHOLD,
+                               interval=settings.ROUTE_PLAN_REOPTIMIZE_INTERVAL_SECONDS,
+                               search_budget=settings.ROUTE_PLAN_SEARCH_BUDGET_SECONDS)
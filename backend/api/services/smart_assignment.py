@@ -1,42 +1,17 @@
-from datetime import datetime
-import requests
-import math
+import numpy as np
+from api.services.fleet_snapshot import FleetSnapshot
+from api.services.weather import weather_provider
+from core.spatial import driver_locations, CITY_RADIUS_KM, MAX_CANDIDATES
+from core.geo import haversine, distances_from
+from core.driver_load import current_load
 
 class SmartAssignmentService:
-    def __init__(self):
-        self.weather_cache = {}
-        
     async def get_weather_conditions(self, city: str) -> dict:
-        """Get current weather conditions for a city"""
-        if city in self.weather_cache:
-            cached = self.weather_cache[city]
-            if (datetime.now() - cached['timestamp']).seconds < 1800:  # 30 min cache
-                return cached['data']
-        
-        try:
-            # Free weather API (no key needed)
-            coords = self.get_city_coordinates(city)
-            url = f"https://api.open-meteo.com/v1/current?latitude={coords['lat']}&longitude={coords['lng']}&current=temperature_2m,precipitation,weather_code,wind_speed_10m"
-            response = requests.get(url, timeout=5)
-            data = response.json()
-            
-            weather = {
-                'temperature': data['current']['temperature_2m'],
-                'precipitation': data['current']['precipitation'],
-                'weather_code': data['current']['weather_code'],
-                'wind_speed': data['current']['wind_speed_10m'],
-                'condition': self.get_weather_condition(data['current']['weather_code']),
-                'is_rainy': data['current']['precipitation'] > 0.1,
-                'is_stormy': data['current']['wind_speed_10m'] > 25
-            }
-            
-            self.weather_cache[city] = {
-                'data': weather,
-                'timestamp': datetime.now()
-            }
-            
-            return weather
-        except:
+        """Get current weather conditions for a city (shared process-wide cache)"""
+        coords = self.get_city_coordinates(city)
+        current = await weather_provider.get_current(coords['lat'], coords['lng'])
+        
+        if current is None:
             # Fallback weather
             return {
                 'temperature': 20,
@@ -45,6 +20,16 @@ class SmartAssignmentService:
                 'is_rainy': False,
                 'is_stormy': False
             }
+        
+        return {
+            'temperature': current.get('temperature_2m', 20),
+            'precipitation': current.get('precipitation', 0),
+            'weather_code': current.get('weather_code', 0),
+            'wind_speed': current.get('wind_speed_10m', 0),
+            'condition': self.get_weather_condition(current.get('weather_code', 0)),
+            'is_rainy': current.get('precipitation', 0) > 0.1,
+            'is_stormy': current.get('wind_speed_10m', 0) > 25
+        }
     
     def get_weather_condition(self, code: int) -> str:
         """Convert weather code to condition"""
@@ -79,20 +64,13 @@ class SmartAssignmentService:
         pickup_coords = self.get_city_coordinates(order["pickup_city"])
         weather = await self.get_weather_conditions(order["pickup_city"])
         
-        best_driver = None
-        best_score = -1
-        
-        for driver in available_drivers:
-            if not self.is_driver_suitable(driver, order, weather):
-                continue
-                
-            score = await self.calculate_driver_score(driver, order, pickup_coords, weather)
-            
-            if score > best_score:
-                best_score = score
-                best_driver = driver
+        suitable = [d for d in available_drivers if self.is_driver_suitable(d, order, weather)]
+        if not suitable:
+            return None
         
-        return best_driver
+        # Score every suitable driver in one vectorized pass (first best wins ties)
+        scores = self.score_fleet(FleetSnapshot(suitable), order, pickup_coords, weather)
+        return suitable[int(np.argmax(scores))]
     
     def is_driver_suitable(self, driver: dict, order: dict, weather: dict) -> bool:
         """Check if driver is suitable for the order given weather conditions"""
@@ -108,8 +86,7 @@ class SmartAssignmentService:
             return False
         
         # Relaxed capacity check
-        current_load = sum([self.get_order_weight(oid) for oid in driver.get("current_orders", [])])
-        if current_load + order.get("weight", 1) > driver.get("vehicle_capacity", 50):
+        if current_load(driver)["weight"] + order.get("weight", 1) > driver.get("vehicle_capacity", 50):
             return False
         
         # Relaxed max orders
@@ -155,6 +132,31 @@ class SmartAssignmentService:
         
         return score
     
+    def score_fleet(self, fleet: FleetSnapshot, order: dict, pickup_coords: dict, weather: dict) -> np.ndarray:
+        """Vectorized calculate_driver_score for every driver of a fleet snapshot"""
+        score = np.zeros(len(fleet))
+        
+        # Distance factor (40% weight), only for drivers reporting a location
+        lat = np.where(np.isnan(fleet.lat), pickup_coords["lat"], fleet.lat)
+        lng = np.where(np.isnan(fleet.lng), pickup_coords["lng"], fleet.lng)
+        distance = distances_from(pickup_coords["lat"], pickup_coords["lng"], lat, lng)
+        score += np.where(fleet.has_location, np.maximum(0, 100 - distance * 10) * 0.4, 0)
+        
+        # Driver rating (25% weight)
+        score += (fleet.rating / 5.0) * 100 * 0.25
+        
+        # Vehicle suitability (20% weight)
+        score += fleet.vehicle_table(lambda vt: self.get_vehicle_weather_score(vt, weather, order)) * 0.2
+        
+        # Current load factor (10% weight)
+        max_orders = fleet.vehicle_table(lambda vt: {"bike": 3, "scooter": 4, "car": 6, "van": 8}.get(vt, 3))
+        score += (1 - fleet.order_count / max_orders) * 100 * 0.1
+        
+        # Experience factor (5% weight)
+        score += np.minimum(100, fleet.total_deliveries * 2) * 0.05
+        
+        return score
+    
     def get_vehicle_weather_score(self, vehicle_type: str, weather: dict, order: dict) -> float:
         """Score vehicle suitability based on weather and order"""
         base_scores = {
@@ -194,31 +196,17 @@ class SmartAssignmentService:
     
     def calculate_distance(self, lat1: float, lng1: float, lat2: float, lng2: float) -> float:
         """Calculate distance between coordinates in km"""
-        R = 6371
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        delta_lat = math.radians(lat2 - lat1)
-        delta_lng = math.radians(lng2 - lng1)
-        
-        a = (math.sin(delta_lat/2)**2 + 
-             math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lng/2)**2)
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        
-        return R * c
-    
-    def get_order_weight(self, order_id: str) -> float:
-        """Get order weight by ID (mock implementation)"""
-        return 2.0  # Default weight
+        return haversine(lat1, lng1, lat2, lng2)
     
     async def reassign_order(self, order: dict, excluded_drivers: list = []) -> dict:
         """Reassign order to next best available driver"""
-        from main import drivers_db  # Import here to avoid circular imports
-        
-        available_drivers = [
-            d for d in drivers_db 
-            if d["id"] not in excluded_drivers and 
-            d.get("status") == "available" and
-            d.get("current_location", {}).get("city", "").lower() == order["pickup_city"].lower()
-        ]
+        
+        pickup_coords = self.get_city_coordinates(order["pickup_city"])
+        available_drivers = [d for d, _ in driver_locations.nearest(
+            pickup_coords["lat"], pickup_coords["lng"], k=MAX_CANDIDATES, max_distance_km=CITY_RADIUS_KM,
+            statuses=["available"],
+            predicate=lambda d: d["id"] not in excluded_drivers and
+                                (d.get("current_location") or {}).get("city", "").lower() == order["pickup_city"].lower()
+        )]
         
         return await self.find_best_driver(order, available_drivers)
\ No newline at end of file
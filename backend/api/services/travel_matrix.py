@@ -0,0 +1,193 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from core.config import settings
+from core.geo import haversine
+from core.http import http_client
+
+TABLE_SERVERS = [
+    "https://router.project-osrm.org/table/v1",
+    "https://routing.openstreetmap.de/routed-car/table/v1"
+]
+
+Point = Tuple[float, float]
+
+
+class TravelMatrixService:
+    """Road distance and duration matrices from the OSRM Table API.
+
+    Cells (one origin, one destination) are cached individually, keyed by
+    coordinates snapped to ``precision`` decimals, so a new matrix only asks
+    OSRM for the pairs it has not seen. Large matrices are split into blocks
+    of at most ``max_coordinates`` points per request and merged. Pairs OSRM
+    cannot provide are estimated as haversine distance times
+    ``detour_factor`` at ``fallback_speed_kmh``; those are never cached.
+
+    Optimizers are synchronous, so ``cached_matrix`` never waits on the
+    network: it serves what is cached, estimates the rest and fetches the
+    missing pairs in the background for the next call. Async callers can
+    ``await matrix()`` to get road values straight away.
+    """
+
+    def __init__(self, servers: Optional[List[str]] = None, max_coordinates: int = 100, precision: int = 4,
+                 ttl: float = 6 * 3600, max_cells: int = 200_000, detour_factor: float = 1.3,
+                 fallback_speed_kmh: float = 30.0, deadline: float = 8.0, retry_after: float = 30.0):
+        self.servers = servers or TABLE_SERVERS
+        self.max_coordinates = max(2, max_coordinates)
+        self.precision = precision
+        self.ttl = ttl
+        self.max_cells = max_cells
+        self.detour_factor = detour_factor
+        self.fallback_speed_kmh = fallback_speed_kmh
+        self.deadline = deadline
+        self.retry_after = retry_after
+        self._cells: "OrderedDict[Tuple[str, Point, Point], Tuple[float, float, float]]" = OrderedDict()
+        self._down_until = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._prefetching: Set[Tuple[str, frozenset]] = set()
+        self.stats = {"cell_hits": 0, "cell_misses": 0, "requests": 0, "request_errors": 0,
+                      "cells_fetched": 0, "fallback_cells": 0, "prefetches": 0}
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Event loop that background fetches from synchronous callers run on"""
+        self._loop = loop
+
+    def _point(self, location: Dict) -> Point:
+        return round(float(location["lat"]), self.precision), round(float(location["lng"]), self.precision)
+
+    def _fallback(self, a: Point, b: Point) -> Tuple[float, float]:
+        km = haversine(a[0], a[1], b[0], b[1]) * self.detour_factor
+        return km, km / self.fallback_speed_kmh * 60
+
+    def _get(self, profile: str, a: Point, b: Point, now: float) -> Optional[Tuple[float, float]]:
+        cell = self._cells.get((profile, a, b))
+        if cell is None or cell[2] < now:
+            return None
+        self._cells.move_to_end((profile, a, b))
+        return cell[0], cell[1]
+
+    def _put(self, profile: str, a: Point, b: Point, km: float, minutes: float) -> None:
+        self._cells[(profile, a, b)] = (km, minutes, time.monotonic() + self.ttl)
+        self._cells.move_to_end((profile, a, b))
+        while len(self._cells) > self.max_cells:
+            self._cells.popitem(last=False)
+
+    def _missing(self, points: List[Point], profile: str) -> List[Tuple[int, int]]:
+        now = time.monotonic()
+        return [(i, j) for i, a in enumerate(points) for j, b in enumerate(points)
+                if i != j and self._get(profile, a, b, now) is None]
+
+    def _assemble(self, locations: List[Dict], profile: str) -> Dict:
+        """Matrix from cached cells, estimating the pairs that are not cached"""
+        points = [self._point(location) for location in locations]
+        n = len(points)
+        distances = np.zeros((n, n))
+        durations = np.zeros((n, n))
+        now = time.monotonic()
+        estimated = 0
+        for i, a in enumerate(points):
+            for j, b in enumerate(points):
+                if i == j or a == b:
+                    continue
+                cell = self._get(profile, a, b, now)
+                if cell is None:
+                    cell = self._fallback(a, b)
+                    estimated += 1
+                distances[i, j], durations[i, j] = cell
+        pairs = n * (n - 1)
+        self.stats["cell_hits"] += pairs - estimated
+        self.stats["cell_misses"] += estimated
+        self.stats["fallback_cells"] += estimated
+        return {
+            "distances": distances,
+            "durations": durations,
+            "source": "osrm" if not estimated else "fallback" if estimated == pairs else "mixed",
+            "estimated_cells": estimated
+        }
+
+    def cached_matrix(self, locations: List[Dict], profile: str = "driving", prefetch: bool = True) -> Dict:
+        """Distances in km and durations in minutes without waiting on the network"""
+        locations = list(locations)
+        result = self._assemble(locations, profile)
+        if prefetch and result["estimated_cells"] and self._loop is not None and self._loop.is_running():
+            key = (profile, frozenset(self._point(location) for location in locations))
+            if key not in self._prefetching and time.monotonic() >= self._down_until:
+                self._prefetching.add(key)
+                self.stats["prefetches"] += 1
+                future = asyncio.run_coroutine_threadsafe(self.matrix(locations, profile), self._loop)
+                future.add_done_callback(lambda _: self._prefetching.discard(key))
+        return result
+
+    async def matrix(self, locations: List[Dict], profile: str = "driving") -> Dict:
+        """Distances in km and durations in minutes, fetching uncached pairs from OSRM first"""
+        locations = list(locations)
+        points = list(dict.fromkeys(self._point(location) for location in locations))
+        missing = self._missing(points, profile)
+        if missing and time.monotonic() >= self._down_until:
+            # Blocks of half the coordinate limit, so any two of them fit in one square request
+            size = len(points) if len(points) <= self.max_coordinates else max(1, self.max_coordinates // 2)
+            blocks = [list(range(start, min(start + size, len(points)))) for start in range(0, len(points), size)]
+            block_of = {index: b for b, block in enumerate(blocks) for index in block}
+            wanted = {tuple(sorted((block_of[i], block_of[j]))) for i, j in missing}
+            # A block's own pairs come along with any request that includes it
+            wanted = {(a, b) for a, b in wanted
+                      if a != b or not any(a in pair for pair in wanted if pair[0] != pair[1])}
+            await asyncio.gather(*(self._fetch_block(points, blocks[a] + (blocks[b] if b != a else []), profile)
+                                   for a, b in sorted(wanted)))
+        return self._assemble(locations, profile)
+
+    async def _fetch_block(self, points: List[Point], indices: List[int], profile: str) -> bool:
+        """Fetch the full matrix between ``indices`` and cache its cells; False if every server failed"""
+        if time.monotonic() < self._down_until:
+            return False
+        coordinates = ";".join(f"{points[i][1]},{points[i][0]}" for i in indices)
+
+        for server in self.servers:
+            self.stats["requests"] += 1
+            try:
+                response = await http_client.get(f"{server}/{profile}/{coordinates}",
+                                                 params={"annotations": "duration,distance"}, deadline=self.deadline)
+                data = response.json()
+                if data.get("code") != "Ok":
+                    raise ValueError(data.get("message") or data.get("code") or "table request failed")
+            except Exception as e:
+                self.stats["request_errors"] += 1
+                print(f"Matrix server {server} failed: {e}")
+                continue
+
+            durations, distances = data.get("durations") or [], data.get("distances") or []
+            for r, i in enumerate(indices):
+                for c, j in enumerate(indices):
+                    if i == j:
+                        continue
+                    seconds = durations[r][c] if r < len(durations) else None
+                    meters = distances[r][c] if r < len(distances) else None
+                    if seconds is None or meters is None:
+                        # No road connection found; keep estimating this pair
+                        continue
+                    self._put(profile, points[i], points[j], meters / 1000, seconds / 60)
+                    self.stats["cells_fetched"] += 1
+            return True
+
+        # Nobody answered; estimate everything for a while instead of waiting on timeouts
+        self._down_until = time.monotonic() + self.retry_after
+        return False
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["cell_hits"] + self.stats["cell_misses"]
+        return {
+            **self.stats,
+            "cell_hit_rate": round(self.stats["cell_hits"] / lookups, 3) if lookups else 0,
+            "cells_cached": len(self._cells),
+            "servers_down": time.monotonic() < self._down_until,
+            "detour_factor": self.detour_factor
+        }
+
+
+travel_matrix = TravelMatrixService(max_coordinates=settings.TRAVEL_MATRIX_MAX_COORDINATES,
+                                    detour_factor=settings.TRAVEL_MATRIX_DETOUR_FACTOR,
+                                    fallback_speed_kmh=settings.TRAVEL_MATRIX_FALLBACK_SPEED_KMH)
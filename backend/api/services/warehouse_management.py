@@ -3,6 +3,7 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from enum import Enum
 from core.websocket import manager
+from core.geo import point_distance
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 class PackageStatus(str, Enum):
@@ -140,26 +141,7 @@ class WarehouseManagementService:
     
     def _calculate_warehouse_distance(self, wh1: Dict, wh2: Dict) -> float:
         """Calculate distance between warehouses"""
-        # Simplified distance calculation
-        import math
-        
-        lat1, lon1 = wh1["location"]["lat"], wh1["location"]["lng"]
-        lat2, lon2 = wh2["location"]["lat"], wh2["location"]["lng"]
-        
-        R = 6371  # Earth radius in km
-        
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        delta_lat = math.radians(lat2 - lat1)
-        delta_lon = math.radians(lon2 - lon1)
-        
-        a = (math.sin(delta_lat/2) * math.sin(delta_lat/2) + 
-             math.cos(lat1_rad) * math.cos(lat2_rad) * 
-             math.sin(delta_lon/2) * math.sin(delta_lon/2))
-        
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        
-        return R * c
+        return point_distance(wh1["location"], wh2["location"])
     
     def _determine_transport_mode(self, origin_wh: Dict, dest_wh: Dict) -> str:
         """Determine best transport mode between warehouses"""
@@ -0,0 +1,165 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from core.geo import geohash, geohash_center
+from core.http import http_client
+
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+CURRENT_FIELDS = "temperature_2m,precipitation,weather_code,wind_speed_10m,visibility"
+
+
+class WeatherProvider:
+    """Process-wide current-weather cache shared by every service.
+
+    Entries are keyed by geohash cell (precision 5, about 5 km) and live for
+    ``ttl`` seconds. Concurrent misses for the same cell await one shared fetch,
+    failed refreshes keep serving the previous reading, and a background task
+    re-fetches recently used cells shortly before they expire.
+    """
+
+    def __init__(self, ttl: float = 1800, precision: int = 5, refresh_ahead: float = 120,
+                 refresh_interval: float = 60, timeout: float = 5.0):
+        self.ttl = ttl
+        self.precision = precision
+        self.refresh_ahead = refresh_ahead
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self._entries: Dict[str, dict] = {}
+        self._last_used: Dict[str, float] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "fetches": 0, "errors": 0, "stale_served": 0, "prefetched": 0}
+
+    def _key(self, lat: float, lng: float) -> str:
+        return geohash(lat, lng, self.precision)
+
+    async def _fetch(self, key: str) -> Optional[dict]:
+        """Fetch one cell from open-meteo and store it; None on failure"""
+        lat, lng = geohash_center(key)
+        self.stats["fetches"] += 1
+        try:
+            response = await http_client.get(OPEN_METEO_URL, deadline=self.timeout, params={
+                "latitude": round(lat, 4),
+                "longitude": round(lng, 4),
+                "current": CURRENT_FIELDS
+            })
+            response.raise_for_status()
+            current = response.json().get("current", {})
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Weather API error ({key}): {e}")
+            return None
+
+        entry = {
+            "geohash": key,
+            "current": current,
+            "fetched_at": datetime.now().isoformat(),
+            "expires": time.monotonic() + self.ttl
+        }
+        self._entries[key] = entry
+        return entry
+
+    async def _refresh(self, key: str) -> Optional[dict]:
+        """Single-flight refresh: concurrent callers share one fetch per cell"""
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            entry = await self._fetch(key)
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(entry)
+            return entry
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get_entry(self, lat: float, lng: float) -> Optional[dict]:
+        """Cached reading for a location with its geohash and fetch time, or None if unavailable"""
+        key = self._key(lat, lng)
+        self._last_used[key] = time.monotonic()
+        entry = self._entries.get(key)
+        if entry and entry["expires"] > time.monotonic():
+            self.stats["hits"] += 1
+            return {**entry, "cached": True}
+
+        self.stats["misses"] += 1
+        fresh = await self._refresh(key)
+        if fresh:
+            return {**fresh, "cached": False}
+        if entry:
+            self.stats["stale_served"] += 1
+            return {**entry, "cached": True, "stale": True}
+        return None
+
+    async def get_current(self, lat: float, lng: float) -> Optional[dict]:
+        """open-meteo ``current`` block for a location, or None if unavailable"""
+        entry = await self.get_entry(lat, lng)
+        return entry["current"] if entry else None
+
+    # Background prefetch
+
+    def watch(self, locations: Iterable[dict]) -> None:
+        """Mark locations (e.g. served cities) to be kept warm by the refresher"""
+        now = time.monotonic()
+        for location in locations:
+            self._last_used[self._key(location["lat"], location["lng"])] = now
+
+    async def refresh_due(self) -> int:
+        """Refresh every recently used cell that is missing or about to expire"""
+        now = time.monotonic()
+        due = [
+            key for key, used in self._last_used.items()
+            if now - used < 2 * self.ttl and
+            (key not in self._entries or self._entries[key]["expires"] - now < self.refresh_ahead)
+        ]
+        results = await asyncio.gather(*(self._refresh(key) for key in due), return_exceptions=True)
+        refreshed = sum(1 for r in results if isinstance(r, dict))
+        self.stats["prefetched"] += refreshed
+
+        # Forget cells nobody asked for in a long time
+        for key in [k for k, used in self._last_used.items() if now - used >= 2 * self.ttl]:
+            del self._last_used[key]
+            self._entries.pop(key, None)
+        return refreshed
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.refresh_due()
+            except Exception as e:
+                print(f"❌ Weather prefetch failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0,
+            "cells_cached": len(self._entries),
+            "cells_watched": len(self._last_used),
+            "refresher_running": self._task is not None and not self._task.done()
+        }
+
+
+weather_provider = WeatherProvider()
@@ -0,0 +1,45 @@
+"""Benchmark large neighborhood search budgets against construction plus pair relocate.
+
+Instances are the time-window scenarios from benchmark_time_windows.py. Each
+one is solved once, and then the same solver gets increasing wall-clock
+budgets of search. Cost is km plus one km per minute of lateness, the
+objective the search minimizes.
+
+Run from the backend directory: python benchmark_anytime_search.py
+"""
+from api.services.lns import LargeNeighborhoodSearch
+from api.services.multi_package_optimizer import MultiPackageOptimizer
+from api.services.pickup_delivery import PickupDeliverySolver
+from benchmark_time_windows import make_instance
+
+SIZES = (12, 25, 40)
+BUDGETS = (0.01, 0.05, 0.5, 2.0)
+INSTANCES = 5
+
+
+def run(n_orders: int) -> None:
+    optimizer = MultiPackageOptimizer()
+    totals = {"solve": 0.0, **{budget: 0.0 for budget in BUDGETS}}
+    iterations = {budget: 0 for budget in BUDGETS}
+    for seed in range(INSTANCES):
+        dist, requests, windows, service = make_instance(n_orders, seed, optimizer)
+        travel = dist * optimizer.minutes_per_km
+        solver = PickupDeliverySolver(dist, requests, capacity=90, travel=travel, windows=windows, service=service)
+        route, _ = solver.solve()
+        search = LargeNeighborhoodSearch(solver, seed=seed)
+        totals["solve"] += search.cost(route)
+        for budget in BUDGETS:
+            search = LargeNeighborhoodSearch(solver, seed=seed)
+            best, stats = search.run(route, budget)
+            totals[budget] += search.cost(best)
+            iterations[budget] += stats["iterations"]
+
+    line = f"{n_orders:3d} orders  construct+relocate {totals['solve'] / INSTANCES:8.2f}"
+    for budget in BUDGETS:
+        line += f" | {budget:5.2f}s {totals[budget] / INSTANCES:8.2f} ({iterations[budget] // INSTANCES} it)"
+    print(line)
+
+
+if __name__ == "__main__":
+    for size in SIZES:
+        run(size)
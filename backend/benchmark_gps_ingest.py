@@ -0,0 +1,97 @@
+"""GPS ingest throughput: one HTTP POST per fix vs binary frames over a websocket.
+
+Serves the real app with uvicorn on a local port (lifespan off, so no
+background services start) and has several drivers report fixes
+concurrently through POST /api/driver/{id}/location, then through
+/ws/driver/{id}/gps with one fix per frame and with batched frames. Each
+websocket frame waits for its ack, like a driver app flushing its buffer.
+
+Run from the backend directory: python benchmark_gps_ingest.py
+"""
+import asyncio
+import json
+import time
+
+import httpx
+import uvicorn
+import websockets
+
+import main
+from api.services.location_ingest import encode_fixes, location_ingest
+
+DRIVERS = 8
+FIXES_PER_DRIVER = 400
+BATCH = 10
+
+
+def fixes_for(index: int, count: int, start: float):
+    return [{"lat": 33.57 + index * 0.01 + k * 1e-5, "lng": -7.59 + k * 1e-5, "speed": 30.0, "heading": 90.0,
+             "accuracy": 5.0, "timestamp": start + k * 0.5} for k in range(count)]
+
+
+async def http_driver(client: httpx.AsyncClient, driver_id: str, fixes, latencies, sizes):
+    for fix in fixes:
+        body = {"driver_id": driver_id, "latitude": fix["lat"], "longitude": fix["lng"],
+                "accuracy": fix["accuracy"], "speed": fix["speed"], "heading": fix["heading"]}
+        sizes.append(len(json.dumps(body)))
+        started = time.perf_counter()
+        response = await client.post(f"/api/driver/{driver_id}/location", json=body)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+
+async def ws_driver(url: str, driver_id: str, fixes, batch: int, latencies, sizes):
+    async with websockets.connect(f"{url}/ws/driver/{driver_id}/gps") as ws:
+        for i in range(0, len(fixes), batch):
+            frame = encode_fixes(fixes[i:i + batch])
+            sizes.append(len(frame) / len(fixes[i:i + batch]))
+            started = time.perf_counter()
+            await ws.send(frame)
+            ack = json.loads(await ws.recv())
+            assert ack["type"] == "gps_ack", ack
+            latencies.append(time.perf_counter() - started)
+
+
+def report(name: str, seconds: float, latencies, sizes, fixes: int):
+    latencies.sort()
+    print(f"{name:<26} {fixes / seconds:8.0f} fixes/s   p50 {latencies[len(latencies) // 2] * 1000:6.2f} ms   "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:6.2f} ms per message   "
+          f"{sum(sizes) / len(sizes):5.0f} B payload per fix")
+
+
+async def run():
+    config = uvicorn.Config(main.app, host="127.0.0.1", port=0, log_level="warning", lifespan="off")
+    server = uvicorn.Server(config)
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    http_url, ws_url = f"http://127.0.0.1:{port}", f"ws://127.0.0.1:{port}"
+
+    driver_ids = [driver["id"] for driver in main.drivers_db.all()[:DRIVERS]]
+    total = len(driver_ids) * FIXES_PER_DRIVER
+    start = time.time() - 1800  # fixes must fall inside the accepted clock-skew window
+
+    latencies, sizes = [], []
+    async with httpx.AsyncClient(base_url=http_url) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(http_driver(client, d, fixes_for(i, FIXES_PER_DRIVER, start), latencies, sizes)
+                               for i, d in enumerate(driver_ids)))
+        report("HTTP POST per fix", time.perf_counter() - started, latencies, sizes, total)
+
+    for batch in (1, BATCH):
+        start += FIXES_PER_DRIVER * 0.5
+        latencies, sizes = [], []
+        before = location_ingest.stats["fixes"]
+        started = time.perf_counter()
+        await asyncio.gather(*(ws_driver(ws_url, d, fixes_for(i, FIXES_PER_DRIVER, start), batch, latencies, sizes)
+                               for i, d in enumerate(driver_ids)))
+        report(f"Websocket, {batch} fix(es)/frame", time.perf_counter() - started, latencies, sizes, total)
+        assert location_ingest.stats["fixes"] - before == total
+
+    server.should_exit = True
+    await serving
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,100 @@
+"""Offline road-graph routing on a synthetic city extract.
+
+Writes a grid city (residential streets, faster arterials every 10 blocks,
+alternating one-way streets) as OSM XML, builds and memory-maps the graph,
+then times random queries with bidirectional A* and checks each travel time
+against a plain Dijkstra over the same arrays.
+
+Run from the backend directory: python benchmark_road_graph.py
+"""
+import heapq
+import math
+import os
+import random
+import tempfile
+import time
+
+from api.services.road_graph import RoadGraph, build_road_graph
+
+SIZE = 150  # nodes per side
+SPACING_DEG = 0.0008  # about 80 m
+ORIGIN = (33.53, -7.66)
+QUERIES = 200
+
+
+def write_city(path: str) -> None:
+    node_id = lambda r, c: r * SIZE + c + 1
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0"?>\n<osm version="0.6">\n')
+        for r in range(SIZE):
+            for c in range(SIZE):
+                f.write(f'<node id="{node_id(r, c)}" lat="{ORIGIN[0] + r * SPACING_DEG:.7f}" '
+                        f'lon="{ORIGIN[1] + c * SPACING_DEG:.7f}"/>\n')
+        way = 1
+        for k in range(SIZE):
+            for refs in ([node_id(k, c) for c in range(SIZE)], [node_id(r, k) for r in range(SIZE)]):
+                highway = "primary" if k % 10 == 0 else "residential"
+                oneway = '<tag k="oneway" v="yes"/>' if highway == "residential" and k % 2 else ""
+                f.write(f'<way id="{way}">' + "".join(f'<nd ref="{ref}"/>' for ref in refs) +
+                        f'<tag k="highway" v="{highway}"/>{oneway}</way>\n')
+                way += 1
+        f.write("</osm>\n")
+
+
+def dijkstra(graph: RoadGraph, s: int, t: int):
+    a = graph._arrays
+    dist, settled, heap = {s: 0.0}, 0, [(0.0, s)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        settled += 1
+        if u == t:
+            return d, settled
+        start, end = int(a["fwd_ptr"][u]), int(a["fwd_ptr"][u + 1])
+        for v, w in zip(a["fwd_to"][start:end].tolist(), a["fwd_time"][start:end].tolist()):
+            if d + w < dist.get(v, math.inf):
+                dist[v] = d + w
+                heapq.heappush(heap, (d + w, v))
+    return math.inf, settled
+
+
+if __name__ == "__main__":
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "city.osm")
+        write_city(source)
+        meta = build_road_graph(source, os.path.join(tmp, "graph"))
+        print(f"Build: {meta['nodes']} nodes, {meta['edges']} edges in {meta['build_seconds']}s")
+
+        started = time.perf_counter()
+        graph = RoadGraph(os.path.join(tmp, "graph"))
+        graph.load()
+        print(f"Load (mmap): {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        span = SIZE * SPACING_DEG
+        astar_ms, dijkstra_ms, astar_settled, dijkstra_settled, worst_gap = [], [], 0, 0, 0.0
+        for _ in range(QUERIES):
+            a = {"lat": ORIGIN[0] + rng.random() * span, "lng": ORIGIN[1] + rng.random() * span}
+            b = {"lat": ORIGIN[0] + rng.random() * span, "lng": ORIGIN[1] + rng.random() * span}
+            s, t = graph.nearest(a["lat"], a["lng"])[0], graph.nearest(b["lat"], b["lng"])[0]
+
+            before = graph.stats["settled"]
+            started = time.perf_counter()
+            _, _, seconds = graph.shortest_path(s, t)
+            astar_ms.append((time.perf_counter() - started) * 1000)
+            astar_settled += graph.stats["settled"] - before
+
+            started = time.perf_counter()
+            expected, settled = dijkstra(graph, s, t)
+            dijkstra_ms.append((time.perf_counter() - started) * 1000)
+            dijkstra_settled += settled
+            worst_gap = max(worst_gap, abs(seconds - expected))
+
+        astar_ms.sort()
+        dijkstra_ms.sort()
+        print(f"Bidirectional A*: p50 {astar_ms[len(astar_ms) // 2]:.1f} ms, p95 {astar_ms[int(len(astar_ms) * 0.95)]:.1f} ms, "
+              f"{astar_settled / QUERIES:.0f} nodes settled per query")
+        print(f"Dijkstra:         p50 {dijkstra_ms[len(dijkstra_ms) // 2]:.1f} ms, p95 {dijkstra_ms[int(len(dijkstra_ms) * 0.95)]:.1f} ms, "
+              f"{dijkstra_settled / QUERIES:.0f} nodes settled per query")
+        print(f"Largest travel-time difference vs Dijkstra: {worst_gap:.4f} s")
@@ -0,0 +1,110 @@
+"""Compare sequential fallback vs hedged routing against local stand-in OSRM servers.
+
+Each stand-in answers /route/v1/... with a fixed OSRM-shaped route after an
+injected delay. Scenarios cover a primary with a slow tail and a primary that
+stalls outright; the hedged mode should cut the tail to roughly
+hedge delay + secondary latency and learn to rank the healthy server first.
+
+Run from the backend directory: python benchmark_route_hedging.py
+"""
+import asyncio
+import json
+import random
+import time
+
+from api.services import hedging
+from api.services.real_time_routing import RealTimeRoutingService
+from core.config import settings
+from core.http import http_client
+from core.polyline import encode
+
+REQUESTS = 100
+START = {"lat": 33.5731, "lng": -7.5898}
+WAYPOINTS = [{"lat": 33.5890, "lng": -7.6030}]
+
+ROUTE_BODY = json.dumps({"code": "Ok", "routes": [{
+    "geometry": encode([[START["lng"], START["lat"]], [WAYPOINTS[0]["lng"], WAYPOINTS[0]["lat"]]], precision=6),
+    "distance": 2100.0,
+    "duration": 310.0,
+    "legs": [{"steps": []}]
+}]}).encode()
+
+
+def latency_profile(base: float, tail: float = 0.0, tail_rate: float = 0.0, seed: int = 0):
+    rng = random.Random(seed)
+    return lambda: tail if rng.random() < tail_rate else base * rng.uniform(0.8, 1.2)
+
+
+async def start_stand_in(delay) -> asyncio.AbstractServer:
+    """Minimal HTTP/1.1 server returning ROUTE_BODY after delay() seconds"""
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            await asyncio.sleep(delay())
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Connection: close\r\nContent-Length: %d\r\n\r\n" % len(ROUTE_BODY) + ROUTE_BODY)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def url_of(server: asyncio.AbstractServer) -> str:
+    return f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/route/v1"
+
+
+def summarize(label: str, latencies: list) -> None:
+    ordered = sorted(latencies)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    print(f"  {label:<11} p50 {pick(0.5):7.1f} ms   p95 {pick(0.95):7.1f} ms   "
+          f"p99 {pick(0.99):7.1f} ms   max {ordered[-1] * 1000:7.1f} ms")
+
+
+async def measure(service: RealTimeRoutingService, hedged: bool, requests: int) -> list:
+    settings.ROUTING_HEDGING_ENABLED = hedged
+    hedging.routing_hedger.reset()
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        route = await service.get_osrm_route(START, WAYPOINTS, "car")
+        assert route["source"] == "osrm", route.get("source")
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def scenario(name: str, primary_delay, secondary_delay, requests: int = REQUESTS) -> None:
+    primary = await start_stand_in(primary_delay)
+    secondary = await start_stand_in(secondary_delay)
+    service = RealTimeRoutingService()
+    service.route_servers = [url_of(primary), url_of(secondary)]
+    names = {url_of(primary): "primary", url_of(secondary): "secondary"}
+
+    print(f"\n{name} ({requests} requests)")
+    summarize("sequential", await measure(service, hedged=False, requests=requests))
+    summarize("hedged", await measure(service, hedged=True, requests=requests))
+    stats = hedging.routing_hedger.get_stats()
+    print(f"  hedges fired: {stats['hedged']}, ranking now: {[names[url] for url in stats['ranking']]}")
+    for url, server in stats["servers"].items():
+        print(f"    {names[url]:<9} wins {server['wins']:3d}  cancelled {server['cancelled']:3d}  "
+              f"p95 {server['p95_ms']} ms  hedge delay {server['hedge_delay_ms']} ms")
+
+    primary.close()
+    secondary.close()
+    await asyncio.gather(primary.wait_closed(), secondary.wait_closed())
+
+
+async def main() -> None:
+    await scenario("Primary with 10% slow tail (1.5 s)",
+                   latency_profile(0.02, tail=1.5, tail_rate=0.1, seed=1),
+                   latency_profile(0.06, seed=2))
+    await scenario("Primary stalled (9 s, beyond its 8 s timeout)",
+                   latency_profile(9.0),
+                   latency_profile(0.05, seed=3), requests=5)
+    await http_client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
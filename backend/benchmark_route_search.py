@@ -0,0 +1,84 @@
+"""Benchmark the previous full-recompute 2-opt against delta-evaluated local search.
+
+Stops are random addresses around Casablanca; both methods start from the same
+nearest-neighbor tour. The old method is skipped above LEGACY_LIMIT stops
+where a single run takes minutes.
+
+Run from the backend directory: python benchmark_route_search.py
+"""
+import random
+import time
+
+from api.services.local_search import LocalSearch, build_matrix, nearest_neighbor_route, route_cost
+from core.geo import path_length, to_arrays
+
+SIZES = (10, 20, 50, 100, 200)
+LEGACY_LIMIT = 100
+CASABLANCA = {"lat": 33.5731, "lng": -7.5898}
+
+
+def make_stops(n: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [{"lat": CASABLANCA["lat"] + rng.uniform(-0.08, 0.08),
+             "lng": CASABLANCA["lng"] + rng.uniform(-0.08, 0.08)} for _ in range(n + 1)]
+
+
+def legacy_two_opt(points: list, route: list) -> list:
+    """The former MultiPackageOptimizer._two_opt_improvement, on index routes"""
+    def total(r):
+        lats, lngs = to_arrays(points[i] for i in r)
+        return path_length(lats, lngs)
+
+    best_route = route.copy()
+    best_distance = total(route)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(route) - 2):
+            for j in range(i + 1, len(route)):
+                if j - i == 1:
+                    continue
+                new_route = route.copy()
+                new_route[i:j] = route[i:j][::-1]
+                new_distance = total(new_route)
+                if new_distance < best_distance:
+                    best_route = new_route
+                    best_distance = new_distance
+                    improved = True
+        route = best_route
+    return best_route
+
+
+def run(n: int, seeds: int = 3) -> None:
+    legacy_time = search_time = 0.0
+    legacy_km = search_km = start_km = 0.0
+    for seed in range(seeds):
+        points = make_stops(n, seed)
+        dist = build_matrix(points)
+        start = nearest_neighbor_route(dist)
+        start_km += route_cost(dist, start)
+
+        t = time.perf_counter()
+        route = LocalSearch(dist).optimize(start)
+        search_time += time.perf_counter() - t
+        search_km += route_cost(dist, route)
+
+        if n <= LEGACY_LIMIT:
+            t = time.perf_counter()
+            route = legacy_two_opt(points, start)
+            legacy_time += time.perf_counter() - t
+            legacy_km += route_cost(dist, route)
+
+    line = (f"{n:4d} stops  nearest neighbor {start_km / seeds:7.2f} km | "
+            f"local search {search_km / seeds:7.2f} km {search_time / seeds * 1000:8.1f} ms")
+    if n <= LEGACY_LIMIT:
+        line += (f" | old 2-opt {legacy_km / seeds:7.2f} km {legacy_time / seeds * 1000:9.1f} ms"
+                 f"  ({legacy_time / search_time:6.0f}x)")
+    else:
+        line += " | old 2-opt skipped"
+    print(line)
+
+
+if __name__ == "__main__":
+    for size in SIZES:
+        run(size)
@@ -0,0 +1,87 @@
+"""Benchmark time-window aware pickup-and-delivery routing on synthetic Casablanca instances.
+
+Each instance has one driver and a mix of express orders (due 45-120 min out),
+standard orders (due 3-8 h out) and customer delivery slots. About a third of
+the packages are already on board. The same solver runs once minimizing
+distance only and once with the time windows enforced; lateness is always
+measured against the windows.
+
+Run from the backend directory: python benchmark_time_windows.py
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from api.services.local_search import build_matrix, route_cost
+from api.services.multi_package_optimizer import MultiPackageOptimizer
+from api.services.pickup_delivery import PickupDeliverySolver
+
+SIZES = (8, 12, 16)
+INSTANCES = 20
+CASABLANCA = {"lat": 33.5731, "lng": -7.5898}
+NOW = datetime(2025, 3, 10, 9, 0)
+
+
+def random_point(rng: random.Random) -> dict:
+    return {"lat": CASABLANCA["lat"] + rng.uniform(-0.06, 0.06),
+            "lng": CASABLANCA["lng"] + rng.uniform(-0.06, 0.06)}
+
+
+def make_instance(n_orders: int, seed: int, optimizer: MultiPackageOptimizer):
+    rng = random.Random(seed)
+    locations = [random_point(rng)]
+    requests, windows, service = [], [(0.0, float("inf"))], [0]
+    for i in range(n_orders):
+        express = rng.random() < 0.35
+        order = {"id": f"B{i}", "service_type": "express" if express else "standard",
+                 "estimated_delivery": (NOW + timedelta(minutes=rng.uniform(45, 120) if express
+                                                        else rng.uniform(180, 480))).isoformat()}
+        if not express and rng.random() < 0.25:
+            start = NOW + timedelta(minutes=rng.uniform(30, 150))
+            order["delivery_window"] = {"start": start.isoformat(), "end": (start + timedelta(minutes=60)).isoformat()}
+
+        on_board = rng.random() < 0.35
+        if not on_board:
+            locations.append(random_point(rng))
+            windows.append(optimizer._time_window("pickup", order, NOW))
+            service.append(optimizer.pickup_time)
+        locations.append(random_point(rng))
+        windows.append(optimizer._time_window("delivery", order, NOW))
+        service.append(optimizer.delivery_time)
+        delivery = len(locations) - 1
+        requests.append((None if on_board else delivery - 1, delivery, rng.choice([1.0, 2.5, 5.0, 10.0])))
+    return build_matrix(locations), requests, windows, service
+
+
+def run(n_orders: int) -> None:
+    optimizer = MultiPackageOptimizer()
+    totals = {mode: {"km": 0.0, "late": 0, "lateness": 0.0, "ms": 0.0} for mode in ("distance", "windows")}
+    for seed in range(INSTANCES):
+        dist, requests, windows, service = make_instance(n_orders, seed, optimizer)
+        travel = dist * optimizer.minutes_per_km
+        for mode in totals:
+            solver = PickupDeliverySolver(dist, requests, capacity=90, travel=travel,
+                                          windows=windows if mode == "windows" else None, service=service)
+            started = time.perf_counter()
+            route, _ = solver.solve()
+            elapsed = time.perf_counter() - started
+            # Measure against the real windows regardless of what the solver was told
+            solver.earliest = np.array([w[0] for w in windows])
+            solver.due = np.array([w[1] for w in windows])
+            _, late = solver.lateness(route)
+            totals[mode]["km"] += route_cost(dist, route)
+            totals[mode]["late"] += int((late > 1e-9).sum())
+            totals[mode]["lateness"] += float(late.sum())
+            totals[mode]["ms"] += elapsed * 1000
+
+    print(f"\n{n_orders} orders ({INSTANCES} instances, averages)")
+    for mode, t in totals.items():
+        print(f"  {mode:<9} {t['km'] / INSTANCES:7.2f} km   late stops {t['late'] / INSTANCES:5.2f}   "
+              f"lateness {t['lateness'] / INSTANCES:7.1f} min   solve {t['ms'] / INSTANCES:6.2f} ms")
+
+
+if __name__ == "__main__":
+    for size in SIZES:
+        run(size)
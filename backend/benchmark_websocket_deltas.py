@@ -0,0 +1,96 @@
+"""Driver websocket payload size: full driver_update messages vs snapshot + deltas.
+
+Builds a driver with several assigned orders that each carry a long
+route_history, subscribes a stand-in socket to driver:{id} and replays GPS
+updates the way /api/driver/gps/update applies them. Every update is counted
+both as the old full payload and as the driver_delta the hub actually queues,
+and the final client-side replica is checked against the store.
+
+Run from the backend directory: python benchmark_websocket_deltas.py
+"""
+import asyncio
+import json
+import time
+
+from core import json_patch
+from core.live_updates import LiveUpdates
+from core.store import IndexedStore
+from core.websocket import ConnectionManager
+
+ORDERS = 5
+HISTORY = 500
+UPDATES = 200
+
+
+class StandInSocket:
+    def __init__(self):
+        self.messages = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.messages.append(text)
+
+    async def close(self):
+        pass
+
+
+def seed(orders: IndexedStore, drivers: IndexedStore) -> None:
+    drivers.insert({"id": "DRV1", "name": "Bench Driver", "status": "busy", "assigned_city": "Casablanca",
+                    "current_location": {"lat": 33.57, "lng": -7.59, "city": "Casablanca"},
+                    "current_orders": [f"ORD{i}" for i in range(ORDERS)]})
+    for i in range(ORDERS):
+        orders.insert({"id": f"ORD{i}", "assigned_driver": "DRV1", "status": "in_transit",
+                       "pickup_address": f"{i} Rue Example", "delivery_address": f"{i} Avenue Example",
+                       "current_location": {"lat": 33.57, "lng": -7.59},
+                       "route_history": [{"lat": 33.57 + k * 1e-5, "lng": -7.59, "timestamp": "2024-01-15T10:00:00"}
+                                         for k in range(HISTORY)]})
+
+
+async def run():
+    orders, drivers = IndexedStore(indexes=("assigned_driver",)), IndexedStore()
+    seed(orders, drivers)
+    hub = ConnectionManager(max_queue=UPDATES * 2)
+    live = LiveUpdates(orders, drivers, hub)
+    socket = StandInSocket()
+
+    await hub.connect(socket)
+    hub.send(socket, live.driver_snapshot("DRV1"))
+    hub.subscribe(socket, ["driver:DRV1"])
+    await asyncio.sleep(0)
+
+    full_bytes, flush_seconds = 0, 0.0
+    for k in range(UPDATES):
+        lat, lng, ts = 33.57 + k * 1e-4, -7.59, f"2024-01-15T11:{k // 60:02d}:{k % 60:02d}"
+        driver = drivers.get("DRV1")
+        driver["current_location"].update({"lat": lat, "lng": lng, "last_update": ts})
+        drivers.touch(driver, "current_location")
+        order = orders.get(f"ORD{k % ORDERS}")
+        order["current_location"] = {"lat": lat, "lng": lng, "timestamp": ts}
+        order["route_history"].append({"lat": lat, "lng": lng, "timestamp": ts})
+
+        started = time.perf_counter()
+        await asyncio.sleep(0)  # scheduled flush
+        flush_seconds += time.perf_counter() - started
+        full_bytes += len(json.dumps({"type": "driver_update", "driver": driver,
+                                      "orders": orders.find("assigned_driver", "DRV1"), "timestamp": ts}))
+    await asyncio.sleep(0.05)
+
+    snapshot, deltas = json.loads(socket.messages[0]), [json.loads(m) for m in socket.messages[1:]]
+    replica = snapshot["data"]
+    for delta in deltas:
+        replica = json_patch.apply(replica, delta["ops"])
+    expected = json_patch.plain({"driver": drivers.get("DRV1"),
+                                 "orders": {o["id"]: o for o in orders.find("assigned_driver", "DRV1")}})
+    delta_bytes = sum(len(m) for m in socket.messages[1:])
+
+    print(f"Snapshot: {len(socket.messages[0]) / 1024:.1f} KB once on connect")
+    print(f"Full payload per update: {full_bytes / UPDATES / 1024:.1f} KB")
+    print(f"Delta per update:        {delta_bytes / len(deltas):.0f} bytes ({len(deltas)} deltas, seq {deltas[-1]['seq']})")
+    print(f"Flush time per update:   {flush_seconds / UPDATES * 1000:.2f} ms")
+    print(f"Replica matches store: {replica == expected}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
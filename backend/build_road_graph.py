@@ -0,0 +1,19 @@
+"""Preprocess an OSM extract into the memory-mapped road graph used for offline routing.
+
+Takes OSM XML (.osm, .osm.bz2 or .osm.gz). Convert a .pbf extract first, e.g.
+osmium extract -b -10,29.5,-6.5,34.5 morocco-latest.osm.pbf -o cities.osm.bz2
+
+Run from the backend directory: python build_road_graph.py cities.osm.bz2 [out_dir]
+"""
+import sys
+
+from api.services.road_graph import build_road_graph
+from core.config import settings
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else settings.ROAD_GRAPH_PATH
+    meta = build_road_graph(sys.argv[1], out_dir)
+    print(f"[OK] {meta['nodes']} nodes, {meta['edges']} edges written to {out_dir} in {meta['build_seconds']}s")
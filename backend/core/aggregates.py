@@ -0,0 +1,210 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from core.store import IndexedStore, orders_db, drivers_db
+
+DRIVER_COMMISSION = 0.15  # 15% of delivered order value
+
+
+def _order_value(order: dict) -> float:
+    """Order revenue from total_cost with price as fallback"""
+    return order.get("total_cost", order.get("price", 0)) or 0
+
+
+def _parse_date(value) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value) if isinstance(value, str) else value
+    except (TypeError, ValueError):
+        return None
+
+
+class OrderAggregates:
+    """Order counters and revenue totals maintained on every store change.
+
+    Each order's contribution to the counters is remembered, so a mutation only
+    subtracts the old contribution and adds the new one: O(1) per state
+    transition and O(1) reads regardless of how many orders are stored.
+    """
+
+    TRACKED_FIELDS = {
+        "id", "status", "total_cost", "price", "is_inter_city", "service_type",
+        "assigned_driver", "created_at", "delivered_at"
+    }
+
+    def __init__(self, store: IndexedStore):
+        self.store = store
+        self.totals: Dict[Tuple, float] = defaultdict(float)
+        self._contributions: Dict[str, Dict[Tuple, float]] = {}
+        self.rebuild()
+        store.add_listener(self.on_change)
+
+    def _contribution(self, order: dict) -> Dict[Tuple, float]:
+        """Counter deltas a single order adds to the totals"""
+        contribution = defaultdict(float)
+        status = order.get("status")
+        driver_id = order.get("assigned_driver")
+        value = _order_value(order)
+
+        contribution[("orders",)] += 1
+        contribution[("status", status)] += 1
+        contribution[("service_type", order.get("service_type"))] += 1
+        contribution[("inter_city", bool(order.get("is_inter_city", False)))] += 1
+
+        if driver_id:
+            contribution[("driver_orders", driver_id)] += 1
+
+        if status == "delivered":
+            contribution[("revenue",)] += value
+            created_at = _parse_date(order.get("created_at"))
+            if created_at:
+                contribution[("revenue_by_day", created_at.date().isoformat())] += value
+
+            if driver_id:
+                contribution[("driver_completed", driver_id)] += 1
+                contribution[("driver_earnings", driver_id)] += value * DRIVER_COMMISSION
+                delivered_at = _parse_date(order.get("delivered_at"))
+                if created_at and delivered_at:
+                    contribution[("driver_timed", driver_id)] += 1
+                    contribution[("driver_minutes", driver_id)] += (delivered_at - created_at).total_seconds() / 60
+
+        return contribution
+
+    def _apply(self, contribution: Dict[Tuple, float], sign: int) -> None:
+        for key, amount in contribution.items():
+            total = self.totals[key] + sign * amount
+            if abs(total) < 1e-9:
+                self.totals.pop(key, None)
+            else:
+                self.totals[key] = total
+
+    def on_change(self, event: str, record: dict, field: Optional[str], old, new) -> None:
+        """Store listener keeping the totals in sync with the orders"""
+        if event == "update" and field not in self.TRACKED_FIELDS:
+            return
+
+        record_id = old if event == "update" and field == "id" else record["id"]
+        previous = self._contributions.pop(record_id, None)
+        if previous:
+            self._apply(previous, -1)
+
+        if event != "remove":
+            current = self._contribution(record)
+            self._contributions[record["id"]] = current
+            self._apply(current, 1)
+
+    def _compute(self, orders: Iterable[dict]) -> Tuple[Dict[Tuple, float], Dict[str, Dict[Tuple, float]]]:
+        totals = defaultdict(float)
+        contributions = {}
+        for order in orders:
+            contribution = self._contribution(order)
+            contributions[order["id"]] = contribution
+            for key, amount in contribution.items():
+                totals[key] += amount
+        return totals, contributions
+
+    def rebuild(self) -> None:
+        """Recompute every total from scratch"""
+        totals, contributions = self._compute(self.store)
+        self.totals = defaultdict(float, {k: v for k, v in totals.items() if abs(v) >= 1e-9})
+        self._contributions = contributions
+
+    def check_consistency(self) -> dict:
+        """Compare the maintained totals with a from-scratch recomputation"""
+        fresh, _ = self._compute(self.store)
+        mismatches = []
+        for key in set(fresh) | set(self.totals):
+            expected = fresh.get(key, 0)
+            actual = self.totals.get(key, 0)
+            if abs(expected - actual) > 1e-6:
+                mismatches.append({"key": list(key), "maintained": actual, "recomputed": expected})
+        return {"consistent": not mismatches, "mismatches": mismatches, "orders_checked": len(self.store)}
+
+    def get(self, *key) -> float:
+        return self.totals.get(key, 0)
+
+    def count_status(self, statuses: Iterable[str]) -> int:
+        return int(sum(self.get("status", status) for status in set(statuses)))
+
+    def driver_stats(self, driver_id: str) -> dict:
+        """Per-driver order counts, earnings and average delivery time"""
+        total_orders = int(self.get("driver_orders", driver_id))
+        completed = int(self.get("driver_completed", driver_id))
+        timed = self.get("driver_timed", driver_id)
+        return {
+            "total_orders": total_orders,
+            "completed_orders": completed,
+            "success_rate": (completed / total_orders * 100) if total_orders else 0,
+            "avg_delivery_time": round(self.get("driver_minutes", driver_id) / timed, 2) if timed else 0,
+            "earnings": self.get("driver_earnings", driver_id)
+        }
+
+
+class DriverAggregates:
+    """Fleet rating sum and top performer maintained on driver changes"""
+
+    def __init__(self, store: IndexedStore):
+        self.store = store
+        self.rating_sum = 0.0
+        self.top_driver_id: Optional[str] = None
+        self.rebuild()
+        store.add_listener(self.on_change)
+
+    def rebuild(self) -> None:
+        """Recompute rating sum and top driver from scratch"""
+        self.rating_sum = sum(d.get("rating", 0) for d in self.store)
+        top = max(self.store, key=lambda d: d.get("total_deliveries", 0), default=None)
+        self.top_driver_id = top["id"] if top else None
+
+    def on_change(self, event: str, record: dict, field: Optional[str], old, new) -> None:
+        """Store listener keeping rating sum and top driver in sync"""
+        if event == "insert":
+            self.rating_sum += record.get("rating", 0)
+            self._consider(record)
+        elif event == "remove":
+            self.rating_sum -= record.get("rating", 0)
+            if record["id"] == self.top_driver_id:
+                self.rebuild()
+        elif field == "rating":
+            self.rating_sum += (new or 0) - (old or 0)
+        elif field == "total_deliveries":
+            if record["id"] == self.top_driver_id and (new or 0) < (old or 0):
+                self.rebuild()
+            else:
+                self._consider(record)
+        elif field == "id" and old == self.top_driver_id:
+            self.top_driver_id = new
+
+    def _consider(self, record: dict) -> None:
+        top = self.store.get(self.top_driver_id)
+        if top is None or record.get("total_deliveries", 0) > top.get("total_deliveries", 0):
+            self.top_driver_id = record["id"]
+
+    @property
+    def average_rating(self) -> float:
+        return self.rating_sum / len(self.store) if len(self.store) else 0
+
+    @property
+    def top_driver(self) -> Optional[dict]:
+        return self.store.get(self.top_driver_id)
+
+    def check_consistency(self) -> dict:
+        """Compare the maintained values with a from-scratch recomputation"""
+        expected_sum = sum(d.get("rating", 0) for d in self.store)
+        top = max(self.store, key=lambda d: d.get("total_deliveries", 0), default=None)
+        maintained_top = self.top_driver
+        top_ok = (top is None and maintained_top is None) or (
+            top is not None and maintained_top is not None and
+            maintained_top.get("total_deliveries", 0) == top.get("total_deliveries", 0)
+        )
+        return {
+            "consistent": abs(expected_sum - self.rating_sum) < 1e-6 and top_ok,
+            "rating_sum": {"maintained": self.rating_sum, "recomputed": expected_sum},
+            "top_driver": {"maintained": self.top_driver_id, "recomputed": top["id"] if top else None}
+        }
+
+
+order_stats = OrderAggregates(orders_db)
+driver_stats = DriverAggregates(drivers_db)
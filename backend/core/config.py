@@ -6,6 +6,33 @@ class Settings(BaseSettings):
     REDIS_URL: str = "redis://localhost:6379"
     SECRET_KEY: str = "dev-secret-key"
     OLLAMA_HOST: str = "http://localhost:11434"
+    BATCH_DISPATCH_ENABLED: bool = False
+    DISPATCH_WINDOW_SECONDS: float = 2.0
+    ROUTING_HEDGING_ENABLED: bool = True
+    ROUTING_HEDGE_DELAY_SECONDS: float = 1.0
+    ROUTE_CACHE_MAX_ENTRIES: int = 2000
+    ROUTE_CACHE_TTL_SECONDS: float = 900
+    ROUTE_CACHE_FILE: str = "route_cache.json"
+    ROUTE_PLAN_DRIFT_THRESHOLD: float = 0.2
+    ROUTE_PLAN_REOPTIMIZE_INTERVAL_SECONDS: float = 10.0
+    DRIVER_ROUTE_MOVE_THRESHOLD_METERS: float = 150
+    FLEET_VRP_WORKERS: int = 0  # 0 = one per CPU
+    FLEET_VRP_TIME_BUDGET_SECONDS: float = 2.0
+    ANYTIME_LIVE_BUDGET_SECONDS: float = 0.05
+    ANYTIME_MAX_RUNNING_JOBS: int = 2
+    ROUTE_PLAN_SEARCH_BUDGET_SECONDS: float = 0.5
+    TRAVEL_MATRIX_MAX_COORDINATES: int = 100
+    TRAVEL_MATRIX_DETOUR_FACTOR: float = 1.3
+    TRAVEL_MATRIX_FALLBACK_SPEED_KMH: float = 30.0
+    ROUTE_GEOMETRY_DEFAULT_ZOOM: float = 17  # about 1 m per pixel in Morocco
+    ROUTE_GEOMETRY_STORE_TOLERANCE_METERS: float = 2.0
+    ROAD_GRAPH_PATH: str = "road_graph"  # directory written by build_road_graph.py
+    ROAD_GRAPH_MAX_SNAP_METERS: float = 500
+    WS_QUEUE_SIZE: int = 100  # messages buffered per socket before the oldest is dropped
+    WS_SEND_TIMEOUT_SECONDS: float = 5.0
+    WS_HEARTBEAT_SECONDS: float = 25.0  # sent only when a socket has been idle this long
+    GPS_MAX_FUTURE_SKEW_SECONDS: float = 300  # device clock ahead of the server
+    GPS_MAX_FIX_AGE_SECONDS: float = 3600  # buffered fixes older than this are rejected
     
     class Config:
         env_file = ".env"
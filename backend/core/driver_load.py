@@ -0,0 +1,109 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+from core.store import IndexedStore, orders_db, drivers_db
+
+EMPTY_LOAD = {"orders": 0, "weight": 0.0, "volume": 0.0}
+
+
+def order_volume(order: dict) -> float:
+    """Package volume in liters from its dimensions in cm"""
+    dimensions = order.get("dimensions") or {}
+    return dimensions.get("length", 0) * dimensions.get("width", 0) * dimensions.get("height", 0) / 1000
+
+
+def current_load(driver: dict) -> dict:
+    """Running totals of a driver's current orders"""
+    return driver.get("load") or EMPTY_LOAD
+
+
+class DriverLoadTracker:
+    """Running order count, weight and volume per driver.
+
+    Orders join and leave a driver's ``current_orders`` through attach/detach,
+    which update the list and the driver's ``load`` totals together under one
+    lock, so capacity checks read three numbers instead of re-summing orders.
+    """
+
+    def __init__(self, drivers: IndexedStore, orders: IndexedStore):
+        self.drivers = drivers
+        self.orders = orders
+        self._lock = threading.RLock()
+        self._contributions: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        for driver in drivers:
+            self.recompute(driver)
+        drivers.add_listener(self.on_change)
+
+    def _contribution(self, order_id: str) -> Tuple[float, float]:
+        order = self.orders.get(order_id)
+        if not order:
+            return 0.0, 0.0
+        return order.get("weight", 0) or 0.0, order_volume(order)
+
+    def _store(self, driver: dict, orders: int, weight: float, volume: float) -> None:
+        driver["load"] = {"orders": orders, "weight": round(weight, 3), "volume": round(volume, 3)}
+
+    def attach(self, driver: dict, order_id: str) -> bool:
+        """Add an order to the driver's current orders; False if it was already there"""
+        with self._lock:
+            if order_id in driver["current_orders"]:
+                return False
+            weight, volume = self._contribution(order_id)
+            driver["current_orders"].append(order_id)
+            self._contributions[(driver["id"], order_id)] = (weight, volume)
+            load = current_load(driver)
+            self._store(driver, load["orders"] + 1, load["weight"] + weight, load["volume"] + volume)
+            return True
+
+    def detach(self, driver: dict, order_id: str) -> bool:
+        """Remove an order from the driver's current orders; False if it was not there"""
+        with self._lock:
+            if order_id not in driver["current_orders"]:
+                return False
+            driver["current_orders"].remove(order_id)
+            weight, volume = self._contributions.pop((driver["id"], order_id), None) or self._contribution(order_id)
+            load = current_load(driver)
+            self._store(driver, max(0, load["orders"] - 1), max(0.0, load["weight"] - weight),
+                        max(0.0, load["volume"] - volume))
+            return True
+
+    def recompute(self, driver: dict) -> dict:
+        """Rebuild a driver's totals from its current orders"""
+        with self._lock:
+            weight = volume = 0.0
+            for order_id in driver.get("current_orders", []):
+                contribution = self._contribution(order_id)
+                self._contributions[(driver["id"], order_id)] = contribution
+                weight += contribution[0]
+                volume += contribution[1]
+            self._store(driver, len(driver.get("current_orders", [])), weight, volume)
+            return driver["load"]
+
+    def on_change(self, event: str, record: dict, field: Optional[str], old, new) -> None:
+        """Store listener: new drivers and replaced order lists get fresh totals"""
+        if event == "insert" or (event == "update" and field == "current_orders"):
+            self.recompute(record)
+
+    def fits(self, driver: dict, weight: float, volume: float = 0.0, max_orders: Optional[int] = None) -> bool:
+        """Whether one more order of this weight/volume stays within the driver's limits"""
+        load = current_load(driver)
+        if load["weight"] + weight > driver.get("vehicle_capacity", 50):
+            return False
+        if max_orders is not None and load["orders"] >= max_orders:
+            return False
+        return True
+
+    def check_consistency(self) -> dict:
+        """Compare maintained totals with a recomputation from current_orders"""
+        mismatches = []
+        for driver in self.drivers:
+            load = current_load(driver)
+            orders = driver.get("current_orders", [])
+            weight = sum(self._contribution(oid)[0] for oid in orders)
+            if load["orders"] != len(orders) or abs(load["weight"] - weight) > 1e-3:
+                mismatches.append({"driver_id": driver["id"], "maintained": load,
+                                   "recomputed": {"orders": len(orders), "weight": weight}})
+        return {"consistent": not mismatches, "mismatches": mismatches}
+
+
+driver_load = DriverLoadTracker(drivers_db, orders_db)
@@ -0,0 +1,57 @@
+def get_city_coordinates(city: str) -> dict:
+    """Get coordinates for Moroccan cities"""
+    coordinates = {
+        "casablanca": {"lat": 33.5731, "lng": -7.5898},
+        "rabat": {"lat": 34.0209, "lng": -6.8416},
+        "marrakech": {"lat": 31.6295, "lng": -7.9811},
+        "el jadida": {"lat": 33.2316, "lng": -8.5007},
+        "salé": {"lat": 34.0531, "lng": -6.7985},
+        "agadir": {"lat": 30.4278, "lng": -9.5981}
+    }
+    return coordinates.get(city.lower(), coordinates["casablanca"])
+
+
+def get_max_orders_for_vehicle(vehicle_type: str) -> int:
+    """Get maximum orders per vehicle type"""
+    limits = {"bike": 6, "scooter": 8, "car": 12, "van": 16}
+    return limits.get(vehicle_type, 6)
+
+
+def get_enhanced_vehicle_score(vehicle_type: str, order: dict) -> float:
+    """Realistic vehicle scoring based on actual delivery requirements"""
+    weight = order.get("weight", 1.0)
+    service_type = order.get("service_type", "standard")
+    is_fragile = order.get("fragile", False)
+    
+    # Realistic vehicle capabilities
+    vehicle_specs = {
+        "bike": {"max_weight": 15, "speed_factor": 1.2, "cost_efficiency": 1.0, "fragile_safe": 0.7},
+        "scooter": {"max_weight": 25, "speed_factor": 1.1, "cost_efficiency": 0.9, "fragile_safe": 0.8},
+        "car": {"max_weight": 80, "speed_factor": 1.0, "cost_efficiency": 0.7, "fragile_safe": 1.0},
+        "van": {"max_weight": 200, "speed_factor": 0.8, "cost_efficiency": 0.5, "fragile_safe": 1.0}
+    }
+    
+    specs = vehicle_specs.get(vehicle_type, vehicle_specs["bike"])
+    
+    # Base suitability check
+    if weight > specs["max_weight"]:
+        return 0  # Vehicle cannot handle the weight
+    
+    base_score = 10  # Base score for suitable vehicle
+    
+    # Express delivery bonus for faster vehicles
+    if service_type == "express":
+        base_score += specs["speed_factor"] * 5
+    
+    # Fragile item handling
+    if is_fragile:
+        base_score += specs["fragile_safe"] * 3
+    
+    # Weight efficiency (better score for appropriate vehicle size)
+    weight_ratio = weight / specs["max_weight"]
+    if 0.3 <= weight_ratio <= 0.8:  # Optimal load range
+        base_score += 3
+    elif weight_ratio < 0.3:  # Underutilized
+        base_score += 1
+    
+    return min(15, base_score)
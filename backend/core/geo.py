@@ -0,0 +1,161 @@
+import math
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+EARTH_RADIUS_M = EARTH_RADIUS_KM * 1000
+
+ArrayLike = Union[float, Iterable[float], np.ndarray]
+
+
+def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in km (scalar fast path)"""
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lng = math.radians(lng2 - lng1)
+
+    a = (math.sin(delta_lat / 2) ** 2 +
+         math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lng / 2) ** 2)
+    return EARTH_RADIUS_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def point_distance(loc1: Dict, loc2: Dict) -> float:
+    """Distance in km between two {"lat", "lng"} dicts"""
+    return haversine(loc1.get("lat", 0), loc1.get("lng", 0), loc2.get("lat", 0), loc2.get("lng", 0))
+
+
+def to_arrays(points: Iterable[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """Split {"lat", "lng"} dicts into latitude and longitude arrays"""
+    points = list(points)
+    lats = np.fromiter((p.get("lat", 0) for p in points), dtype=np.float64, count=len(points))
+    lngs = np.fromiter((p.get("lng", 0) for p in points), dtype=np.float64, count=len(points))
+    return lats, lngs
+
+
+def haversine_np(lat1: ArrayLike, lng1: ArrayLike, lat2: ArrayLike, lng2: ArrayLike) -> np.ndarray:
+    """Element-wise haversine distance in km with NumPy broadcasting"""
+    lat1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    lng1 = np.radians(np.asarray(lng1, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lat2, dtype=np.float64))
+    lng2 = np.radians(np.asarray(lng2, dtype=np.float64))
+
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distances_from(lat: float, lng: float, lats: ArrayLike, lngs: ArrayLike) -> np.ndarray:
+    """One-to-many distances in km from a single point"""
+    return haversine_np(lat, lng, lats, lngs)
+
+
+def distance_matrix(lats1: ArrayLike, lngs1: ArrayLike,
+                    lats2: Optional[ArrayLike] = None, lngs2: Optional[ArrayLike] = None) -> np.ndarray:
+    """Many-to-many distance matrix in km (square over the first set when the second is omitted)"""
+    lats1 = np.asarray(lats1, dtype=np.float64)
+    lngs1 = np.asarray(lngs1, dtype=np.float64)
+    if lats2 is None or lngs2 is None:
+        lats2, lngs2 = lats1, lngs1
+    lats2 = np.asarray(lats2, dtype=np.float64)
+    lngs2 = np.asarray(lngs2, dtype=np.float64)
+    return haversine_np(lats1[:, None], lngs1[:, None], lats2[None, :], lngs2[None, :])
+
+
+def path_length(lats: ArrayLike, lngs: ArrayLike) -> float:
+    """Total length in km of a polyline through the given points"""
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    if lats.size < 2:
+        return 0.0
+    return float(haversine_np(lats[:-1], lngs[:-1], lats[1:], lngs[1:]).sum())
+
+
+def bearing(lat1: ArrayLike, lng1: ArrayLike, lat2: ArrayLike, lng2: ArrayLike) -> np.ndarray:
+    """Initial compass bearing in degrees [0, 360) from point 1 to point 2"""
+    lat1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lat2, dtype=np.float64))
+    delta_lng = np.radians(np.asarray(lng2, dtype=np.float64) - np.asarray(lng1, dtype=np.float64))
+
+    x = np.sin(delta_lng) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(delta_lng)
+    return (np.degrees(np.arctan2(x, y)) + 360.0) % 360.0
+
+
+def point_to_segment_distance(lat: ArrayLike, lng: ArrayLike,
+                              lat_a: ArrayLike, lng_a: ArrayLike,
+                              lat_b: ArrayLike, lng_b: ArrayLike) -> np.ndarray:
+    """Distance in km from points to segments A-B.
+
+    Uses a local equirectangular projection around each segment, which is
+    accurate to well under 1% at city and regional scale.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    lat_a = np.asarray(lat_a, dtype=np.float64)
+    lng_a = np.asarray(lng_a, dtype=np.float64)
+    lat_b = np.asarray(lat_b, dtype=np.float64)
+    lng_b = np.asarray(lng_b, dtype=np.float64)
+
+    cos_lat = np.cos(np.radians((lat_a + lat_b) / 2))
+    bx = (lng_b - lng_a) * cos_lat
+    by = lat_b - lat_a
+    px = (lng - lng_a) * cos_lat
+    py = lat - lat_a
+
+    length_sq = bx * bx + by * by
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(length_sq > 0, (px * bx + py * by) / length_sq, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+
+    closest_lat = lat_a + t * by
+    closest_lng = lng_a + t * (lng_b - lng_a)
+    return haversine_np(lat, lng, closest_lat, closest_lng)
+
+
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(lat: float, lng: float, precision: int = 5) -> str:
+    """Geohash of a point (precision 5 is a cell of roughly 4.9 x 4.9 km)"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, bounds = (lng, lng_range) if even else (lat, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            bounds[0] = mid
+        else:
+            bits <<= 1
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def geohash_center(code: str) -> Tuple[float, float]:
+    """(lat, lng) of the center of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in code:
+        value = _GEOHASH_BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bounds = lng_range if even else lat_range
+            mid = (bounds[0] + bounds[1]) / 2
+            if (value >> shift) & 1:
+                bounds[0] = mid
+            else:
+                bounds[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lng_range[0] + lng_range[1]) / 2
@@ -0,0 +1,93 @@
+import asyncio
+from collections import defaultdict
+from typing import Dict, Optional
+
+import httpx
+
+
+class HttpClient:
+    """Shared async HTTP client for every outbound call (OSRM, ORS, open-meteo, Nominatim).
+
+    One keep-alive connection pool serves the whole process, each host gets a
+    concurrency limit, and every request carries an overall deadline covering
+    the wait for a slot as well as the transfer. Call ``aclose()`` on shutdown.
+    """
+
+    def __init__(self, max_connections: int = 100, max_keepalive: int = 20, per_host_limit: int = 10,
+                 host_limits: Optional[Dict[str, int]] = None, timeout: float = 5.0, deadline: float = 10.0):
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.per_host_limit = per_host_limit
+        self.host_limits = host_limits or {}
+        self.timeout = timeout
+        self.deadline = deadline
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.stats = defaultdict(lambda: {"requests": 0, "errors": 0, "timeouts": 0, "in_flight": 0})
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        # Pools and semaphores belong to one event loop; start fresh if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=httpx.Timeout(self.timeout),
+                headers={"User-Agent": "DeliveryApp/1.0"},
+                follow_redirects=True
+            )
+            self._loop = loop
+            self._semaphores = {}
+        return self._client
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.host_limits.get(host, self.per_host_limit))
+        return self._semaphores[host]
+
+    async def request(self, method: str, url: str, deadline: Optional[float] = None, **kwargs) -> httpx.Response:
+        """Send a request through the shared pool; raises asyncio.TimeoutError past the deadline"""
+        client = self._ensure_client()
+        host = httpx.URL(url).host
+        deadline = deadline or self.deadline
+        # Per-phase timeouts must not cut a request shorter than its overall deadline
+        kwargs.setdefault("timeout", max(self.timeout, deadline))
+        stats = self.stats[host]
+
+        async def send() -> httpx.Response:
+            async with self._semaphore(host):
+                stats["in_flight"] += 1
+                try:
+                    return await client.request(method, url, **kwargs)
+                finally:
+                    stats["in_flight"] -= 1
+
+        stats["requests"] += 1
+        try:
+            return await asyncio.wait_for(send(), timeout=deadline)
+        except asyncio.TimeoutError:
+            stats["timeouts"] += 1
+            raise
+        except Exception:
+            stats["errors"] += 1
+            raise
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self) -> None:
+        """Close pooled connections (app shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+            self._semaphores = {}
+
+    def get_stats(self) -> dict:
+        return {host: dict(values) for host, values in self.stats.items()}
+
+
+# Nominatim's usage policy allows one request at a time
+http_client = HttpClient(host_limits={"nominatim.openstreetmap.org": 1})
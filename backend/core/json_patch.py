@@ -0,0 +1,73 @@
+"""Minimal JSON Patch (RFC 6902) diff and apply for JSON-compatible documents.
+
+``diff`` emits add/remove/replace operations only. Lists that grew at the end
+(e.g. a route history) produce appends, equal-length lists are diffed per
+element, and any other list change replaces the whole list.
+"""
+import json
+from typing import Any, List
+
+
+def plain(value: Any) -> Any:
+    """Deep copy as JSON types, exactly as a client would see the value"""
+    return json.loads(json.dumps(value, default=str))
+
+
+def _escape(key) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def diff(old: Any, new: Any, path: str = "") -> List[dict]:
+    """Operations that turn ``old`` into ``new``"""
+    if old is new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = [{"op": "remove", "path": f"{path}/{_escape(key)}"} for key in old if key not in new]
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": child, "value": value})
+            else:
+                ops.extend(diff(old[key], value, child))
+        return ops
+    if isinstance(old, list) and isinstance(new, list):
+        if len(new) > len(old) and new[:len(old)] == old:
+            return [{"op": "add", "path": f"{path}/-", "value": value} for value in new[len(old):]]
+        if len(new) == len(old):
+            ops = []
+            for index, (a, b) in enumerate(zip(old, new)):
+                ops.extend(diff(a, b, f"{path}/{index}"))
+            return ops
+    elif type(old) is type(new) and old == new:
+        return []
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def apply(doc: Any, ops: List[dict]) -> Any:
+    """Apply operations produced by ``diff`` and return the new document"""
+    for op in ops:
+        if not op["path"]:
+            doc = op.get("value")
+            continue
+        *parents, last = [_unescape(token) for token in op["path"].split("/")[1:]]
+        target = doc
+        for token in parents:
+            target = target[int(token)] if isinstance(target, list) else target[token]
+        if isinstance(target, list):
+            if op["op"] == "remove":
+                del target[int(last)]
+            elif last == "-":
+                target.append(op["value"])
+            elif op["op"] == "add":
+                target.insert(int(last), op["value"])
+            else:
+                target[int(last)] = op["value"]
+        elif op["op"] == "remove":
+            del target[last]
+        else:
+            target[last] = op["value"]
+    return doc
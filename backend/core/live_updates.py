@@ -0,0 +1,171 @@
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from core import json_patch
+from core.store import IndexedStore, orders_db, drivers_db
+from core.websocket import ConnectionManager, manager
+
+
+class DeltaStream:
+    """Last document published on a topic and its sequence number"""
+
+    def __init__(self, doc: dict):
+        self.doc = doc
+        self.seq = 0
+
+    def advance(self, doc: dict) -> List[dict]:
+        """Patch from the last published document to ``doc``; bumps seq when non-empty"""
+        ops = json_patch.diff(self.doc, doc)
+        if ops:
+            self.doc = doc
+            self.seq += 1
+        return ops
+
+
+class LiveUpdates:
+    """Pushes order and driver changes to websocket subscribers.
+
+    Store listeners only mark records dirty and schedule one flush on the hub's
+    event loop, so an endpoint writing several fields produces a single message
+    per record and nothing runs while nothing changes. Order updates go to
+    ``order:{id}``, ``city:{pickup_city}`` and ``admin``; each is a complete
+    (and small) tracking state.
+
+    ``driver:{id}`` carries the driver plus their assigned orders as a
+    snapshot followed by JSON patches. Every patch has the next ``seq`` of the
+    topic's stream, so a client that sees a gap (e.g. after the hub dropped
+    messages for it) asks for a resync and gets a fresh snapshot.
+    """
+
+    def __init__(self, orders: IndexedStore, drivers: IndexedStore, hub: ConnectionManager):
+        self.orders = orders
+        self.drivers = drivers
+        self.hub = hub
+        self._lock = threading.Lock()
+        self._dirty_orders: Dict[str, Set[str]] = {}
+        self._dirty_drivers: Set[str] = set()
+        self._changed_drivers: Set[str] = set()
+        self._scheduled = False
+        self._streams: Dict[str, DeltaStream] = {}
+        self.stats = {"changes": 0, "flushes": 0, "order_updates": 0, "driver_deltas": 0, "driver_snapshots": 0}
+        orders.add_listener(self.on_order_change)
+        drivers.add_listener(self.on_driver_change)
+
+    # Store listeners (may run on worker threads)
+
+    def on_order_change(self, event: str, record, field, old, new) -> None:
+        if not self.hub.connections:
+            return
+        with self._lock:
+            self._dirty_orders.setdefault(record[self.orders.key], set()).add(field or event)
+            for driver_id in (record.get("assigned_driver"), old if field == "assigned_driver" else None):
+                if driver_id:
+                    self._dirty_drivers.add(driver_id)
+            self._schedule()
+
+    def on_driver_change(self, event: str, record, field, old, new) -> None:
+        if not self.hub.connections:
+            return
+        with self._lock:
+            self._dirty_drivers.add(record[self.drivers.key])
+            self._changed_drivers.add(record[self.drivers.key])
+            self._schedule()
+
+    def _schedule(self) -> None:
+        self.stats["changes"] += 1
+        if not self._scheduled:
+            self._scheduled = self.hub.call_soon(self.flush)
+            if not self._scheduled:
+                self._dirty_orders.clear()
+                self._dirty_drivers.clear()
+                self._changed_drivers.clear()
+
+    # Publishing (runs on the event loop)
+
+    def flush(self) -> None:
+        with self._lock:
+            dirty_orders, dirty_drivers, changed_drivers = self._dirty_orders, self._dirty_drivers, self._changed_drivers
+            self._dirty_orders, self._dirty_drivers, self._changed_drivers = {}, set(), set()
+            self._scheduled = False
+        self.stats["flushes"] += 1
+
+        for order_id, fields in dirty_orders.items():
+            order = self.orders.get(order_id)
+            message = self.order_payload(order_id, order)
+            message["changed"] = sorted(fields)
+            topics = [f"order:{order_id}", "admin"]
+            if order and order.get("pickup_city"):
+                topics.append(f"city:{order['pickup_city'].lower()}")
+            self.hub.publish(message, topics)
+            self.stats["order_updates"] += 1
+
+        for driver_id in dirty_drivers:
+            stream = self._streams.get(driver_id)
+            if not self.hub.topics.get(f"driver:{driver_id}"):
+                self._streams.pop(driver_id, None)
+                continue
+            if stream is None:
+                continue
+            doc = self._driver_document(driver_id, stream.doc, dirty_orders, driver_id in changed_drivers)
+            if doc is not None:
+                self._publish_delta(driver_id, stream, doc)
+
+    def order_payload(self, order_id: str, order: Optional[dict] = None) -> dict:
+        """Tracking message for an order (``removed`` once it is gone from the store)"""
+        order = order if order is not None else self.orders.get(order_id)
+        if order is None:
+            return {"type": "order_update", "order_id": order_id, "removed": True,
+                    "timestamp": datetime.now().isoformat()}
+        return {
+            "type": "order_update",
+            "order_id": order_id,
+            "status": order.get("status"),
+            "current_location": order.get("current_location"),
+            "assigned_driver": order.get("assigned_driver"),
+            "timestamp": datetime.now().isoformat()
+        }
+
+    def driver_snapshot(self, driver_id: str) -> Optional[dict]:
+        """Full driver document at the stream's current seq, or None for an unknown driver.
+
+        The stream is first brought up to date with the store (changes are not
+        tracked while nobody is connected), publishing the catch-up patch to
+        existing subscribers; clients ignore patches with seq <= their snapshot.
+        """
+        doc = self._driver_document(driver_id)
+        if doc is None:
+            return None
+        stream = self._streams.get(driver_id)
+        if stream is None:
+            stream = self._streams[driver_id] = DeltaStream(doc)
+        else:
+            self._publish_delta(driver_id, stream, doc)
+        self.stats["driver_snapshots"] += 1
+        return {"type": "driver_snapshot", "driver_id": driver_id, "seq": stream.seq, "data": stream.doc,
+                "timestamp": datetime.now().isoformat()}
+
+    def _publish_delta(self, driver_id: str, stream: DeltaStream, doc: dict) -> None:
+        ops = stream.advance(doc)
+        if ops:
+            self.hub.publish({"type": "driver_delta", "driver_id": driver_id, "seq": stream.seq, "ops": ops},
+                             [f"driver:{driver_id}"])
+            self.stats["driver_deltas"] += 1
+
+    def _driver_document(self, driver_id: str, previous: Optional[dict] = None,
+                         changed_orders: Iterable[str] = (), driver_changed: bool = True) -> Optional[dict]:
+        """Driver plus assigned orders keyed by id, as plain JSON; unchanged parts are reused from ``previous``"""
+        driver = self.drivers.get(driver_id)
+        if driver is None:
+            return None
+        orders = {}
+        for order in self.orders.find("assigned_driver", driver_id):
+            cached = previous["orders"].get(order["id"]) if previous else None
+            orders[order["id"]] = cached if cached is not None and order["id"] not in changed_orders else json_patch.plain(order)
+        return {
+            "driver": json_patch.plain(driver) if driver_changed or previous is None else previous["driver"],
+            "orders": orders
+        }
+
+
+live_updates = LiveUpdates(orders_db, drivers_db, manager)
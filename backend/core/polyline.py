@@ -0,0 +1,140 @@
+import math
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from core.config import settings
+
+# Ground resolution of one 256 px Web Mercator tile pixel at zoom 0 on the equator
+METERS_PER_PIXEL_Z0 = 156543.03392
+METERS_PER_DEGREE = 111320.0
+
+Coordinates = Sequence[Sequence[float]]  # GeoJSON order: [lng, lat]
+
+
+def tolerance_for_zoom(zoom: float, lat: float = 0.0, pixels: float = 1.0) -> float:
+    """Simplification tolerance in meters that stays below ``pixels`` on screen at ``zoom``"""
+    return METERS_PER_PIXEL_Z0 * math.cos(math.radians(lat)) / 2 ** zoom * pixels
+
+
+def simplify(coordinates: Coordinates, tolerance_m: float) -> List[List[float]]:
+    """Douglas-Peucker simplification of a [lng, lat] line to within ``tolerance_m`` meters.
+
+    Points are projected to a local equirectangular plane, which is accurate
+    enough for city and regional routes. The first and last points are kept.
+    """
+    if len(coordinates) <= 2 or tolerance_m <= 0:
+        return [list(point) for point in coordinates]
+    points = np.asarray(coordinates, dtype=np.float64)[:, :2]
+    cos_lat = math.cos(math.radians(float(points[:, 1].mean())))
+    x = points[:, 0] * METERS_PER_DEGREE * cos_lat
+    y = points[:, 1] * METERS_PER_DEGREE
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length = math.hypot(dx, dy)
+        if length > 0:
+            # Distance to the chord, clamped to its ends
+            t = np.clip((px * dx + py * dy) / (length * length), 0.0, 1.0)
+            offsets = np.hypot(px - t * dx, py - t * dy)
+        else:
+            offsets = np.hypot(px, py)
+        index = int(offsets.argmax())
+        if offsets[index] > tolerance_m:
+            split = start + 1 + index
+            keep[split] = True
+            stack += [(start, split), (split, end)]
+    return points[keep].tolist()
+
+
+def encode(coordinates: Coordinates, precision: int = 5) -> str:
+    """Google encoded polyline of a [lng, lat] line (the format stores lat first)"""
+    factor = 10 ** precision
+    output = []
+    prev_lat = prev_lng = 0
+    for point in coordinates:
+        lat, lng = round(point[1] * factor), round(point[0] * factor)
+        for delta in (lat - prev_lat, lng - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                output.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            output.append(chr(value + 63))
+        prev_lat, prev_lng = lat, lng
+    return "".join(output)
+
+
+def decode(encoded: str, precision: int = 5) -> List[List[float]]:
+    """[lng, lat] line from a Google encoded polyline"""
+    factor = 10 ** precision
+    coordinates = []
+    index = lat = lng = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        coordinates.append([lng / factor, lat / factor])
+    return coordinates
+
+
+def compact(coordinates: Coordinates, tolerance_m: float, precision: int = 5) -> str:
+    """Simplified and encoded line, for storage"""
+    return encode(simplify(coordinates, tolerance_m), precision)
+
+
+def expand(geometry: Union[str, Coordinates, None]) -> Optional[List[List[float]]]:
+    """[lng, lat] line from stored geometry, which is encoded or (older records) a coordinate list"""
+    if isinstance(geometry, str):
+        return decode(geometry)
+    return [list(point) for point in geometry] if geometry is not None else None
+
+
+def shape_geometry(coordinates: Coordinates, tolerance_m: float, encoding: str = "geojson") -> Union[str, List]:
+    """Line simplified for the client, as coordinates or an encoded polyline"""
+    simplified = simplify(coordinates, tolerance_m)
+    return encode(simplified) if encoding == "polyline" else simplified
+
+
+def shape_route(route: Dict, zoom: Optional[float] = None, encoding: str = "geojson") -> Dict:
+    """Copy of a routing result with its overview and step lines simplified for ``zoom``.
+
+    Without a zoom, lines are simplified to about a pixel at
+    ROUTE_GEOMETRY_DEFAULT_ZOOM, which is visually lossless. With
+    ``encoding="polyline"`` each line is sent as a precision-5 encoded
+    polyline under ``polyline`` instead of ``coordinates``. Cached routes are
+    shared, so the input is never modified.
+    """
+    coordinates = route.get("coordinates")
+    if not coordinates:
+        return route
+    lat = float(np.mean([point[1] for point in coordinates]))
+    tolerance = tolerance_for_zoom(settings.ROUTE_GEOMETRY_DEFAULT_ZOOM if zoom is None else zoom, lat)
+
+    def shape(item: Dict) -> Dict:
+        item = dict(item)
+        line = shape_geometry(item.pop("coordinates", None) or [], tolerance, encoding)
+        item["polyline" if encoding == "polyline" else "coordinates"] = line
+        return item
+
+    shaped = shape(route)
+    if route.get("steps"):
+        shaped["steps"] = [shape(step) if "coordinates" in step else step for step in route["steps"]]
+    shaped["geometry_format"] = "polyline5" if encoding == "polyline" else "geojson"
+    return shaped
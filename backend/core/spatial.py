@@ -0,0 +1,213 @@
+import math
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from core.geo import distances_from
+from core.store import IndexedStore, drivers_db
+
+KM_PER_DEGREE = 111.195
+
+# Candidate generation for driver assignment
+CITY_RADIUS_KM = 50  # drivers further than this from a city centre are not "in" it
+MAX_CANDIDATES = 25  # nearest drivers handed to the scoring step
+
+
+def _coords(location) -> Optional[Tuple[float, float]]:
+    """(lat, lng) from a location dict, or None when it has no usable position"""
+    if not isinstance(location, dict):
+        return None
+    lat, lng = location.get("lat"), location.get("lng")
+    if lat is None or lng is None:
+        return None
+    try:
+        return float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+
+
+class SpatialGridIndex:
+    """Uniform lat/lng grid over the positions of a store's records.
+
+    Each record lives in exactly one cell, so k-nearest and radius queries only
+    touch the cells around the query point instead of every record. Replacing
+    the location field is picked up through the store listener; in-place edits
+    of the nested location dict must be followed by ``store.touch(record, field)``
+    (or ``refresh(record)``).
+    """
+
+    def __init__(self, store: IndexedStore, field: str = "current_location", cell_size_deg: float = 0.02):
+        self.store = store
+        self.field = field
+        self.cell_size = cell_size_deg
+        self._points: Dict[str, Tuple[float, float, Tuple[int, int]]] = {}
+        self._cells: Dict[Tuple[int, int], Set[str]] = {}
+        for record in store:
+            self.refresh(record)
+        store.add_listener(self.on_change)
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_size), math.floor(lng / self.cell_size)
+
+    # Maintenance
+
+    def update(self, record_id: str, lat: float, lng: float) -> None:
+        """Move a record to a new position"""
+        cell = self._cell(lat, lng)
+        previous = self._points.get(record_id)
+        if previous and previous[2] != cell:
+            self._discard_from_cell(record_id, previous[2])
+        if not previous or previous[2] != cell:
+            self._cells.setdefault(cell, set()).add(record_id)
+        self._points[record_id] = (lat, lng, cell)
+
+    def remove(self, record_id: str) -> None:
+        previous = self._points.pop(record_id, None)
+        if previous:
+            self._discard_from_cell(record_id, previous[2])
+
+    def refresh(self, record: dict) -> None:
+        """Re-read a record's location field into the index"""
+        coords = _coords(record.get(self.field))
+        if coords is None:
+            self.remove(record[self.store.key])
+        else:
+            self.update(record[self.store.key], *coords)
+
+    def on_change(self, event: str, record: dict, field: Optional[str], old, new) -> None:
+        """Store listener tracking inserts, removals and location replacements"""
+        if event == "remove":
+            self.remove(record[self.store.key])
+        elif event == "insert" or field == self.field:
+            self.refresh(record)
+        elif field == self.store.key and old is not None:
+            self.remove(old)
+            self.refresh(record)
+
+    def _discard_from_cell(self, record_id: str, cell: Tuple[int, int]) -> None:
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(record_id)
+            if not members:
+                del self._cells[cell]
+
+    # Queries
+
+    def _matcher(self, statuses: Optional[Iterable[str]], vehicle_types: Optional[Iterable[str]],
+                 predicate: Optional[Callable[[dict], bool]]) -> Callable[[dict], bool]:
+        statuses = set(statuses) if statuses is not None else None
+        vehicle_types = set(vehicle_types) if vehicle_types is not None else None
+
+        def matches(record: dict) -> bool:
+            if statuses is not None and record.get("status") not in statuses:
+                return False
+            if vehicle_types is not None and record.get("vehicle_type") not in vehicle_types:
+                return False
+            return predicate is None or predicate(record)
+
+        return matches
+
+    def _measure(self, lat: float, lng: float, ids: List[str], matches: Callable[[dict], bool]) -> List[Tuple[dict, float]]:
+        """Filter candidate ids and compute their distances in one vectorized call"""
+        records, lats, lngs = [], [], []
+        for record_id in ids:
+            record = self.store.get(record_id)
+            if record is None or not matches(record):
+                continue
+            point = self._points[record_id]
+            records.append(record)
+            lats.append(point[0])
+            lngs.append(point[1])
+        if not records:
+            return []
+        distances = distances_from(lat, lng, np.array(lats), np.array(lngs))
+        return list(zip(records, distances.tolist()))
+
+    def _ring(self, center: Tuple[int, int], radius: int) -> Iterable[Tuple[int, int]]:
+        ci, cj = center
+        if radius == 0:
+            yield center
+            return
+        for j in range(cj - radius, cj + radius + 1):
+            yield ci - radius, j
+            yield ci + radius, j
+        for i in range(ci - radius + 1, ci + radius):
+            yield i, cj - radius
+            yield i, cj + radius
+
+    def _min_ring_km(self, lat: float, radius: int) -> float:
+        """Lower bound on the distance from the query point to any record in ring `radius` or beyond"""
+        widest_lat = min(89.9, abs(lat) + (radius + 1) * self.cell_size)
+        cell_km = self.cell_size * KM_PER_DEGREE * math.cos(math.radians(widest_lat))
+        return max(0, radius - 1) * cell_km
+
+    def nearest(self, lat: float, lng: float, k: int = 5, max_distance_km: Optional[float] = None,
+                statuses: Optional[Iterable[str]] = None, vehicle_types: Optional[Iterable[str]] = None,
+                predicate: Optional[Callable[[dict], bool]] = None) -> List[Tuple[dict, float]]:
+        """k nearest matching records as (record, distance_km), closest first"""
+        if k <= 0 or not self._points:
+            return []
+        matches = self._matcher(statuses, vehicle_types, predicate)
+        center = self._cell(lat, lng)
+        found: List[Tuple[dict, float]] = []
+        examined_cells = 0
+        radius = 0
+
+        while examined_cells < len(self._cells):
+            if max_distance_km is not None and self._min_ring_km(lat, radius) > max_distance_km:
+                break
+            if len(found) >= k and found[k - 1][1] <= self._min_ring_km(lat, radius):
+                break
+
+            if 8 * radius > len(self._cells):
+                # Rings are now wider than the occupied area: finish with the remaining cells
+                ids = [rid for cell, members in self._cells.items()
+                       if max(abs(cell[0] - center[0]), abs(cell[1] - center[1])) >= radius
+                       for rid in members]
+                examined_cells = len(self._cells)
+            else:
+                ids = []
+                for cell in self._ring(center, radius):
+                    members = self._cells.get(cell)
+                    if members:
+                        examined_cells += 1
+                        ids.extend(members)
+
+            if ids:
+                found.extend(self._measure(lat, lng, ids, matches))
+                found.sort(key=lambda item: item[1])
+            radius += 1
+
+        if max_distance_km is not None:
+            found = [item for item in found if item[1] <= max_distance_km]
+        return found[:k]
+
+    def within(self, lat: float, lng: float, radius_km: float,
+               statuses: Optional[Iterable[str]] = None, vehicle_types: Optional[Iterable[str]] = None,
+               predicate: Optional[Callable[[dict], bool]] = None) -> List[Tuple[dict, float]]:
+        """All matching records within radius_km as (record, distance_km), closest first"""
+        if not self._points:
+            return []
+        matches = self._matcher(statuses, vehicle_types, predicate)
+        lat_span = radius_km / KM_PER_DEGREE
+        cos_lat = max(0.01, math.cos(math.radians(min(89.9, abs(lat) + lat_span))))
+        lng_span = radius_km / (KM_PER_DEGREE * cos_lat)
+
+        i_min, j_min = self._cell(lat - lat_span, lng - lng_span)
+        i_max, j_max = self._cell(lat + lat_span, lng + lng_span)
+        if (i_max - i_min + 1) * (j_max - j_min + 1) > len(self._cells):
+            cells = [cell for cell in self._cells if i_min <= cell[0] <= i_max and j_min <= cell[1] <= j_max]
+        else:
+            cells = [(i, j) for i in range(i_min, i_max + 1) for j in range(j_min, j_max + 1)]
+
+        ids = [rid for cell in cells for rid in self._cells.get(cell, ())]
+        found = [item for item in self._measure(lat, lng, ids, matches) if item[1] <= radius_km]
+        found.sort(key=lambda item: item[1])
+        return found
+
+
+# Live driver positions, kept in sync with drivers_db
+driver_locations = SpatialGridIndex(drivers_db)
@@ -0,0 +1,214 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+_MISSING = object()
+
+
+class Record(dict):
+    """Dict record that reports every write back to its store"""
+
+    def __init__(self, store: "IndexedStore", data: dict):
+        super().__init__(data)
+        self._store = store
+
+    def __setitem__(self, key, value):
+        old = self.get(key, _MISSING)
+        super().__setitem__(key, value)
+        self._store._on_change(self, key, old, value)
+
+    def __delitem__(self, key):
+        old = self[key]
+        super().__delitem__(key)
+        self._store._on_change(self, key, old, _MISSING)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def copy(self) -> dict:
+        return dict(self)
+
+
+class IndexedStore:
+    """In-memory record store with a primary-key dict and secondary indexes.
+
+    Records are handed out as ``Record`` dicts, so plain item assignment such as
+    ``order["status"] = "delivered"`` keeps every index consistent. Lookups are
+    exact except on the ``casefold_fields`` indexes, which ignore case.
+    """
+
+    def __init__(self, indexes: Iterable[str] = (), key: str = "id", casefold_fields: Iterable[str] = ()):
+        self.key = key
+        self.casefold_fields = frozenset(casefold_fields)
+        self._records: Dict[str, Record] = {}
+        self._seq: Dict[str, int] = {}
+        self._next_seq = 0
+        self._indexes: Dict[str, Dict[Any, Dict[str, Record]]] = {field: {} for field in indexes}
+        self._listeners: List[Callable] = []
+
+    # Reads
+
+    def __iter__(self) -> Iterator[Record]:
+        return iter(list(self._records.values()))
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, record_id) -> bool:
+        return record_id in self._records
+
+    def __bool__(self) -> bool:
+        return bool(self._records)
+
+    def all(self) -> List[Record]:
+        """All records in insertion order"""
+        return list(self._records.values())
+
+    def get(self, record_id: Optional[str]) -> Optional[Record]:
+        """Get a record by primary key"""
+        if record_id is None:
+            return None
+        return self._records.get(record_id)
+
+    def find(self, field: str, value: Any) -> List[Record]:
+        """All records whose indexed field equals value, in insertion order"""
+        bucket = self._bucket(field, value)
+        if len(bucket) <= 1:
+            return list(bucket.values())
+        return sorted(bucket.values(), key=lambda r: self._seq[r[self.key]])
+
+    def find_one(self, field: str, value: Any) -> Optional[Record]:
+        """First record (by insertion order) whose indexed field equals value"""
+        bucket = self._bucket(field, value)
+        if not bucket:
+            return None
+        return min(bucket.values(), key=lambda r: self._seq[r[self.key]])
+
+    def find_in(self, field: str, values: Iterable[Any]) -> List[Record]:
+        """All records whose indexed field is one of values, in insertion order"""
+        matches = {}
+        for value in values:
+            matches.update(self._bucket(field, value))
+        return sorted(matches.values(), key=lambda r: self._seq[r[self.key]])
+
+    def count(self, field: str, value: Any) -> int:
+        """Number of records whose indexed field equals value"""
+        return len(self._bucket(field, value))
+
+    def count_in(self, field: str, values: Iterable[Any]) -> int:
+        """Number of records whose indexed field is one of values"""
+        return sum(len(self._bucket(field, value)) for value in {self._index_key(field, v) for v in values})
+
+    def _index_key(self, field: str, value: Any) -> Any:
+        """Normalize a field value for index lookups (strings are case-insensitive on casefold fields)"""
+        if field in self.casefold_fields and isinstance(value, str):
+            return value.lower()
+        return value
+
+    def _bucket(self, field: str, value: Any) -> Dict[str, Record]:
+        if field not in self._indexes:
+            raise KeyError(f"Field '{field}' is not indexed")
+        return self._indexes[field].get(self._index_key(field, value), {})
+
+    # Writes
+
+    def insert(self, data: dict) -> Record:
+        """Insert a record and return the tracked copy"""
+        record_id = data[self.key]
+        if record_id in self._records:
+            raise ValueError(f"Duplicate {self.key}: {record_id}")
+
+        record = data if isinstance(data, Record) and data._store is self else Record(self, data)
+        self._records[record_id] = record
+        self._seq[record_id] = self._next_seq
+        self._next_seq += 1
+
+        for field in self._indexes:
+            self._index_add(field, record.get(field), record)
+        self._notify("insert", record, None, None, None)
+        return record
+
+    def load(self, items: Iterable[dict]) -> None:
+        """Bulk insert seed records"""
+        for data in items:
+            self.insert(data)
+
+    def remove(self, record_id: str) -> Optional[Record]:
+        """Remove a record by primary key"""
+        record = self._records.pop(record_id, None)
+        if record is None:
+            return None
+        del self._seq[record_id]
+        for field in self._indexes:
+            self._index_discard(field, record.get(field), record_id)
+        self._notify("remove", record, None, None, None)
+        return record
+
+    def touch(self, record: Record, field: str) -> None:
+        """Report an in-place edit of a nested value (e.g. a location dict) to indexes and listeners"""
+        value = record.get(field)
+        self._on_change(record, field, value, value)
+
+    def add_listener(self, listener: Callable) -> None:
+        """Register listener(event, record, field, old, new) called after every change"""
+        self._listeners.append(listener)
+
+    def _notify(self, event: str, record: Record, field: Optional[str], old: Any, new: Any) -> None:
+        for listener in self._listeners:
+            listener(event, record, field, old, new)
+
+    def _on_change(self, record: Record, field: str, old: Any, new: Any) -> None:
+        if field == self.key and old is not _MISSING and old != new:
+            self._rekey(record, old, new)
+        if field in self._indexes:
+            old_value = None if old is _MISSING else old
+            new_value = None if new is _MISSING else new
+            if self._index_key(field, old_value) != self._index_key(field, new_value):
+                record_id = record[self.key]
+                self._index_discard(field, old_value, record_id)
+                self._index_add(field, new_value, record)
+        if self._listeners:
+            self._notify("update", record, field, None if old is _MISSING else old, None if new is _MISSING else new)
+
+    def _rekey(self, record: Record, old_id: str, new_id: str) -> None:
+        if new_id in self._records:
+            raise ValueError(f"Duplicate {self.key}: {new_id}")
+        del self._records[old_id]
+        self._records[new_id] = record
+        self._seq[new_id] = self._seq.pop(old_id)
+        for field, index in self._indexes.items():
+            bucket = index.get(self._index_key(field, record.get(field)))
+            if bucket is not None and old_id in bucket:
+                bucket[new_id] = bucket.pop(old_id)
+
+    def _index_add(self, field: str, value: Any, record: Record) -> None:
+        self._indexes[field].setdefault(self._index_key(field, value), {})[record[self.key]] = record
+
+    def _index_discard(self, field: str, value: Any, record_id: str) -> None:
+        index = self._indexes[field]
+        value_key = self._index_key(field, value)
+        bucket = index.get(value_key)
+        if bucket is None:
+            return
+        bucket.pop(record_id, None)
+        if not bucket:
+            del index[value_key]
+
+
+# Process-wide stores shared by main.py and the API routers
+orders_db = IndexedStore(indexes=("tracking_number", "assigned_driver", "status", "pickup_city"),
+                         casefold_fields=("pickup_city",))
+drivers_db = IndexedStore(indexes=("email", "status", "assigned_city"), casefold_fields=("email", "assigned_city"))
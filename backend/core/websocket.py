@@ -1,22 +1,251 @@
-from fastapi import WebSocket
-from typing import List
+import asyncio
+import json
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from core.config import settings
+
+# Message fields that route a broadcast to topics, e.g. {"order_id": "ORD1"} -> "order:ORD1"
+TOPIC_FIELDS = {"order_id": "order", "driver_id": "driver", "city": "city", "user_id": "user"}
+ADMIN_TOPIC = "admin"
+
+
+def topics_for(message: dict) -> List[str]:
+    """Topics a message belongs to: admin plus one per routing field it carries"""
+    topics = [ADMIN_TOPIC]
+    for field, prefix in TOPIC_FIELDS.items():
+        value = message.get(field)
+        if value:
+            topics.append(f"{prefix}:{value.lower() if prefix == 'city' else value}")
+    return topics
+
+
+class Connection:
+    """One socket with its own bounded send queue, drained by its own task.
+
+    When the queue is full the oldest message is dropped, so a slow client
+    only ever falls behind on its own messages and always gets the latest.
+    """
+
+    def __init__(self, websocket: WebSocket, manager: "ConnectionManager", max_queue: int):
+        self.websocket = websocket
+        self.manager = manager
+        self.topics: Set[str] = set()
+        self.queue: Deque[str] = deque(maxlen=max_queue)
+        self.dropped = 0
+        self.sent = 0
+        self.last_sent = time.monotonic()
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._send_loop())
+
+    def enqueue(self, text: str) -> None:
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+            self.manager.stats["dropped"] += 1
+        self.queue.append(text)
+        self._ready.set()
+
+    async def _send_loop(self) -> None:
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self.queue:
+                text = self.queue.popleft()
+                started = time.perf_counter()
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(text), self.manager.send_timeout)
+                except Exception:
+                    # Closed, broken or stuck past the timeout: drop the socket
+                    self.manager.stats["send_errors"] += 1
+                    self.manager.disconnect(self.websocket, dead=True)
+                    return
+                self.sent += 1
+                self.last_sent = time.monotonic()
+                self.manager.record_send(time.perf_counter() - started)
+
+    def stop(self) -> None:
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    """Topic pub/sub hub for websocket clients.
+
+    Clients subscribe to topics such as ``order:{id}``, ``driver:{id}``,
+    ``city:{name}`` or ``admin`` and only receive messages published to
+    them. A message is serialized once and queued on every subscriber; each
+    connection sends from its own task, so fan-out is concurrent and one slow
+    socket never delays another. Sockets whose sends fail or time out are
+    closed and unsubscribed. ``publish`` is safe to call from worker threads.
+    """
 
-    async def connect(self, websocket: WebSocket):
+    def __init__(self, max_queue: int = 100, send_timeout: float = 5.0, heartbeat: float = 25.0,
+                 latency_samples: int = 1000):
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.heartbeat = heartbeat
+        self.connections: Dict[WebSocket, Connection] = {}
+        self.topics: Dict[str, Set[Connection]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._latencies: Deque[float] = deque(maxlen=latency_samples)
+        self.stats = {"connected": 0, "disconnected": 0, "dead_removed": 0, "published": 0,
+                      "delivered": 0, "bytes_queued": 0, "dropped": 0, "send_errors": 0}
+
+    async def connect(self, websocket: WebSocket, topics: Iterable[str] = ()) -> Connection:
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self._loop = asyncio.get_running_loop()
+        connection = Connection(websocket, self, self.max_queue)
+        self.connections[websocket] = connection
+        self.subscribe(websocket, topics)
+        connection.start()
+        self.stats["connected"] += 1
+        return connection
+
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str]) -> None:
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return
+        for topic in topics:
+            connection.topics.add(topic)
+            self.topics.setdefault(topic, set()).add(connection)
+
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]) -> None:
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            self._unsubscribe(connection, topics)
+
+    def _unsubscribe(self, connection: Connection, topics: Iterable[str]) -> None:
+        for topic in topics:
+            connection.topics.discard(topic)
+            subscribers = self.topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(connection)
+                if not subscribers:
+                    del self.topics[topic]
+
+    def disconnect(self, websocket: WebSocket, dead: bool = False) -> None:
+        connection = self.connections.pop(websocket, None)
+        if connection is None:
+            return
+        self._unsubscribe(connection, list(connection.topics))
+        connection.stop()
+        self.stats["disconnected"] += 1
+        if dead:
+            self.stats["dead_removed"] += 1
+            asyncio.ensure_future(self._close(websocket))
+
+    async def listen(self, websocket: WebSocket, on_message: Optional[Callable[[dict], None]] = None) -> None:
+        """Receive client messages until the socket closes, then disconnect it.
+
+        A heartbeat is queued whenever nothing has been sent for ``heartbeat``
+        seconds, so idle sockets stay open without any polling in between.
+        """
+        try:
+            while websocket in self.connections:
+                try:
+                    frame = await asyncio.wait_for(websocket.receive(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    connection = self.connections.get(websocket)
+                    if connection and time.monotonic() - connection.last_sent >= self.heartbeat:
+                        connection.enqueue(json.dumps({"type": "heartbeat", "timestamp": datetime.now().isoformat()}))
+                    continue
+                if frame["type"] == "websocket.disconnect":
+                    break
+                try:
+                    message = json.loads(frame["text"]) if frame.get("text") is not None else None
+                except ValueError:
+                    message = None
+                if not isinstance(message, dict):
+                    self.send(websocket, {"type": "error", "error": "Expected a JSON object in a text frame"})
+                    continue
+                if on_message:
+                    on_message(message)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            self.disconnect(websocket)
+
+    async def _close(self, websocket: WebSocket) -> None:
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+    def publish(self, message: dict, topics: Optional[Iterable[str]] = None) -> None:
+        """Queue a message for the subscribers of ``topics`` (derived from the message when omitted)"""
+        if self._loop is None or not self.connections:
+            return
+        topics = list(topics) if topics is not None else topics_for(message)
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._publish(message, topics)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._publish, message, topics)
+
+    def send(self, websocket: WebSocket, message: dict) -> None:
+        """Queue a message for one connection only (e.g. its initial snapshot)"""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.enqueue(json.dumps(message, default=str))
+
+    def call_soon(self, callback: Callable, *args) -> bool:
+        """Run callback on the hub's event loop from any thread; False while no client is connected"""
+        if self._loop is None or not self.connections or self._loop.is_closed():
+            return False
+        self._loop.call_soon_threadsafe(callback, *args)
+        return True
+
+    def _publish(self, message: dict, topics: List[str]) -> None:
+        recipients = set()
+        for topic in topics:
+            recipients |= self.topics.get(topic, set())
+        self.stats["published"] += 1
+        if not recipients:
+            return
+        text = json.dumps(message, default=str)
+        for connection in recipients:
+            connection.enqueue(text)
+        self.stats["delivered"] += len(recipients)
+        self.stats["bytes_queued"] += len(text) * len(recipients)
+
+    async def broadcast(self, message: dict, topics: Optional[Iterable[str]] = None):
+        """Publish to the message's topics; kept awaitable for existing callers"""
+        self.publish(message, topics)
+
+    def record_send(self, seconds: float) -> None:
+        self._latencies.append(seconds)
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+    def get_stats(self) -> dict:
+        depths = [len(connection.queue) for connection in self.connections.values()]
+        latencies = sorted(self._latencies)
+        pick = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2)
+        by_kind: Dict[str, int] = {}
+        for topic, subscribers in self.topics.items():
+            kind = topic.split(":", 1)[0]
+            by_kind[kind] = by_kind.get(kind, 0) + len(subscribers)
+        return {
+            **self.stats,
+            "connections": len(self.connections),
+            "topics": len(self.topics),
+            "subscriptions": by_kind,
+            "queue_depth": {
+                "max": max(depths, default=0),
+                "avg": round(sum(depths) / len(depths), 2) if depths else 0,
+                "limit": self.max_queue
+            },
+            "send_latency_ms": {"p50": pick(0.5), "p95": pick(0.95), "max": pick(1.0)} if latencies else None
+        }
 
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                pass
 
-manager = ConnectionManager()
+manager = ConnectionManager(max_queue=settings.WS_QUEUE_SIZE, send_timeout=settings.WS_SEND_TIMEOUT_SECONDS,
+                            heartbeat=settings.WS_HEARTBEAT_SECONDS)
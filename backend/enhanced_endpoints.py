@@ -52,7 +52,7 @@ def get_live_map_data():
 @app.post("/api/admin/driver/{driver_id}/suspend")
 def suspend_driver(driver_id: str, suspension_data: dict):
     """Suspend/activate driver"""
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    driver = drivers_db.get(driver_id)
     if not driver:
         return {"error": "Driver not found"}
     
@@ -65,37 +65,19 @@ def suspend_driver(driver_id: str, suspension_data: dict):
 @app.get("/api/admin/analytics/advanced")
 def get_advanced_analytics():
     """Comprehensive analytics dashboard"""
-    # Revenue analytics
-    total_revenue = sum([o.get("total_cost", 0) for o in orders_db if o["status"] == "delivered"])
-    today_revenue = sum([o.get("total_cost", 0) for o in orders_db 
-                        if o["status"] == "delivered" and 
-                        datetime.fromisoformat(o["created_at"]).date() == datetime.now().date()])
+    # Revenue analytics (maintained incrementally, see core.aggregates)
+    total_revenue = order_stats.get("revenue")
+    today_revenue = order_stats.get("revenue_by_day", datetime.now().date().isoformat())
     
     # Driver performance
     driver_performance = []
     for driver in drivers_db:
-        driver_orders = [o for o in orders_db if o.get("assigned_driver") == driver["id"]]
-        completed_orders = [o for o in driver_orders if o["status"] == "delivered"]
-        
-        avg_delivery_time = 0
-        if completed_orders:
-            delivery_times = []
-            for order in completed_orders:
-                if order.get("delivered_at") and order.get("created_at"):
-                    start = datetime.fromisoformat(order["created_at"])
-                    end = datetime.fromisoformat(order["delivered_at"])
-                    delivery_times.append((end - start).total_seconds() / 60)  # minutes
-            avg_delivery_time = sum(delivery_times) / len(delivery_times) if delivery_times else 0
-        
+        stats = order_stats.driver_stats(driver["id"])
         driver_performance.append({
             "driver_id": driver["id"],
             "name": driver["name"],
-            "total_orders": len(driver_orders),
-            "completed_orders": len(completed_orders),
-            "success_rate": (len(completed_orders) / len(driver_orders) * 100) if driver_orders else 0,
-            "avg_delivery_time": round(avg_delivery_time, 2),
-            "rating": driver["rating"],
-            "earnings": sum([o.get("total_cost", 0) * 0.15 for o in completed_orders])  # 15% commission
+            **stats,
+            "rating": driver["rating"]
         })
     
     return {
@@ -107,9 +89,9 @@ def get_advanced_analytics():
         "driver_performance": driver_performance,
         "fleet_status": {
             "total_drivers": len(drivers_db),
-            "online_drivers": len([d for d in drivers_db if d["status"] == "online"]),
-            "busy_drivers": len([d for d in drivers_db if d["status"] == "busy"]),
-            "offline_drivers": len([d for d in drivers_db if d["status"] == "offline"])
+            "online_drivers": drivers_db.count("status", "online"),
+            "busy_drivers": drivers_db.count("status", "busy"),
+            "offline_drivers": drivers_db.count("status", "offline")
         }
     }
 
@@ -120,7 +102,7 @@ def update_driver_status(status_data: dict):
     driver_id = status_data.get("driver_id")
     status = status_data.get("status")
     
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    driver = drivers_db.get(driver_id)
     if not driver:
         return {"error": "Driver not found"}
     
@@ -135,11 +117,11 @@ def update_driver_status(status_data: dict):
 @app.get("/api/driver/{driver_id}/earnings")
 def get_driver_earnings(driver_id: str):
     """Get driver earnings breakdown"""
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    driver = drivers_db.get(driver_id)
     if not driver:
         return {"error": "Driver not found"}
     
-    driver_orders = [o for o in orders_db if o.get("assigned_driver") == driver_id and o["status"] == "delivered"]
+    driver_orders = [o for o in orders_db.find("assigned_driver", driver_id) if o["status"] == "delivered"]
     
     # Calculate earnings (15% commission)
     total_earnings = sum([o.get("total_cost", 0) * 0.15 for o in driver_orders])
@@ -166,7 +148,7 @@ def submit_proof_of_delivery(proof_data: dict):
     order_id = proof_data.get("order_id")
     driver_id = proof_data.get("driver_id")
     
-    order = next((o for o in orders_db if o["id"] == order_id), None)
+    order = orders_db.get(order_id)
     if not order:
         return {"error": "Order not found"}
     
@@ -189,9 +171,8 @@ def submit_proof_of_delivery(proof_data: dict):
     order["proof_of_delivery"] = delivery_proof["id"]
     
     # Update driver
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
-    if driver and order_id in driver["current_orders"]:
-        driver["current_orders"].remove(order_id)
+    driver = drivers_db.get(driver_id)
+    if driver and driver_load.detach(driver, order_id):
         driver["total_deliveries"] += 1
         if not driver["current_orders"]:
             driver["status"] = "online"
@@ -214,7 +195,7 @@ def rate_driver(rating_data: dict):
     customer_ratings_db.append(rating_record)
     
     # Update driver's average rating
-    driver = next((d for d in drivers_db if d["id"] == rating_data.get("driver_id")), None)
+    driver = drivers_db.get(rating_data.get("driver_id"))
     if driver:
         driver_ratings = [r["rating"] for r in customer_ratings_db if r["driver_id"] == rating_data.get("driver_id")]
         driver["rating"] = sum(driver_ratings) / len(driver_ratings)
@@ -274,7 +255,7 @@ def get_emergency_alerts():
 def process_payment(payment_data: dict):
     """Process payment for order"""
     order_id = payment_data.get("order_id")
-    order = next((o for o in orders_db if o["id"] == order_id), None)
+    order = orders_db.get(order_id)
     if not order:
         return {"error": "Order not found"}
     
@@ -1,13 +1,20 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
-import json
 import asyncio
+import numpy as np
 from datetime import datetime, timedelta
 from api.routes.gps_routes import router as gps_router
 from api.routes.driver_management import router as driver_router
 from api.services.agent_integration import AgentIntegrationService
+from core.store import orders_db, drivers_db
+from core.aggregates import order_stats, driver_stats
+from core.geo import haversine
+from api.services.fleet_snapshot import FleetSnapshot, ultimate_scores
+from core.driver_load import driver_load
+from core.fleet_rules import get_city_coordinates, get_max_orders_for_vehicle, get_enhanced_vehicle_score
+from core.spatial import driver_locations, CITY_RADIUS_KM, MAX_CANDIDATES
 
 app = FastAPI(title="Enhanced Multi-Agent Delivery System")
 
@@ -35,6 +42,146 @@ app.include_router(enhanced_routing_router, prefix="/api", tags=["Enhanced Routi
 from api.routes.assignment_debug import router as debug_router
 app.include_router(debug_router, prefix="/api", tags=["Debug"])
 
+# Batch dispatch
+from api.routes.dispatch import router as dispatch_router
+from api.services.dispatch import dispatch_engine
+from core.config import settings
+app.include_router(dispatch_router, prefix="/api", tags=["Dispatch"])
+
+@app.on_event("startup")
+async def start_batch_dispatch():
+    if settings.BATCH_DISPATCH_ENABLED:
+        dispatch_engine.start()
+        print(f"🚚 Batch dispatch running every {dispatch_engine.window_seconds}s")
+
+@app.on_event("shutdown")
+async def stop_batch_dispatch():
+    await dispatch_engine.stop()
+
+# Shared weather cache, kept warm for every served city
+from api.services.weather import weather_provider
+
+@app.on_event("startup")
+async def start_weather_prefetch():
+    weather_provider.watch(get_city_coordinates(city) for city in
+                           ["Casablanca", "Rabat", "Marrakech", "Agadir", "El Jadida", "Salé"])
+    weather_provider.start()
+
+@app.on_event("shutdown")
+async def stop_weather_prefetch():
+    await weather_provider.stop()
+
+@app.get("/api/weather-cache/stats")
+def get_weather_cache_stats():
+    """Hit rate and refresh activity of the shared weather cache"""
+    return weather_provider.get_stats()
+
+# Route cache survives restarts through a local file
+from api.services.route_cache import route_cache
+
+@app.on_event("startup")
+async def load_route_cache():
+    loaded = route_cache.load()
+    if loaded:
+        print(f"🗺️ Restored {loaded} cached routes")
+
+@app.on_event("shutdown")
+async def save_route_cache():
+    try:
+        route_cache.save()
+    except OSError as e:
+        print(f"⚠️ Could not save route cache: {e}")
+
+# Per-driver route plans, updated incrementally and re-solved in the background once they drift
+from api.services.route_plan import route_plans
+
+@app.on_event("startup")
+async def start_route_plan_reoptimizer():
+    route_plans.start()
+
+@app.on_event("shutdown")
+async def stop_route_plan_reoptimizer():
+    await route_plans.stop()
+
+@app.get("/api/route-plans/stats")
+def get_route_plan_stats():
+    """Incremental edits, drift and background re-optimization of driver route plans"""
+    return route_plans.get_stats()
+
+# Driver dashboard and route responses are cached per route version and carry ETags
+from api.services.driver_route_cache import driver_route_cache
+
+@app.get("/api/driver-route-cache/stats")
+def get_driver_route_cache_stats():
+    """Hit rate, 304s and invalidations of cached driver route responses"""
+    return driver_route_cache.get_stats()
+
+# Road distance/duration matrices; pairs missing from the cache are fetched on the app loop
+from api.services.travel_matrix import travel_matrix
+
+@app.on_event("startup")
+async def bind_travel_matrix():
+    travel_matrix.bind(asyncio.get_running_loop())
+
+@app.get("/api/travel-matrix/stats")
+def get_travel_matrix_stats():
+    """Cached cells, hit rate, OSRM table requests and estimated cells of the travel matrix service"""
+    return travel_matrix.get_stats()
+
+# Worker processes for fleet-wide route optimization
+from api.services.fleet_vrp import fleet_optimizer
+
+@app.on_event("shutdown")
+async def stop_fleet_optimizer():
+    fleet_optimizer.shutdown()
+
+# Long route searches run in their own processes; stop them with the app
+from api.services.anytime_optimizer import anytime_optimizer
+
+@app.on_event("shutdown")
+async def cancel_anytime_searches():
+    anytime_optimizer.cancel_all()
+
+# Offline road graph for routing while every remote router is down (memory-mapped, so loading is quick)
+from api.services.road_graph import road_graph
+
+@app.on_event("startup")
+async def load_road_graph():
+    if road_graph.load():
+        print(f"🛣️ Road graph loaded: {road_graph.meta['nodes']} nodes, {road_graph.meta['edges']} edges")
+
+@app.get("/api/road-graph/stats")
+def get_road_graph_stats():
+    """Graph size and offline routing query counts, latency and failures"""
+    return road_graph.get_stats()
+
+# Topic pub/sub hub for websocket clients (order:{id}, driver:{id}, city:{name}, admin)
+from core.websocket import manager as ws_manager
+from core.live_updates import live_updates
+from api.services.location_ingest import location_ingest
+
+@app.get("/api/websocket/stats")
+def get_websocket_stats():
+    """Connections, subscriptions, dropped messages, queue depth and send latency of the websocket hub"""
+    return {**ws_manager.get_stats(), "live_updates": live_updates.stats}
+
+@app.get("/api/location-ingest/stats")
+def get_location_ingest_stats():
+    """GPS fixes applied, binary frames received and stale or malformed input"""
+    return location_ingest.get_stats()
+
+# Shared outbound HTTP pool (closed after the background tasks above have stopped)
+from core.http import http_client
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await http_client.aclose()
+
+@app.get("/api/http-client/stats")
+def get_http_client_stats():
+    """Per-host request, error, timeout and in-flight counts of the shared HTTP pool"""
+    return http_client.get_stats()
+
 class LoginRequest(BaseModel):
     username: str
     password: str
@@ -116,12 +263,12 @@ def root():
         "version": "3.0 ULTIMATE",
         "total_drivers": len(drivers_db),
         "city_coverage": {
-            "Casablanca": f"{len([d for d in drivers_db if d['assigned_city'] == 'Casablanca'])} drivers",
-            "Rabat": f"{len([d for d in drivers_db if d['assigned_city'] == 'Rabat'])} drivers", 
-            "Marrakech": f"{len([d for d in drivers_db if d['assigned_city'] == 'Marrakech'])} drivers",
-            "Agadir": f"{len([d for d in drivers_db if d['assigned_city'] == 'Agadir'])} drivers",
-            "El Jadida": f"{len([d for d in drivers_db if d['assigned_city'] == 'El Jadida'])} drivers",
-            "Salé": f"{len([d for d in drivers_db if d['assigned_city'] == 'Salé'])} drivers"
+            "Casablanca": f"{drivers_db.count('assigned_city', 'Casablanca')} drivers",
+            "Rabat": f"{drivers_db.count('assigned_city', 'Rabat')} drivers", 
+            "Marrakech": f"{drivers_db.count('assigned_city', 'Marrakech')} drivers",
+            "Agadir": f"{drivers_db.count('assigned_city', 'Agadir')} drivers",
+            "El Jadida": f"{drivers_db.count('assigned_city', 'El Jadida')} drivers",
+            "Salé": f"{drivers_db.count('assigned_city', 'Salé')} drivers"
         },
         "ultimate_features": [
             "🎯 Multi-driver city coverage (16 total drivers)",
@@ -192,41 +339,21 @@ class DriverLoginRequest(BaseModel):
 
 @app.post("/api/driver/login")
 def driver_login(request: DriverLoginRequest):
-    # Direct credential mapping
-    valid_emails = {
-        "ahmed@delivery.ma": "DRV001",
-        "youssef@delivery.ma": "DRV002", 
-        "fatima@delivery.ma": "DRV003",
-        "karim@delivery.ma": "DRV004",
-        "laila@delivery.ma": "DRV005",
-        "omar@delivery.ma": "DRV006",
-        "nadia@delivery.ma": "DRV007",
-        "hassan@delivery.ma": "DRV008",
-        "aicha@delivery.ma": "DRV009",
-        "rachid@delivery.ma": "DRV010",
-        "khadija@delivery.ma": "DRV011",
-        "mehdi@delivery.ma": "DRV012",
-        "zineb@delivery.ma": "DRV013",
-        "samir@delivery.ma": "DRV014",
-        "amina@delivery.ma": "DRV015",
-        "khalid@delivery.ma": "DRV016",
-        "driver@example.com": "DRV001"
-    }
+    # Demo alias kept for the test scripts; real drivers resolve via the email index
+    demo_aliases = {"driver@example.com": "DRV001"}
     
-    driver_id = valid_emails.get(request.email.lower())
-    if driver_id and request.password in ["driver123", "123"]:
-        driver = next((d for d in drivers_db if d["id"] == driver_id), None)
-        if driver:
-            return {
-                "access_token": f"driver-token-{driver_id}",
-                "token_type": "bearer",
-                "driver": driver
-            }
+    driver = drivers_db.find_one("email", request.email) or drivers_db.get(demo_aliases.get(request.email.lower()))
+    if driver and request.password in ["driver123", "123"]:
+        return {
+            "access_token": f"driver-token-{driver['id']}",
+            "token_type": "bearer",
+            "driver": driver
+        }
     
     return {"detail": "Invalid credentials. Use driver email with password 'driver123'"}
 
 # Enhanced data storage with test orders
-orders_db = [
+seed_orders = [
     {
         "id": "ORD1001",
         "tracking_number": "TRK001",
@@ -454,8 +581,10 @@ orders_db = [
         "transport_schedule": {"next_departure": "07:00", "duration": "6 hours", "vehicle": "truck"}
     }
 ]
+if not orders_db:  # main can be imported twice (e.g. run as a script); seed the shared store once
+    orders_db.load(seed_orders)
 # ULTIMATE FINAL VERSION - Multiple drivers per city with intelligent assignment
-drivers_db = [
+seed_drivers = [
     # CASABLANCA DRIVERS (4 drivers)
     {
         "id": "DRV001",
@@ -724,6 +853,8 @@ drivers_db = [
         "specialties": ["express_delivery", "documents"]
     }
 ]
+if not drivers_db:
+    drivers_db.load(seed_drivers)
 
 warehouses_db = {
     "Casablanca": {"lat": 33.5731, "lng": -7.5898, "capacity": 1000, "current_load": 45},
@@ -821,7 +952,12 @@ async def create_order(order: OrderCreate):
         "assignment_attempts": 0
     }
     
-    orders_db.append(new_order)
+    new_order = orders_db.insert(new_order)
+    
+    # Batch mode: leave the order pending for the next dispatch window
+    if settings.BATCH_DISPATCH_ENABLED:
+        dispatch_engine.submit(order_id)
+        return new_order
     
     # Smart driver assignment with AI agents
     agent_service = AgentIntegrationService()
@@ -840,24 +976,19 @@ async def create_order(order: OrderCreate):
     
     print(f"🤖 Agent processing result: {agent_result['status']} (agents used: {agent_result.get('agents_used', False)})")
     
-    # Get available drivers in the pickup city with enhanced city matching
-    city_drivers = [d for d in drivers_db if 
-                   d.get("status") in ["available", "online"] and 
-                   d.get("assigned_city", d.get("current_location", {}).get("city", "")).lower() == order.pickup_city.lower()]
+    # Get available drivers in the pickup city, nearest first
+    pickup_coords = get_city_coordinates(order.pickup_city)
+    city_drivers = [d for d, _ in driver_locations.nearest(
+        pickup_coords["lat"], pickup_coords["lng"], k=MAX_CANDIDATES, max_distance_km=CITY_RADIUS_KM,
+        statuses=["available", "online"],
+        predicate=lambda d: d.get("assigned_city", "").lower() == order.pickup_city.lower()
+    )]
     
-    # If no drivers in same city, get nearby drivers
+    # If no drivers in same city, get the 3 nearest available drivers
     if not city_drivers:
-        available_drivers = [d for d in drivers_db if d.get("status") in ["available", "online"]]
-        # Sort by distance to pickup city
-        for driver in available_drivers:
-            driver_city = driver.get("assigned_city", driver.get("current_location", {}).get("city", "Casablanca"))
-            driver_coords = get_city_coordinates(driver_city)
-            pickup_coords = get_city_coordinates(order.pickup_city)
-            driver["_temp_distance"] = calculate_gps_distance(
-                driver_coords["lat"], driver_coords["lng"],
-                pickup_coords["lat"], pickup_coords["lng"]
-            )
-        city_drivers = sorted(available_drivers, key=lambda d: d.get("_temp_distance", 999))[:3]
+        city_drivers = [d for d, _ in driver_locations.nearest(
+            pickup_coords["lat"], pickup_coords["lng"], k=3, statuses=["available", "online"]
+        )]
     
     best_driver_result = await agent_service.assign_driver_with_agents(new_order, city_drivers)
     
@@ -874,20 +1005,20 @@ async def create_order(order: OrderCreate):
         fallback_driver = None
         
         # First try: Same city drivers
-        same_city_drivers = [d for d in drivers_db if 
-                           d.get("status") in ["available", "online"] and
-                           d.get("assigned_city", d.get("current_location", {}).get("city", "")).lower() == order.pickup_city.lower()]
+        same_city_drivers = [d for d in drivers_db.find("assigned_city", order.pickup_city) if 
+                           d.get("status") in ["available", "online"]]
         
         if same_city_drivers:
             fallback_driver = same_city_drivers[0]
         else:
             # Second try: Any available driver
-            fallback_driver = next((d for d in drivers_db if d.get("status") in ["available", "online"]), None)
+            available_drivers = drivers_db.find_in("status", ["available", "online"])
+            fallback_driver = available_drivers[0] if available_drivers else None
         
         if fallback_driver:
             new_order["assigned_driver"] = fallback_driver["id"]
             new_order["status"] = "assigned"
-            fallback_driver["current_orders"].append(order_id)
+            driver_load.attach(fallback_driver, order_id)
             fallback_driver["status"] = "busy"
     
     return new_order
@@ -900,8 +1031,8 @@ def driver_assignment_response(response_data: dict):
     accept = response_data.get("accept")
     reason = response_data.get("reason", "")
     
-    order = next((o for o in orders_db if o["id"] == order_id), None)
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    order = orders_db.get(order_id)
+    driver = drivers_db.get(driver_id)
     
     if not order or not driver:
         return {"error": "Order or driver not found"}
@@ -921,12 +1052,18 @@ def driver_assignment_response(response_data: dict):
     if accept:
         order["status"] = "accepted"
         order["accepted_at"] = datetime.now().isoformat()
-        if order_id not in driver["current_orders"]:
-            driver["current_orders"].append(order_id)
+        driver_load.attach(driver, order_id)
         driver["status"] = "busy"
         
         return {"success": True, "message": "Assignment accepted"}
     else:
+        # Batch mode: hand the order back to the dispatcher, which skips rejecting drivers
+        if settings.BATCH_DISPATCH_ENABLED:
+            order["status"] = "pending_assignment"
+            order["assigned_driver"] = None
+            dispatch_engine.submit(order_id)
+            return {"success": True, "message": "Queued for next dispatch window"}
+        
         # Find next best driver
         rejected_drivers = [h['driver_id'] for h in order['assignment_history'] if not h['accepted']]
         next_driver = assign_best_driver(order, rejected_drivers)
@@ -948,16 +1085,17 @@ def update_driver_gps(gps_data: dict):
     latitude = gps_data.get("latitude")
     longitude = gps_data.get("longitude")
     
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    driver = drivers_db.get(driver_id)
     if driver:
         driver["current_location"].update({
             "lat": latitude,
             "lng": longitude,
             "last_update": datetime.now().isoformat()
         })
+        drivers_db.touch(driver, "current_location")
     
     if order_id:
-        order = next((o for o in orders_db if o["id"] == order_id), None)
+        order = orders_db.get(order_id)
         if order:
             order["current_location"] = {
                 "lat": latitude,
@@ -978,7 +1116,7 @@ def update_driver_gps(gps_data: dict):
 @app.post("/api/driver/delivery/start/{order_id}")
 def start_delivery_route(order_id: str, driver_data: dict):
     driver_id = driver_data.get("driver_id")
-    order = next((o for o in orders_db if o["id"] == order_id), None)
+    order = orders_db.get(order_id)
     
     if order:
         order["status"] = "in_transit"
@@ -993,16 +1131,15 @@ def complete_delivery_final(completion_data: dict):
     driver_id = completion_data.get("driver_id")
     notes = completion_data.get("notes", "")
     
-    order = next((o for o in orders_db if o["id"] == order_id), None)
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    order = orders_db.get(order_id)
+    driver = drivers_db.get(driver_id)
     
     if order and driver:
         order["status"] = "delivered"
         order["delivered_at"] = datetime.now().isoformat()
         order["completion_notes"] = notes
         
-        if order_id in driver["current_orders"]:
-            driver["current_orders"].remove(order_id)
+        if driver_load.detach(driver, order_id):
             driver["total_deliveries"] += 1
             
         if not driver["current_orders"]:
@@ -1030,31 +1167,29 @@ def get_all_orders():
 
 @app.get("/api/admin/drivers")
 def get_all_drivers():
-    return {"drivers": drivers_db, "total": len(drivers_db)}
+    return {"drivers": drivers_db.all(), "total": len(drivers_db)}
 
 @app.get("/api/admin/analytics")
 def get_admin_analytics():
+    # Counters are maintained incrementally on every order change (core.aggregates)
     total_orders = len(orders_db)
-    pending_orders = len([o for o in orders_db if o["status"] in ["pending_assignment", "pending_acceptance"]])
-    in_progress = len([o for o in orders_db if o["status"] in ["picked_up", "in_transit", "assigned", "accepted"]])
-    completed = len([o for o in orders_db if o["status"] == "delivered"])
-    active_drivers = len([d for d in drivers_db if d["status"] in ["available", "busy"]])
+    pending_orders = order_stats.count_status(["pending_assignment", "pending_acceptance"])
+    in_progress = order_stats.count_status(["picked_up", "in_transit", "assigned", "accepted"])
+    completed = order_stats.count_status(["delivered"])
+    active_drivers = drivers_db.count_in("status", ["available", "busy"])
     
-    # Calculate revenue from both total_cost and price fields
-    revenue = 0
-    for order in orders_db:
-        if order["status"] == "delivered":
-            revenue += order.get("total_cost", order.get("price", 0))
+    # Revenue from both total_cost and price fields
+    revenue = order_stats.get("revenue")
     
     # Additional analytics
-    intra_city_orders = len([o for o in orders_db if not o.get("is_inter_city", False)])
-    inter_city_orders = len([o for o in orders_db if o.get("is_inter_city", False)])
-    express_orders = len([o for o in orders_db if o.get("service_type") == "express"])
-    standard_orders = len([o for o in orders_db if o.get("service_type") == "standard"])
+    intra_city_orders = int(order_stats.get("inter_city", False))
+    inter_city_orders = int(order_stats.get("inter_city", True))
+    express_orders = int(order_stats.get("service_type", "express"))
+    standard_orders = int(order_stats.get("service_type", "standard"))
     
     # Driver performance
-    top_driver = max(drivers_db, key=lambda d: d.get("total_deliveries", 0)) if drivers_db else None
-    avg_rating = sum([d.get("rating", 0) for d in drivers_db]) / len(drivers_db) if drivers_db else 0
+    top_driver = driver_stats.top_driver
+    avg_rating = driver_stats.average_rating
     
     return {
         "total_orders": total_orders,
@@ -1072,6 +1207,29 @@ def get_admin_analytics():
         "delivery_success_rate": round((completed / total_orders * 100), 1) if total_orders > 0 else 0
     }
 
+@app.get("/api/admin/analytics/consistency")
+def check_analytics_consistency(repair: bool = False):
+    """Verify the maintained analytics against a full recomputation"""
+    orders_check = order_stats.check_consistency()
+    drivers_check = driver_stats.check_consistency()
+    load_check = driver_load.check_consistency()
+    consistent = orders_check["consistent"] and drivers_check["consistent"] and load_check["consistent"]
+    
+    if repair and not consistent:
+        order_stats.rebuild()
+        driver_stats.rebuild()
+        for driver in drivers_db:
+            driver_load.recompute(driver)
+    
+    return {
+        "consistent": consistent,
+        "orders": orders_check,
+        "drivers": drivers_check,
+        "driver_load": load_check,
+        "repaired": repair and not consistent,
+        "checked_at": datetime.now().isoformat()
+    }
+
 def calculate_inter_city_distance(city1: str, city2: str) -> float:
     """Calculate approximate distance between Moroccan cities in km"""
     distances = {
@@ -1096,47 +1254,33 @@ def assign_best_driver(order: dict, excluded_drivers: list = []) -> dict:
     """ULTIMATE ASSIGNMENT: Multi-factor intelligent driver selection"""
     pickup_coords = get_city_coordinates(order["pickup_city"])
     
-    # Enhanced driver selection with city matching and better logic
-    city_drivers = [d for d in drivers_db if 
-                   d["id"] not in excluded_drivers and
-                   d["status"] in ["available", "busy"] and 
-                   d["assigned_city"].lower() == order["pickup_city"].lower() and
-                   len(d["current_orders"]) < get_max_orders_for_vehicle(d["vehicle_type"]) and
-                   sum([get_order_weight(oid) for oid in d["current_orders"]]) + order["weight"] <= d["vehicle_capacity"]]
+    pickup_city = order["pickup_city"].lower()
+    
+    # Enhanced driver selection: nearest same-city drivers from the spatial index
+    city_drivers = [d for d, _ in driver_locations.nearest(
+        pickup_coords["lat"], pickup_coords["lng"], k=MAX_CANDIDATES, max_distance_km=CITY_RADIUS_KM,
+        statuses=["available", "busy"],
+        predicate=lambda d: d["id"] not in excluded_drivers and
+                            d["assigned_city"].lower() == pickup_city and
+                            len(d["current_orders"]) < get_max_orders_for_vehicle(d["vehicle_type"]) and
+                            driver_load.fits(d, order["weight"])
+    )]
     
     if not city_drivers:
-        # Fallback: Get drivers from nearby cities with distance penalty
-        all_drivers = [d for d in drivers_db if 
-                      d["id"] not in excluded_drivers and
-                      d["status"] in ["available", "busy"] and
-                      len(d["current_orders"]) < get_max_orders_for_vehicle(d["vehicle_type"])]
-        
-        # Calculate distance and sort by proximity
-        for driver in all_drivers:
-            driver_coords = get_city_coordinates(driver["assigned_city"])
-            driver["_temp_distance"] = calculate_gps_distance(
-                driver_coords["lat"], driver_coords["lng"],
-                pickup_coords["lat"], pickup_coords["lng"]
-            )
-        
-        # Only consider drivers within 100km for realistic assignment
-        city_drivers = [d for d in all_drivers if d.get("_temp_distance", 999) <= 100]
-        city_drivers = sorted(city_drivers, key=lambda d: d.get("_temp_distance", 999))[:3]
+        # Fallback: 3 closest drivers from nearby cities, only within 100km for realistic assignment
+        city_drivers = [d for d, _ in driver_locations.nearest(
+            pickup_coords["lat"], pickup_coords["lng"], k=3, max_distance_km=100,
+            statuses=["available", "busy"],
+            predicate=lambda d: d["id"] not in excluded_drivers and
+                                len(d["current_orders"]) < get_max_orders_for_vehicle(d["vehicle_type"])
+        )]
     
     if not city_drivers:
         return None
     
-    # INTELLIGENT SCORING: Multiple factors
-    best_driver = None
-    best_score = -1
-    
-    for driver in city_drivers:
-        score = calculate_ultimate_driver_score(driver, order, pickup_coords)
-        if score > best_score:
-            best_score = score
-            best_driver = driver
-    
-    return best_driver
+    # INTELLIGENT SCORING: Multiple factors, all candidates in one vectorized pass
+    scores = ultimate_scores(FleetSnapshot(city_drivers), order, pickup_coords)
+    return city_drivers[int(np.argmax(scores))]
 
 def calculate_ultimate_driver_score(driver: dict, order: dict, pickup_coords: dict) -> float:
     """ENHANCED SCORING: Realistic and logical assignment factors"""
@@ -1190,45 +1334,6 @@ def calculate_ultimate_driver_score(driver: dict, order: dict, pickup_coords: di
     
     return round(score, 2)
 
-def get_enhanced_vehicle_score(vehicle_type: str, order: dict) -> float:
-    """Realistic vehicle scoring based on actual delivery requirements"""
-    weight = order.get("weight", 1.0)
-    service_type = order.get("service_type", "standard")
-    is_fragile = order.get("fragile", False)
-    
-    # Realistic vehicle capabilities
-    vehicle_specs = {
-        "bike": {"max_weight": 15, "speed_factor": 1.2, "cost_efficiency": 1.0, "fragile_safe": 0.7},
-        "scooter": {"max_weight": 25, "speed_factor": 1.1, "cost_efficiency": 0.9, "fragile_safe": 0.8},
-        "car": {"max_weight": 80, "speed_factor": 1.0, "cost_efficiency": 0.7, "fragile_safe": 1.0},
-        "van": {"max_weight": 200, "speed_factor": 0.8, "cost_efficiency": 0.5, "fragile_safe": 1.0}
-    }
-    
-    specs = vehicle_specs.get(vehicle_type, vehicle_specs["bike"])
-    
-    # Base suitability check
-    if weight > specs["max_weight"]:
-        return 0  # Vehicle cannot handle the weight
-    
-    base_score = 10  # Base score for suitable vehicle
-    
-    # Express delivery bonus for faster vehicles
-    if service_type == "express":
-        base_score += specs["speed_factor"] * 5
-    
-    # Fragile item handling
-    if is_fragile:
-        base_score += specs["fragile_safe"] * 3
-    
-    # Weight efficiency (better score for appropriate vehicle size)
-    weight_ratio = weight / specs["max_weight"]
-    if 0.3 <= weight_ratio <= 0.8:  # Optimal load range
-        base_score += 3
-    elif weight_ratio < 0.3:  # Underutilized
-        base_score += 1
-    
-    return min(15, base_score)
-
 def calculate_enhanced_specialty_bonus(driver: dict, order: dict) -> float:
     """Realistic specialty matching with logical bonuses"""
     bonus = 0
@@ -1260,11 +1365,6 @@ def calculate_enhanced_specialty_bonus(driver: dict, order: dict) -> float:
     
     return min(5, bonus)
 
-def get_max_orders_for_vehicle(vehicle_type: str) -> int:
-    """Get maximum orders per vehicle type"""
-    limits = {"bike": 6, "scooter": 8, "car": 12, "van": 16}
-    return limits.get(vehicle_type, 6)
-
 def get_vehicle_suitability_score(vehicle_type: str, order: dict) -> float:
     """Score vehicle suitability for order"""
     weight = order["weight"]
@@ -1294,7 +1394,7 @@ def calculate_route_optimization_score(driver: dict, new_order: dict) -> float:
     pickup_coords = get_city_coordinates(new_order["pickup_city"])
     
     # Get average location of current orders
-    current_orders = [o for o in orders_db if o["id"] in driver["current_orders"]]
+    current_orders = [orders_db.get(oid) for oid in driver["current_orders"] if oid in orders_db]
     if not current_orders:
         return 100
     
@@ -1305,37 +1405,13 @@ def calculate_route_optimization_score(driver: dict, new_order: dict) -> float:
     
     return max(0, 100 - distance_to_route * 5)  # Closer to existing route is better
 
-def get_city_coordinates(city: str) -> dict:
-    """Get coordinates for Moroccan cities"""
-    coordinates = {
-        "casablanca": {"lat": 33.5731, "lng": -7.5898},
-        "rabat": {"lat": 34.0209, "lng": -6.8416},
-        "marrakech": {"lat": 31.6295, "lng": -7.9811},
-        "el jadida": {"lat": 33.2316, "lng": -8.5007},
-        "salé": {"lat": 34.0531, "lng": -6.7985},
-        "agadir": {"lat": 30.4278, "lng": -9.5981}
-    }
-    return coordinates.get(city.lower(), coordinates["casablanca"])
-
 def calculate_gps_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
     """Calculate distance between GPS coordinates in km"""
-    import math
-    
-    R = 6371  # Earth radius in km
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lng = math.radians(lng2 - lng1)
-    
-    a = (math.sin(delta_lat/2)**2 + 
-         math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lng/2)**2)
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    
-    return R * c
+    return haversine(lat1, lng1, lat2, lng2)
 
 def get_order_weight(order_id: str) -> float:
     """Get order weight by ID"""
-    order = next((o for o in orders_db if o["id"] == order_id), None)
+    order = orders_db.get(order_id)
     return order["weight"] if order else 0
 
 # Enhanced tracking and driver management endpoints
@@ -1369,7 +1445,7 @@ def get_drivers_by_city():
 @app.get("/api/drivers/city/{city_name}")
 def get_city_drivers(city_name: str):
     """Get all drivers assigned to a specific city"""
-    city_drivers = [d for d in drivers_db if d.get("assigned_city", "").lower() == city_name.lower()]
+    city_drivers = drivers_db.find("assigned_city", city_name)
     
     return {
         "city": city_name,
@@ -1404,7 +1480,7 @@ def simulate_assignment(pickup_city: str, weight: float = 2.0, service_type: str
     }
     
     # Get all drivers in the city
-    city_drivers = [d for d in drivers_db if d["assigned_city"].lower() == pickup_city.lower()]
+    city_drivers = drivers_db.find("assigned_city", pickup_city)
     
     # Score each driver
     pickup_coords = get_city_coordinates(pickup_city)
@@ -1488,7 +1564,7 @@ async def test_agents():
     
     # Get city coverage
     for city_name, city_coords in get_all_city_coordinates().items():
-        city_drivers = [d for d in drivers_db if d.get("assigned_city", "").lower() == city_name.lower()]
+        city_drivers = drivers_db.find("assigned_city", city_name)
         
         coverage["cities"].append({
             "name": city_name,
@@ -1526,11 +1602,11 @@ def get_all_city_coordinates() -> dict:
 
 @app.get("/api/drivers/{driver_id}/orders")
 def get_driver_orders(driver_id: str):
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    driver = drivers_db.get(driver_id)
     if not driver:
         return {"error": "Driver not found"}
     
-    driver_orders = [o for o in orders_db if o["assigned_driver"] == driver_id]
+    driver_orders = orders_db.find("assigned_driver", driver_id)
     return {
         "driver": driver,
         "orders": driver_orders,
@@ -1539,7 +1615,7 @@ def get_driver_orders(driver_id: str):
 
 @app.post("/api/orders/{order_id}/location")
 def update_order_location(order_id: str, location: LocationUpdate):
-    order = next((o for o in orders_db if o["id"] == order_id), None)
+    order = orders_db.get(order_id)
     if not order:
         return {"error": "Order not found"}
     
@@ -1563,7 +1639,7 @@ def update_order_location(order_id: str, location: LocationUpdate):
 
 @app.post("/api/orders/{order_id}/status")
 def update_delivery_status(order_id: str, update: DeliveryUpdate):
-    order = next((o for o in orders_db if o["id"] == order_id), None)
+    order = orders_db.get(order_id)
     if not order:
         return {"error": "Order not found"}
     
@@ -1574,22 +1650,21 @@ def update_delivery_status(order_id: str, update: DeliveryUpdate):
     
     # If delivered, free up driver
     if update.status == "delivered" and order["assigned_driver"]:
-        driver = next((d for d in drivers_db if d["id"] == order["assigned_driver"]), None)
-        if driver and order_id in driver["current_orders"]:
-            driver["current_orders"].remove(order_id)
+        driver = drivers_db.get(order["assigned_driver"])
+        if driver and driver_load.detach(driver, order_id):
             driver["total_deliveries"] += 1
     
     return {"message": "Status updated", "order": order}
 
 @app.get("/api/orders/{order_id}/track")
 def track_order(order_id: str):
-    order = next((o for o in orders_db if o["id"] == order_id), None)
+    order = orders_db.get(order_id)
     if not order:
         return {"error": "Order not found"}
     
     driver_info = None
     if order["assigned_driver"]:
-        driver_info = next((d for d in drivers_db if d["id"] == order["assigned_driver"]), None)
+        driver_info = drivers_db.get(order["assigned_driver"])
     
     # Get coordinates
     pickup_coords = get_city_coordinates(order["pickup_city"])
@@ -1626,13 +1701,13 @@ def track_order(order_id: str):
 
 @app.get("/api/orders/tracking/{tracking_number}")
 def track_order_by_tracking_number(tracking_number: str):
-    order = next((o for o in orders_db if o.get("tracking_number") == tracking_number), None)
+    order = orders_db.find_one("tracking_number", tracking_number)
     if not order:
         return {"error": "Order not found"}
     
     driver_info = None
     if order.get("assigned_driver"):
-        driver_info = next((d for d in drivers_db if d["id"] == order["assigned_driver"]), None)
+        driver_info = drivers_db.get(order["assigned_driver"])
     
     # Calculate distance and duration
     pickup_coords = get_city_coordinates(order["pickup_city"])
@@ -1821,7 +1896,7 @@ def create_inter_city_order(order: InterCityOrderCreate):
         "transport_schedule": get_next_transport_schedule(order.pickup_city, order.delivery_city)
     }
     
-    orders_db.append(new_order)
+    new_order = orders_db.insert(new_order)
     
     # Assign pickup driver if door pickup
     if order.pickup_option == "door_pickup":
@@ -1829,7 +1904,7 @@ def create_inter_city_order(order: InterCityOrderCreate):
         if pickup_driver:
             new_order["assigned_driver"] = pickup_driver["id"]
             new_order["status"] = "assigned_for_pickup"
-            pickup_driver["current_orders"].append(order_id)
+            driver_load.attach(pickup_driver, order_id)
     
     return new_order
 
@@ -1847,7 +1922,7 @@ def get_next_transport_schedule(pickup_city: str, delivery_city: str) -> dict:
 
 @app.get("/api/inter-city/track/{tracking_number}")
 def track_inter_city_order(tracking_number: str):
-    order = next((o for o in orders_db if o["tracking_number"] == tracking_number), None)
+    order = orders_db.find_one("tracking_number", tracking_number)
     if not order:
         return {"error": "Order not found"}
     
@@ -1870,7 +1945,7 @@ def track_inter_city_order(tracking_number: str):
 
 @app.post("/api/inter-city/warehouse-dropoff/{order_id}")
 def warehouse_dropoff(order_id: str, dropoff_data: dict):
-    order = next((o for o in orders_db if o["id"] == order_id), None)
+    order = orders_db.get(order_id)
     if not order:
         return {"error": "Order not found"}
     
@@ -1896,7 +1971,7 @@ def warehouse_dropoff(order_id: str, dropoff_data: dict):
 
 @app.post("/api/inter-city/process-warehouse/{order_id}")
 def process_warehouse_package(order_id: str):
-    order = next((o for o in orders_db if o["id"] == order_id), None)
+    order = orders_db.get(order_id)
     if not order:
         return {"error": "Order not found"}
     
@@ -1958,39 +2033,19 @@ def get_user_notifications(user_id: str):
 # Enhanced GPS tracking and assignment
 @app.post("/api/driver/{driver_id}/location")
 def update_driver_location(driver_id: str, location: DriverLocationUpdate):
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    driver = drivers_db.get(driver_id)
     if not driver:
         return {"error": "Driver not found"}
     
-    # Update driver location
-    driver["current_location"].update({
+    # Update driver location and all assigned orders (same pipeline as the binary GPS websocket)
+    location_ingest.apply(driver, [{
         "lat": location.latitude,
         "lng": location.longitude,
         "accuracy": location.accuracy,
         "speed": location.speed,
         "heading": location.heading,
-        "last_update": datetime.now().isoformat()
-    })
-    
-    # Update all assigned orders with driver's location
-    for order_id in driver["current_orders"]:
-        order = next((o for o in orders_db if o["id"] == order_id), None)
-        if order:
-            order["current_location"] = {
-                "lat": location.latitude,
-                "lng": location.longitude,
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            # Add to route history
-            if "route_history" not in order:
-                order["route_history"] = []
-            order["route_history"].append({
-                "lat": location.latitude,
-                "lng": location.longitude,
-                "timestamp": datetime.now().isoformat(),
-                "speed": location.speed
-            })
+        "timestamp": datetime.now().timestamp()
+    }])
     
     # Check for automatic delivery detection
     auto_deliveries = check_automatic_delivery_detection(driver_id, location)
@@ -2003,11 +2058,11 @@ def update_driver_location(driver_id: str, location: DriverLocationUpdate):
 
 def check_automatic_delivery_detection(driver_id: str, location: DriverLocationUpdate) -> list:
     """Check if driver is at delivery location and auto-complete if stationary"""
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    driver = drivers_db.get(driver_id)
     auto_deliveries = []
     
     for order_id in driver["current_orders"]:
-        order = next((o for o in orders_db if o["id"] == order_id), None)
+        order = orders_db.get(order_id)
         if not order or order["status"] != "in_transit":
             continue
             
@@ -2042,8 +2097,8 @@ def get_address_coordinates(address: str, city: str) -> dict:
 
 @app.post("/api/driver/{driver_id}/accept-assignment")
 def accept_assignment(driver_id: str, acceptance: AssignmentAcceptance):
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
-    order = next((o for o in orders_db if o["id"] == acceptance.order_id), None)
+    driver = drivers_db.get(driver_id)
+    order = orders_db.get(acceptance.order_id)
     
     if not driver or not order:
         return {"error": "Driver or order not found"}
@@ -2054,8 +2109,7 @@ def accept_assignment(driver_id: str, acceptance: AssignmentAcceptance):
         order["status"] = "accepted"
         order["accepted_at"] = datetime.now().isoformat()
         
-        if acceptance.order_id not in driver["current_orders"]:
-            driver["current_orders"].append(acceptance.order_id)
+        driver_load.attach(driver, acceptance.order_id)
         
         driver["status"] = "busy"
         
@@ -2091,13 +2145,20 @@ def accept_assignment(driver_id: str, acceptance: AssignmentAcceptance):
 
 # Driver interface endpoints
 @app.get("/api/driver/{driver_id}/dashboard")
-def get_driver_dashboard(driver_id: str):
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+def get_driver_dashboard(driver_id: str, request: Request, response: Response):
+    driver = drivers_db.get(driver_id)
     if not driver:
         return {"error": "Driver not found"}
     
+    # Served from the per-driver cache until the driver's route version changes
+    return driver_route_cache.serve(request, response, driver, "dashboard",
+                                    lambda: build_driver_dashboard(driver))
+
+def build_driver_dashboard(driver: dict) -> dict:
+    driver_id = driver["id"]
+    
     # Get driver's orders
-    driver_orders = [o for o in orders_db if o.get("assigned_driver") == driver_id]
+    driver_orders = orders_db.find("assigned_driver", driver_id)
     
     # Calculate stats
     today_deliveries = len([o for o in driver_orders if o["status"] == "delivered"])
@@ -2105,7 +2166,7 @@ def get_driver_dashboard(driver_id: str):
     total_earnings = sum([o.get("total_cost", o.get("price", 0)) * 0.15 for o in driver_orders if o["status"] == "delivered"])  # 15% commission
     
     # Get pending assignments (orders waiting for driver acceptance)
-    pending_assignments = [o for o in orders_db if o.get("assigned_driver") == driver_id and o["status"] == "pending_acceptance"]
+    pending_assignments = [o for o in driver_orders if o["status"] == "pending_acceptance"]
     
     return {
         "driver": driver,
@@ -2123,25 +2184,26 @@ def get_driver_dashboard(driver_id: str):
 
 def get_pending_assignments(driver_id: str) -> list:
     """Get orders pending driver acceptance"""
-    return [o for o in orders_db if o.get("assigned_driver") == driver_id and o["status"] == "pending_acceptance"]
+    return [o for o in orders_db.find("assigned_driver", driver_id) if o["status"] == "pending_acceptance"]
 
 @app.get("/api/driver/{driver_id}/route")
-def get_driver_route(driver_id: str):
+def get_driver_route(driver_id: str, request: Request, response: Response):
     """Get optimized route for mobile app"""
-    route = generate_advanced_route(driver_id)
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    driver = drivers_db.get(driver_id)
+    if not driver:
+        return {"driver_location": None, "route": generate_advanced_route(driver_id), "navigation_ready": True}
     
-    return {
-        "driver_location": driver["current_location"] if driver else None,
-        "route": route,
+    return driver_route_cache.serve(request, response, driver, "route", lambda: {
+        "driver_location": dict(driver["current_location"]),
+        "route": generate_advanced_route(driver_id),
         "navigation_ready": True
-    }
+    })
 
 @app.post("/api/driver/{driver_id}/start-delivery/{order_id}")
 def start_delivery(driver_id: str, order_id: str):
     """Mark order as picked up and start delivery"""
-    order = next((o for o in orders_db if o["id"] == order_id), None)
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    order = orders_db.get(order_id)
+    driver = drivers_db.get(driver_id)
     
     if not order or not driver or order.get("assigned_driver") != driver_id:
         return {"error": "Invalid order or driver"}
@@ -2162,7 +2224,7 @@ def start_delivery(driver_id: str, order_id: str):
 
 @app.post("/api/driver/{driver_id}/update-status")
 def update_driver_status(driver_id: str, status_data: dict):
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    driver = drivers_db.get(driver_id)
     if not driver:
         return {"error": "Driver not found"}
     
@@ -2175,8 +2237,8 @@ def update_driver_status(driver_id: str, status_data: dict):
 @app.post("/api/driver/{driver_id}/arrive-at-delivery/{order_id}")
 def arrive_at_delivery(driver_id: str, order_id: str):
     """Mark driver as arrived at delivery location"""
-    order = next((o for o in orders_db if o["id"] == order_id), None)
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    order = orders_db.get(order_id)
+    driver = drivers_db.get(driver_id)
     
     if not order or not driver or order.get("assigned_driver") != driver_id:
         return {"error": "Invalid order or driver"}
@@ -2198,7 +2260,7 @@ def arrive_at_delivery(driver_id: str, order_id: str):
 @app.post("/api/driver/{driver_id}/complete-delivery")
 def complete_delivery(driver_id: str, completion_data: dict):
     order_id = completion_data.get("order_id")
-    order = next((o for o in orders_db if o["id"] == order_id), None)
+    order = orders_db.get(order_id)
     
     if not order or order.get("assigned_driver") != driver_id:
         return {"error": "Order not found or not assigned to this driver"}
@@ -2209,9 +2271,8 @@ def complete_delivery(driver_id: str, completion_data: dict):
     order["proof_of_delivery"] = completion_data.get("proof", {})
     
     # Update driver
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
-    if driver and order_id in driver["current_orders"]:
-        driver["current_orders"].remove(order_id)
+    driver = drivers_db.get(driver_id)
+    if driver and driver_load.detach(driver, order_id):
         driver["total_deliveries"] += 1
         
         # Update status if no more orders
@@ -2230,25 +2291,21 @@ def complete_delivery(driver_id: str, completion_data: dict):
     return {"message": "Delivery completed successfully", "order": order}
 
 def generate_advanced_route(driver_id: str) -> dict:
-    """Generate optimized multi-package route using TSP algorithm"""
-    from api.services.multi_package_optimizer import MultiPackageOptimizer
-    
-    driver = next((d for d in drivers_db if d["id"] == driver_id), None)
+    """Optimized multi-package route from the driver's persistent route plan"""
+    driver = drivers_db.get(driver_id)
     if not driver:
         return {"route_points": [], "total_distance": 0, "estimated_time": 0}
     
-    driver_orders = [o for o in orders_db if o.get("assigned_driver") == driver_id and 
+    driver_orders = [o for o in orders_db.find("assigned_driver", driver_id) if 
                     o["status"] in ["accepted", "assigned", "picked_up", "in_transit"]]
     
     if not driver_orders:
         return {"route_points": [], "total_distance": 0, "estimated_time": 0}
     
-    # Use optimized multi-package routing
-    optimizer = MultiPackageOptimizer()
-    route_data = optimizer.optimize_multi_delivery_route(
-        driver["current_location"], 
-        driver_orders
-    )
+    # Stops come from the plan, which is edited incrementally as orders change
+    route_data = route_plans.route_for(driver)
+    if not route_data["route"]:
+        return {"route_points": [], "total_distance": 0, "estimated_time": 0}
     
     # Convert to expected format
     route_points = []
@@ -2268,11 +2325,8 @@ def generate_advanced_route(driver_id: str) -> dict:
             order = point["order"]
             is_pickup = point["type"] == "pickup"
             
-            # Calculate time to this point
-            if i > 0:
-                prev_point = route_data["route"][i-1]
-                distance = optimizer._calculate_distance(prev_point["location"], point["location"])
-                total_time += distance * 2 + (5 if is_pickup else 8)  # Travel + stop time
+            # Scheduled start of service from the time-window aware optimizer
+            total_time = point["eta_minutes"]
             
             route_points.append({
                 "type": point["type"],
@@ -2285,6 +2339,7 @@ def generate_advanced_route(driver_id: str) -> dict:
                 "package_description": order.get("package_description", "Package"),
                 "priority": 1 if order.get("service_type") == "express" else 2,
                 "estimated_arrival": (datetime.now() + timedelta(minutes=total_time)).isoformat(),
+                "lateness_minutes": point["lateness_minutes"],
                 "instructions": f"{'Pick up' if is_pickup else 'Deliver'} package {'from' if is_pickup else 'to'} {order.get('sender_name' if is_pickup else 'receiver_name', 'contact')}",
                 "estimated_duration": 5 if is_pickup else 8
             })
@@ -2297,7 +2352,10 @@ def generate_advanced_route(driver_id: str) -> dict:
         "fuel_cost_estimate": route_data["total_cost"],
         "cost_savings": route_data["fuel_savings"],
         "efficiency_score": route_data["efficiency_score"],
+        "late_stops": route_data["solver"]["late_stops"],
+        "total_lateness_minutes": route_data["solver"]["total_lateness_min"],
         "optimized": True,
+        "plan": route_data.get("plan"),
         "generated_at": datetime.now().isoformat(),
         "route_efficiency": "Excellent" if route_data["efficiency_score"] > 80 else "Good" if route_data["efficiency_score"] > 60 else "Fair"
     }
@@ -2477,42 +2535,78 @@ def get_next_expected_update(order: dict) -> dict:
     
     return next_updates.get(status, {"event": "Delivery Complete", "eta": "Completed"})
 
+def _on_topic_message(websocket: WebSocket):
+    def handle(message: dict) -> None:
+        requested = [t for t in message.get("topics", []) if isinstance(t, str) and t]
+        if message.get("action") == "subscribe":
+            ws_manager.subscribe(websocket, requested)
+        elif message.get("action") == "unsubscribe":
+            ws_manager.unsubscribe(websocket, requested)
+    return handle
+
+@app.websocket("/ws")
+async def topics_websocket(websocket: WebSocket, topics: str = ""):
+    """Subscribe with ?topics=order:ORD1,city:casablanca and change topics with
+    {"action": "subscribe" | "unsubscribe", "topics": [...]} messages"""
+    await ws_manager.connect(websocket, [t for t in topics.split(",") if t])
+    await ws_manager.listen(websocket, _on_topic_message(websocket))
+
+# Driver and tracking sockets get a snapshot on connect, then only pushed changes (see core/live_updates.py)
 @app.websocket("/ws/driver/{driver_id}")
 async def driver_websocket(websocket: WebSocket, driver_id: str):
-    await websocket.accept()
-    try:
-        while True:
-            # Send real-time updates to driver
-            driver = next((d for d in drivers_db if d["id"] == driver_id), None)
-            if driver:
-                driver_orders = [o for o in orders_db if o.get("assigned_driver") == driver_id]
-                await websocket.send_text(json.dumps({
-                    "type": "driver_update",
-                    "driver": driver,
-                    "orders": driver_orders,
-                    "timestamp": datetime.now().isoformat()
-                }))
-            await asyncio.sleep(10)  # Update every 10 seconds
-    except WebSocketDisconnect:
-        pass
+    """driver_snapshot on connect, then driver_delta patches numbered by seq;
+    send {"action": "resync"} after a gap to get a fresh snapshot"""
+    def on_message(message: dict) -> None:
+        if message.get("action") == "resync":
+            snapshot = live_updates.driver_snapshot(driver_id)
+            if snapshot:
+                ws_manager.send(websocket, snapshot)
+
+    # Subscribe after queueing the snapshot so the first patch received follows it
+    await ws_manager.connect(websocket)
+    on_message({"action": "resync"})
+    ws_manager.subscribe(websocket, [f"driver:{driver_id}"])
+    await ws_manager.listen(websocket, on_message)
 
 @app.websocket("/ws/tracking/{order_id}")
 async def track_order_websocket(websocket: WebSocket, order_id: str):
+    order = orders_db.get(order_id) or orders_db.find_one("tracking_number", order_id)
+    if order:
+        order_id = order["id"]
+    await ws_manager.connect(websocket, [f"order:{order_id}"])
+    if order:
+        ws_manager.send(websocket, live_updates.order_payload(order_id, order))
+    await ws_manager.listen(websocket)
+
+@app.websocket("/ws/driver/{driver_id}/gps")
+async def driver_gps_websocket(websocket: WebSocket, driver_id: str):
+    """Upstream GPS channel: binary frames of one or more packed fixes (see
+    api/services/location_ingest.py), each acknowledged with a small JSON message"""
+    driver = drivers_db.get(driver_id)
+    if not driver:
+        await websocket.close(code=4404)
+        return
     await websocket.accept()
-    try:
-        while True:
-            # Send real-time order updates
-            order = next((o for o in orders_db if o["id"] == order_id), None)
-            if order:
-                await websocket.send_text(json.dumps({
-                    "order_id": order_id,
-                    "status": order["status"],
-                    "current_location": order.get("current_location"),
-                    "timestamp": datetime.now().isoformat()
-                }))
-            await asyncio.sleep(30)  # Update every 30 seconds
-    except WebSocketDisconnect:
-        pass
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            break
+        if message.get("bytes") is None:
+            await websocket.send_json({"type": "gps_error", "error": "Expected a binary frame"})
+            continue
+        try:
+            result = location_ingest.ingest_frame(driver, message["bytes"])
+        except (ValueError, OverflowError, OSError) as e:
+            await websocket.send_json({"type": "gps_error", "error": str(e)})
+            continue
+        ack = {"type": "gps_error" if result["rejected"] else "gps_ack", **result}
+        if result["applied"]:
+            latest = driver["current_location"]
+            auto_deliveries = check_automatic_delivery_detection(driver_id, DriverLocationUpdate(
+                driver_id=driver_id, latitude=latest["lat"], longitude=latest["lng"], speed=latest["speed"]))
+            if auto_deliveries:
+                ack["auto_deliveries"] = auto_deliveries
+        await websocket.send_json(ack)
 
 if __name__ == "__main__":
     print("=" * 80)
@@ -0,0 +1,92 @@
+"""JSON Patch diff/apply round trips on random documents.
+
+Run from the backend directory: python -m pytest -q test_json_patch.py
+"""
+import json
+import random
+from datetime import datetime
+
+import pytest
+
+from core import json_patch
+
+KEYS = ["id", "status", "lat", "lng", "a/b", "m~n", "~1", "", "route_history", "orders"]
+
+
+def random_value(rng: random.Random, depth: int = 0):
+    kind = rng.choice(["scalar"] * 3 + (["dict", "list"] if depth < 4 else []))
+    if kind == "dict":
+        return {rng.choice(KEYS): random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))}
+    if kind == "list":
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return rng.choice([None, True, False, 0, 1, 1.0, -2.5, "", "x", "delivered", rng.random(), rng.randint(-5, 5)])
+
+
+def mutate(rng: random.Random, value, depth: int = 0):
+    """A changed copy: edited, added and removed keys, appended, shortened or rewritten lists"""
+    if rng.random() < 0.15:
+        return random_value(rng, depth)
+    if isinstance(value, dict):
+        value = {key: mutate(rng, child, depth + 1) if rng.random() < 0.5 else child for key, child in value.items()}
+        for key in rng.sample(list(value), k=min(len(value), rng.randint(0, 1))):
+            del value[key]
+        if rng.random() < 0.4:
+            value[rng.choice(KEYS)] = random_value(rng, depth + 1)
+        return value
+    if isinstance(value, list):
+        choice = rng.random()
+        if choice < 0.3:
+            return value + [random_value(rng, depth + 1) for _ in range(rng.randint(1, 3))]
+        if choice < 0.4 and value:
+            return value[:rng.randrange(len(value))]
+        return [mutate(rng, child, depth + 1) if rng.random() < 0.5 else child for child in value]
+    return value
+
+
+def as_json(value) -> str:
+    return json.dumps(value, sort_keys=True)
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_apply_of_diff_round_trips(seed):
+    rng = random.Random(seed)
+    old = json_patch.plain(random_value(rng))
+    new = json_patch.plain(mutate(rng, old))
+    expected = as_json(new)
+    ops = json_patch.diff(old, new)
+
+    # Patches go over the wire as JSON and are applied to the client's own copy
+    patched = json_patch.apply(json_patch.plain(old), json_patch.plain(ops))
+    assert as_json(patched) == expected
+    assert as_json(new) == expected
+
+
+def test_unchanged_document_has_no_ops():
+    doc = {"driver": {"id": "DRV1", "current_location": {"lat": 33.57, "lng": -7.59}}, "orders": {}}
+    assert json_patch.diff(doc, doc) == []
+    assert json_patch.diff(doc, json_patch.plain(doc)) == []
+
+
+def test_grown_list_is_sent_as_appends():
+    history = [{"lat": 33.57 + k * 1e-5, "lng": -7.59} for k in range(500)]
+    old = {"route_history": history}
+    new = {"route_history": history + [{"lat": 33.58, "lng": -7.59}]}
+
+    ops = json_patch.diff(old, new)
+    assert ops == [{"op": "add", "path": "/route_history/-", "value": {"lat": 33.58, "lng": -7.59}}]
+
+
+def test_keys_are_escaped_in_paths():
+    ops = json_patch.diff({"a/b": 1, "m~n": 1}, {"a/b": 2, "m~n": 3})
+    assert [op["path"] for op in ops] == ["/a~1b", "/m~0n"]
+    assert json_patch.apply({"a/b": 1, "m~n": 1}, ops) == {"a/b": 2, "m~n": 3}
+
+
+def test_type_changes_are_replaced():
+    assert json_patch.diff({"v": 1}, {"v": True}) == [{"op": "replace", "path": "/v", "value": True}]
+    assert json_patch.diff({"v": 1}, {"v": 1.0}) == [{"op": "replace", "path": "/v", "value": 1.0}]
+
+
+def test_plain_matches_what_a_client_receives():
+    value = {"at": datetime(2024, 1, 15, 10, 0), "stops": (1, 2)}
+    assert json_patch.plain(value) == {"at": "2024-01-15 10:00:00", "stops": [1, 2]}
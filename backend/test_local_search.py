@@ -0,0 +1,71 @@
+"""Delta-evaluated local search on random stops around Casablanca.
+
+Run from the backend directory: python -m pytest -q test_local_search.py
+"""
+import random
+
+import pytest
+
+from api.services.local_search import LocalSearch, build_matrix, nearest_neighbor_route, optimize_path, route_cost
+
+CASABLANCA = {"lat": 33.5731, "lng": -7.5898}
+
+
+def make_stops(n: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [{"lat": CASABLANCA["lat"] + rng.uniform(-0.08, 0.08),
+             "lng": CASABLANCA["lng"] + rng.uniform(-0.08, 0.08)} for _ in range(n + 1)]
+
+
+def shuffled_route(n: int, seed: int) -> list:
+    rest = list(range(1, n))
+    random.Random(seed).shuffle(rest)
+    return [0] + rest
+
+
+def has_improving_reversal(dist, route: list) -> bool:
+    cost = route_cost(dist, route)
+    return any(route_cost(dist, route[:i] + route[i:j + 1][::-1] + route[j + 1:]) < cost - 1e-6
+               for i in range(1, len(route) - 1) for j in range(i + 1, len(route)))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_search_never_increases_cost(seed):
+    rng = random.Random(seed)
+    dist = build_matrix(make_stops(rng.randint(3, 60), seed))
+    for start in (nearest_neighbor_route(dist), shuffled_route(len(dist), seed)):
+        route = LocalSearch(dist, neighbors=rng.randint(1, 10), max_segment=rng.randint(1, 3)).optimize(start)
+
+        assert route[0] == 0
+        assert sorted(route) == list(range(len(dist)))
+        assert route_cost(dist, route) <= route_cost(dist, start) + 1e-9
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_search_improves_a_route_with_an_improving_move(seed):
+    dist = build_matrix(make_stops(20, seed))
+    start = shuffled_route(len(dist), seed)
+    assert has_improving_reversal(dist, start)
+
+    # Every stop is examined before the first change, so a start that is not
+    # 2-opt optimal is always shortened
+    route = LocalSearch(dist, neighbors=len(dist)).optimize(start)
+    assert route_cost(dist, route) < route_cost(dist, start) - 1e-6
+
+
+def test_optimize_path_reports_the_returned_route():
+    stops = make_stops(40, 7)
+    route, stats = optimize_path(stops)
+    dist = build_matrix(stops)
+
+    assert route[0] == 0
+    assert sorted(route) == list(range(41))
+    assert stats["initial_km"] == round(route_cost(dist, nearest_neighbor_route(dist)), 3)
+    assert stats["final_km"] == round(route_cost(dist, route), 3)
+    assert stats["final_km"] <= stats["initial_km"]
+    assert stats["two_opt"] + stats["or_opt"] + stats["relocate"] > 0
+
+
+def test_short_paths_are_returned_as_given():
+    assert optimize_path(make_stops(1, 0))[0] == [0, 1]
+    assert LocalSearch(build_matrix(make_stops(1, 0))).optimize([0, 1]) == [0, 1]
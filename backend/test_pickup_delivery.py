@@ -0,0 +1,256 @@
+"""Pickup-and-delivery insertion and improvement on random Casablanca instances.
+
+Run from the backend directory: python -m pytest -q test_pickup_delivery.py
+"""
+import random
+
+import pytest
+
+from api.services.local_search import build_matrix, route_cost
+from api.services.pickup_delivery import PickupDeliverySolver
+
+CASABLANCA = {"lat": 33.5731, "lng": -7.5898}
+
+
+def make_instance(n_orders: int, seed: int, on_board: float = 0.3):
+    """Random stops around a start at node 0; requests are (pickup or None, delivery, kg)"""
+    rng = random.Random(seed)
+    locations = [CASABLANCA]
+    requests = []
+    for _ in range(n_orders):
+        pickup = None
+        if rng.random() >= on_board:
+            locations.append({"lat": CASABLANCA["lat"] + rng.uniform(-0.06, 0.06),
+                              "lng": CASABLANCA["lng"] + rng.uniform(-0.06, 0.06)})
+            pickup = len(locations) - 1
+        locations.append({"lat": CASABLANCA["lat"] + rng.uniform(-0.06, 0.06),
+                          "lng": CASABLANCA["lng"] + rng.uniform(-0.06, 0.06)})
+        requests.append((pickup, len(locations) - 1, rng.choice([1.0, 2.5, 5.0, 10.0, 20.0])))
+    return build_matrix(locations), requests
+
+
+def insert_at(route, request, i, j):
+    route = list(route)
+    PickupDeliverySolver._insert(route, request, i, j)
+    return route
+
+
+def precedence_ok(route, requests) -> bool:
+    position = {node: index for index, node in enumerate(route)}
+    return all(pickup is None or position[pickup] < position[delivery] for pickup, delivery, _ in requests)
+
+
+def peak_load(solver: PickupDeliverySolver, route) -> float:
+    return float(solver._loads(route).max())
+
+
+def all_insertions(route, request):
+    """Every (i, j) a request can be inserted at: pickup after position i, delivery after position j"""
+    n = len(route)
+    if request[0] is None:
+        return [(None, j) for j in range(n)]
+    return [(i, j) for i in range(n) for j in range(i, n)]
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_solve_respects_precedence_and_capacity(seed):
+    dist, requests = make_instance(random.Random(seed).randint(2, 12), seed)
+    on_board = sum(demand for pickup, _, demand in requests if pickup is None)
+    capacity = max(on_board, 20.0) + random.Random(seed).choice([0.0, 10.0, 40.0])
+    solver = PickupDeliverySolver(dist, requests, capacity=capacity)
+    route, stats = solver.solve()
+
+    assert route[0] == 0
+    assert sorted(route) == list(range(len(dist)))
+    assert precedence_ok(route, requests)
+    assert peak_load(solver, route) <= capacity + 1e-9
+    assert stats["feasible"] and stats["capacity_violations"] == 0
+    assert stats["final_km"] <= stats["construction_km"] + 1e-9
+    assert stats["final_km"] == round(route_cost(dist, route), 3)
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_best_insertion_matches_brute_force(seed):
+    rng = random.Random(seed)
+    dist, requests = make_instance(rng.randint(3, 9), seed)
+    *placed, new = requests
+    # Room for everything on board plus the largest pickup, so each placement can stay feasible
+    capacity = sum(demand for pickup, _, demand in requests if pickup is None) + 20.0
+    solver = PickupDeliverySolver(dist, requests, capacity=capacity)
+    route = [0]
+    for request in placed:
+        solver.insert(route, request)
+    assert peak_load(solver, route) <= capacity + 1e-9
+
+    feasible = []
+    for i, j in all_insertions(route, new):
+        candidate = insert_at(route, new, i, j)
+        if precedence_ok(candidate, requests) and peak_load(solver, candidate) <= capacity + 1e-9:
+            feasible.append(route_cost(dist, candidate) - route_cost(dist, route))
+
+    found = solver.best_insertion(route, new)
+    if not feasible:
+        assert found is None
+        return
+    cost, i, j = found
+    candidate = insert_at(route, new, i, j)
+    assert cost == pytest.approx(min(feasible))
+    assert route_cost(dist, candidate) - route_cost(dist, route) == pytest.approx(cost)
+    assert precedence_ok(candidate, requests)
+    assert peak_load(solver, candidate) <= capacity + 1e-9
+
+
+def test_pickup_waits_for_room_on_board():
+    # Two 20 kg pickups near the start and their deliveries far away, in a 25 kg van:
+    # the second pickup can only happen after the first delivery
+    locations = [CASABLANCA,
+                 {"lat": 33.574, "lng": -7.589}, {"lat": 33.575, "lng": -7.588},
+                 {"lat": 33.62, "lng": -7.52}, {"lat": 33.621, "lng": -7.521}]
+    requests = [(1, 3, 20.0), (2, 4, 20.0)]
+    solver = PickupDeliverySolver(build_matrix(locations), requests, capacity=25.0)
+    route, stats = solver.solve()
+
+    assert stats["feasible"]
+    assert peak_load(solver, route) == 20.0
+    position = {node: index for index, node in enumerate(route)}
+    first, second = sorted(requests, key=lambda r: position[r[0]])
+    assert position[first[1]] < position[second[0]]
+
+
+def test_on_board_deliveries_free_capacity_first():
+    # 20 kg already on board in a 25 kg van: nothing heavy fits until it is delivered
+    locations = [CASABLANCA, {"lat": 33.60, "lng": -7.56}, {"lat": 33.574, "lng": -7.589},
+                 {"lat": 33.575, "lng": -7.588}]
+    requests = [(None, 1, 20.0), (2, 3, 10.0)]
+    solver = PickupDeliverySolver(build_matrix(locations), requests, capacity=25.0)
+    route, stats = solver.solve()
+
+    assert stats["feasible"]
+    assert route.index(1) < route.index(2)
+
+
+def test_overweight_request_is_routed_and_reported():
+    dist, _ = make_instance(2, 0, on_board=0.0)
+    requests = [(1, 2, 5.0), (3, 4, 50.0)]
+    solver = PickupDeliverySolver(dist, requests, capacity=25.0)
+    route, stats = solver.solve()
+
+    assert sorted(route) == list(range(5))
+    assert precedence_ok(route, requests)
+    assert stats["capacity_violations"] >= 1
+    assert not stats["feasible"]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_improve_never_lengthens_a_feasible_route(seed):
+    dist, requests = make_instance(10, seed)
+    solver = PickupDeliverySolver(dist, requests, capacity=200.0)
+    rng = random.Random(seed)
+    # A feasible but poor start: requests in random order, each appended at the end
+    route = [0]
+    for pickup, delivery, _ in rng.sample(requests, len(requests)):
+        route += [node for node in (pickup, delivery) if node is not None]
+
+    improved = solver.improve(route)
+    assert precedence_ok(improved, requests)
+    assert route_cost(dist, improved) <= route_cost(dist, route) + 1e-9
+    assert sorted(improved) == list(range(len(dist)))
+
+
+MINUTES_PER_KM = 2.0
+
+
+def make_timed_instance(n_orders: int, seed: int):
+    """make_instance plus a window and service minutes per stop; some stops open later than departure"""
+    rng = random.Random(seed)
+    dist, requests = make_instance(n_orders, seed)
+    windows, service = [(0.0, float("inf"))], [0.0]
+    for _ in range(1, len(dist)):
+        earliest = rng.choice([0.0, 0.0, rng.uniform(0, 90)])
+        windows.append((earliest, earliest + rng.uniform(60, 400)))
+        service.append(rng.choice([5.0, 8.0]))
+    return dist, requests, windows, service
+
+
+def on_time(solver: PickupDeliverySolver, route) -> bool:
+    """Full reschedule of the route against the solver's current deadlines"""
+    _, begin = solver.schedule(route)
+    return bool((begin <= solver.latest[route] + 1e-9).all())
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_windowed_insertion_matches_full_rescheduling(seed):
+    dist, requests, windows, service = make_timed_instance(random.Random(seed).randint(3, 8), seed)
+    *placed, new = requests
+    solver = PickupDeliverySolver(dist, requests, travel=dist * MINUTES_PER_KM, windows=windows, service=service)
+    route = [0]
+    for request in placed:
+        solver.insert(route, request)
+    assert on_time(solver, route)
+
+    # Forward-slack checks must accept exactly the positions a full reschedule keeps on time
+    feasible = []
+    for i, j in all_insertions(route, new):
+        candidate = insert_at(route, new, i, j)
+        if on_time(solver, candidate):
+            feasible.append(route_cost(dist, candidate) - route_cost(dist, route))
+
+    found = solver.best_insertion(route, new)
+    if not feasible:
+        assert found is None
+        return
+    cost, i, j = found
+    assert cost == pytest.approx(min(feasible))
+    assert on_time(solver, insert_at(route, new, i, j))
+
+
+def test_service_waits_for_the_window_to_open():
+    locations = [CASABLANCA, {"lat": 33.58, "lng": -7.58}, {"lat": 33.59, "lng": -7.57}]
+    dist = build_matrix(locations)
+    solver = PickupDeliverySolver(dist, [(1, 2, 1.0)], travel=dist * MINUTES_PER_KM,
+                                  windows=[(0.0, float("inf")), (60.0, 120.0), (0.0, 240.0)], service=[0.0, 5.0, 8.0])
+    route, stats = solver.solve()
+    arrival, begin = solver.schedule(route)
+
+    assert route == [0, 1, 2]
+    assert arrival[1] < 60.0 and begin[1] == 60.0
+    assert begin[2] == pytest.approx(65.0 + dist[1, 2] * MINUTES_PER_KM)
+    assert stats["late_stops"] == 0
+
+
+def test_windows_reorder_stops_against_distance():
+    # The far delivery is due first, so it is served before the near one
+    locations = [CASABLANCA, {"lat": 33.575, "lng": -7.588}, {"lat": 33.65, "lng": -7.50}]
+    dist = build_matrix(locations)
+    requests = [(None, 1, 1.0), (None, 2, 1.0)]
+    windows = [(0.0, float("inf")), (0.0, 300.0), (0.0, 30.0)]
+    service = [0.0, 8.0, 8.0]
+    route, stats = PickupDeliverySolver(dist, requests, travel=dist * MINUTES_PER_KM, windows=windows,
+                                        service=service).solve()
+    untimed, _ = PickupDeliverySolver(dist, requests).solve()
+
+    assert untimed == [0, 1, 2]
+    assert route == [0, 2, 1]
+    assert stats["late_stops"] == 0
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_impossible_window_is_served_late_without_delaying_others(seed):
+    dist, requests, windows, service = make_timed_instance(6, seed)
+    # The last delivery is due before the driver can possibly get there
+    delivery = requests[-1][1]
+    windows[delivery] = (0.0, dist[0, delivery] * MINUTES_PER_KM / 2)
+    solver = PickupDeliverySolver(dist, requests, travel=dist * MINUTES_PER_KM, windows=windows, service=service)
+    route, stats = solver.solve()
+    _, late = solver.lateness(route)
+
+    assert precedence_ok(route, requests)
+    assert stats["window_relaxations"] >= 1
+    assert late[route.index(delivery)] > 0
+    # Only stops whose deadline had to be pushed back are late (measured against the
+    # original windows), and the route keeps every deadline the solver ended up with
+    relaxed = solver.latest > solver.due
+    assert relaxed[delivery]
+    assert all(relaxed[node] for node, minutes in zip(route, late) if minutes > 1e-9)
+    assert on_time(solver, route)
+    assert stats["late_stops"] == int((late > 1e-9).sum())
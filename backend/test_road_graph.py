@@ -0,0 +1,160 @@
+"""Offline road-graph routing on a small synthetic city extract.
+
+Run from the backend directory: python -m pytest -q test_road_graph.py
+"""
+import heapq
+import math
+import random
+
+import numpy as np
+import pytest
+
+from api.services.road_graph import RoadGraph, build_road_graph
+from core.geo import haversine
+
+SIZE = 40  # nodes per side
+SPACING_DEG = 0.0008  # about 80 m
+ORIGIN = (33.53, -7.66)
+
+
+def write_city(path: str) -> None:
+    """Grid of residential streets with primary roads every 10 blocks, alternating one-ways,
+    a few speed limits, one private street and a small road network cut off from the rest"""
+    node_id = lambda r, c: r * SIZE + c + 1
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0"?>\n<osm version="0.6">\n')
+        for r in range(SIZE):
+            for c in range(SIZE):
+                f.write(f'<node id="{node_id(r, c)}" lat="{ORIGIN[0] + r * SPACING_DEG:.7f}" '
+                        f'lon="{ORIGIN[1] + c * SPACING_DEG:.7f}"/>\n')
+        island = SIZE * SIZE + 1
+        for k in range(3):
+            f.write(f'<node id="{island + k}" lat="{ORIGIN[0] - 0.05:.7f}" lon="{ORIGIN[1] + k * SPACING_DEG:.7f}"/>\n')
+        way = 1
+        for k in range(SIZE):
+            for refs in ([node_id(k, c) for c in range(SIZE)], [node_id(r, k) for r in range(SIZE)]):
+                highway = "primary" if k % 10 == 0 else "residential"
+                tags = f'<tag k="highway" v="{highway}"/>'
+                if highway == "residential" and k % 2:
+                    tags += '<tag k="oneway" v="-1"/>' if k % 4 == 3 else '<tag k="oneway" v="yes"/>'
+                if k % 7 == 0:
+                    tags += '<tag k="maxspeed" v="20 mph"/>'
+                f.write(f'<way id="{way}">' + "".join(f'<nd ref="{ref}"/>' for ref in refs) + tags + "</way>\n")
+                way += 1
+        # A private shortcut along the diagonal must never be used
+        f.write(f'<way id="{way}">' + "".join(f'<nd ref="{node_id(k, k)}"/>' for k in range(SIZE)) +
+                '<tag k="highway" v="primary"/><tag k="access" v="private"/></way>\n')
+        f.write(f'<way id="{way + 1}">' + "".join(f'<nd ref="{island + k}"/>' for k in range(3)) +
+                '<tag k="highway" v="residential"/></way>\n')
+        f.write("</osm>\n")
+
+
+def dijkstra(graph: RoadGraph, s: int, t: int) -> float:
+    a = graph._arrays
+    dist, heap = {s: 0.0}, [(0.0, s)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        if u == t:
+            return d
+        start, end = int(a["fwd_ptr"][u]), int(a["fwd_ptr"][u + 1])
+        for v, w in zip(a["fwd_to"][start:end].tolist(), a["fwd_time"][start:end].tolist()):
+            if d + w < dist.get(v, math.inf):
+                dist[v] = d + w
+                heapq.heappush(heap, (d + w, v))
+    return math.inf
+
+
+def edge(graph: RoadGraph, u: int, v: int):
+    """(length, time) of the fastest edge u -> v"""
+    a = graph._arrays
+    start, end = int(a["fwd_ptr"][u]), int(a["fwd_ptr"][u + 1])
+    matches = [(float(a["fwd_len"][e]), float(a["fwd_time"][e])) for e in range(start, end) if a["fwd_to"][e] == v]
+    assert matches, f"no edge {u} -> {v}"
+    return min(matches, key=lambda m: m[1])
+
+
+@pytest.fixture(scope="module")
+def graph(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("road_graph")
+    source = str(tmp / "city.osm")
+    write_city(source)
+    build_road_graph(source, str(tmp / "graph"))
+    graph = RoadGraph(str(tmp / "graph"))
+    assert graph.load()
+    return graph
+
+
+def test_build_keeps_only_the_connected_public_network(graph):
+    assert graph.meta["nodes"] == SIZE * SIZE
+    # Primary roads run at 60 km/h; the private diagonal is not in the graph
+    assert graph.meta["max_speed_mps"] == pytest.approx(60 / 3.6)
+    assert graph.nearest(ORIGIN[0] - 0.05, ORIGIN[1]) is None
+    corner = graph.nearest(ORIGIN[0], ORIGIN[1])[0]
+    diagonal = graph.nearest(ORIGIN[0] + SPACING_DEG, ORIGIN[1] + SPACING_DEG)[0]
+    a = graph._arrays
+    assert diagonal not in a["fwd_to"][int(a["fwd_ptr"][corner]):int(a["fwd_ptr"][corner + 1])].tolist()
+
+
+def test_astar_travel_times_match_dijkstra(graph):
+    rng = random.Random(7)
+    n = graph.meta["nodes"]
+    for _ in range(150):
+        s, t = rng.randrange(n), rng.randrange(n)
+        nodes, meters, seconds = graph.shortest_path(s, t)
+
+        assert seconds == pytest.approx(dijkstra(graph, s, t), rel=1e-9, abs=1e-6)
+        assert nodes[0] == s and nodes[-1] == t
+        # The path is made of real edges whose lengths and times add up to the result
+        legs = [edge(graph, u, v) for u, v in zip(nodes, nodes[1:])]
+        assert meters == pytest.approx(sum(length for length, _ in legs), rel=1e-6)
+        assert seconds == pytest.approx(sum(time for _, time in legs), rel=1e-6)
+
+
+def test_one_way_streets_make_travel_times_asymmetric(graph):
+    rng = random.Random(3)
+    n = graph.meta["nodes"]
+    asymmetric = 0
+    for _ in range(50):
+        s, t = rng.randrange(n), rng.randrange(n)
+        there, back = graph.shortest_path(s, t)[2], graph.shortest_path(t, s)[2]
+        assert there == pytest.approx(dijkstra(graph, s, t), abs=1e-6)
+        assert back == pytest.approx(dijkstra(graph, t, s), abs=1e-6)
+        asymmetric += abs(there - back) > 1e-3
+    assert asymmetric > 0
+
+
+def test_nearest_is_the_closest_node(graph):
+    rng = random.Random(5)
+    lat, lng = np.asarray(graph._arrays["lat"]), np.asarray(graph._arrays["lng"])
+    span = SIZE * SPACING_DEG
+    for _ in range(100):
+        point = (ORIGIN[0] + rng.uniform(-0.001, span), ORIGIN[1] + rng.uniform(-0.001, span))
+        node, meters = graph.nearest(*point)
+        closest = min(haversine(point[0], point[1], float(lat[k]), float(lng[k])) for k in range(len(lat))) * 1000
+        assert meters == pytest.approx(closest, abs=0.5)
+        assert meters == pytest.approx(haversine(point[0], point[1], float(lat[node]), float(lng[node])) * 1000)
+
+
+def test_route_leg_adds_the_snap_hops_and_caps_speed(graph):
+    start = {"lat": ORIGIN[0] + 0.0003, "lng": ORIGIN[1] + 0.0002}
+    end = {"lat": ORIGIN[0] + 0.025, "lng": ORIGIN[1] + 0.021}
+    leg = graph.route_leg(start, end)
+    slow = graph.route_leg(start, end, max_speed_kmh=15)
+    (s, s_m), (t, t_m) = graph.nearest(start["lat"], start["lng"]), graph.nearest(end["lat"], end["lng"])
+    _, meters, seconds = graph.shortest_path(s, t)
+
+    assert leg["coordinates"][0] == [start["lng"], start["lat"]]
+    assert leg["coordinates"][-1] == [end["lng"], end["lat"]]
+    assert leg["distance"] == pytest.approx(meters + s_m + t_m)
+    assert leg["duration"] > seconds
+    assert slow["duration"] > leg["duration"]
+    assert slow["distance"] == pytest.approx(leg["distance"])
+
+
+def test_missing_graph_is_not_loaded(tmp_path):
+    graph = RoadGraph(str(tmp_path / "nothing"))
+    assert not graph.load()
+    assert not graph.available
+    assert graph.route_leg({"lat": ORIGIN[0], "lng": ORIGIN[1]}, {"lat": ORIGIN[0], "lng": ORIGIN[1]}) is None
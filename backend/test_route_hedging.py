@@ -0,0 +1,146 @@
+"""Hedged routing requests against local stand-in OSRM servers with injected latency.
+
+Run from the backend directory: python -m pytest -q test_route_hedging.py
+"""
+import asyncio
+import json
+import time
+from typing import Tuple
+
+import httpx
+
+from api.services.hedging import HedgedRequester
+
+ROUTE_BODY = json.dumps({"code": "Ok", "routes": [{"distance": 2100.0, "duration": 310.0, "legs": []}]}).encode()
+
+
+class StandIn:
+    """Local HTTP server answering after a fixed delay, recording arrivals and aborted requests"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.arrivals = []
+        self.answered = 0
+        self.aborted = 0
+        self.server = None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            self.arrivals.append(time.perf_counter())
+            try:
+                # The client closing the connection before the delay ends means it gave up on us
+                if await asyncio.wait_for(reader.read(1), self.delay) == b"":
+                    self.aborted += 1
+                    return
+            except asyncio.TimeoutError:
+                pass
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Connection: close\r\nContent-Length: %d\r\n\r\n" % len(ROUTE_BODY) + ROUTE_BODY)
+            await writer.drain()
+            self.answered += 1
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> "StandIn":
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}/route/v1/driving/0,0;1,1"
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def _route(client: httpx.AsyncClient, url: str) -> dict:
+    response = await client.get(url)
+    response.raise_for_status()
+    return response.json()
+
+
+async def _race(hedger: HedgedRequester, client: httpx.AsyncClient, *servers: Tuple[str, StandIn]):
+    attempts = [(name, lambda s=server: _route(client, s.url)) for name, server in servers]
+    return await hedger.run(attempts)
+
+
+def test_hedge_fires_after_delay():
+    async def scenario():
+        primary, secondary = await StandIn(1.0).start(), await StandIn(0.02).start()
+        hedger = HedgedRequester(default_delay=0.2, min_delay=0.05, max_delay=1.0)
+        async with httpx.AsyncClient() as client:
+            started = time.perf_counter()
+            result = await _race(hedger, client, ("primary", primary), ("secondary", secondary))
+            elapsed = time.perf_counter() - started
+        await primary.close()
+        await secondary.close()
+
+        assert result["code"] == "Ok"
+        assert hedger.totals["hedged"] == 1
+        assert hedger.servers["secondary"].wins == 1
+        # The secondary is only started once the primary has been silent for the hedge delay
+        assert secondary.arrivals[0] - started >= 0.19
+        assert elapsed < 0.6
+
+    asyncio.run(scenario())
+
+
+def test_fast_primary_is_not_hedged():
+    async def scenario():
+        primary, secondary = await StandIn(0.02).start(), await StandIn(0.02).start()
+        hedger = HedgedRequester(default_delay=0.2, min_delay=0.05, max_delay=1.0)
+        async with httpx.AsyncClient() as client:
+            await _race(hedger, client, ("primary", primary), ("secondary", secondary))
+        await primary.close()
+        await secondary.close()
+
+        assert hedger.totals["hedged"] == 0
+        assert secondary.arrivals == []
+
+    asyncio.run(scenario())
+
+
+def test_losing_request_is_cancelled():
+    async def scenario():
+        primary, secondary = await StandIn(1.0).start(), await StandIn(0.02).start()
+        hedger = HedgedRequester(default_delay=0.1, min_delay=0.05, max_delay=1.0)
+        async with httpx.AsyncClient() as client:
+            await _race(hedger, client, ("primary", primary), ("secondary", secondary))
+            await asyncio.sleep(0.1)
+        await primary.close()
+        await secondary.close()
+
+        assert hedger.servers["primary"].cancelled == 1
+        assert hedger.servers["primary"].successes == 0
+        # The primary saw its connection dropped instead of finishing the response
+        assert primary.aborted == 1
+        assert primary.answered == 0
+
+    asyncio.run(scenario())
+
+
+def test_slow_primary_is_demoted():
+    async def scenario():
+        primary, secondary = await StandIn(0.3).start(), await StandIn(0.02).start()
+        hedger = HedgedRequester(default_delay=0.1, min_delay=0.05, max_delay=1.0)
+        async with httpx.AsyncClient() as client:
+            for _ in range(3):
+                await _race(hedger, client, ("primary", primary), ("secondary", secondary))
+            assert hedger.rank(["primary", "secondary"]) == ["secondary", "primary"]
+
+            primary_hits = len(primary.arrivals)
+            for _ in range(5):
+                await _race(hedger, client, ("primary", primary), ("secondary", secondary))
+        await primary.close()
+        await secondary.close()
+
+        # Once demoted the primary is no longer tried: the secondary answers well inside its hedge delay
+        assert len(primary.arrivals) == primary_hits
+        assert hedger.servers["secondary"].wins == 8
+        assert hedger.get_stats()["ranking"][0] == "secondary"
+
+    asyncio.run(scenario())
@@ -0,0 +1,156 @@
+"""Travel matrix block splitting and merging against a local stand-in OSRM table server.
+
+Run from the backend directory: python -m pytest -q test_travel_matrix.py
+"""
+import asyncio
+import json
+import random
+from urllib.parse import unquote, urlsplit
+
+import numpy as np
+
+from api.services.travel_matrix import TravelMatrixService
+from core.geo import haversine
+
+CASABLANCA = {"lat": 33.5731, "lng": -7.5898}
+ISLAND = {"lat": 33.7, "lng": -7.7}  # no road connection to anything
+
+
+def road_meters(a, b) -> float:
+    """Stand-in road distance; asymmetric so a transposed block would show"""
+    return round(haversine(a[0], a[1], b[0], b[1]) * 1250 + (40 if a[0] > b[0] else 0), 1)
+
+
+class StandInTable:
+    """Local HTTP server answering OSRM /table requests, recording the coordinates of each"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.requests = []
+        self.server = None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            head = (await reader.readuntil(b"\r\n\r\n")).decode()
+            path = urlsplit(head.split(" ")[1]).path
+            coordinates = [tuple(map(float, pair.split(","))) for pair in unquote(path.rsplit("/", 1)[1]).split(";")]
+            points = [(lat, lng) for lng, lat in coordinates]
+            self.requests.append(points)
+            if self.fail:
+                writer.write(b"HTTP/1.1 503 Service Unavailable\r\nConnection: close\r\nContent-Length: 0\r\n\r\n")
+            else:
+                island = (ISLAND["lat"], ISLAND["lng"])
+                distances = [[None if island in (a, b) and a != b else road_meters(a, b) for b in points]
+                             for a in points]
+                durations = [[None if m is None else m / 10 for m in row] for row in distances]
+                body = json.dumps({"code": "Ok", "distances": distances, "durations": durations}).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Connection: close\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> "StandInTable":
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}/table/v1"
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def make_locations(n: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [{"lat": CASABLANCA["lat"] + rng.uniform(-0.08, 0.08),
+             "lng": CASABLANCA["lng"] + rng.uniform(-0.08, 0.08)} for _ in range(n)]
+
+
+def expected_km(service: TravelMatrixService, locations: list) -> np.ndarray:
+    points = [service._point(location) for location in locations]
+    return np.array([[0.0 if a == b else road_meters(a, b) / 1000 for b in points] for a in points])
+
+
+def test_blocks_merge_into_the_full_matrix():
+    async def scenario():
+        table = await StandInTable().start()
+        service = TravelMatrixService(servers=[table.url], max_coordinates=6)
+        locations = make_locations(17, 1)
+        result = await service.matrix(locations)
+        await table.close()
+
+        assert result["source"] == "osrm" and result["estimated_cells"] == 0
+        assert np.allclose(result["distances"], expected_km(service, locations))
+        assert np.allclose(result["durations"], expected_km(service, locations) * 1000 / 10 / 60)
+        # Split into blocks of three, each request pairing at most two of them
+        assert len(table.requests) > 1
+        assert all(len(points) <= 6 for points in table.requests)
+
+    asyncio.run(scenario())
+
+
+def test_cached_cells_are_not_fetched_again():
+    async def scenario():
+        table = await StandInTable().start()
+        service = TravelMatrixService(servers=[table.url], max_coordinates=6)
+        locations = make_locations(10, 2)
+        await service.matrix(locations)
+        fetched = len(table.requests)
+
+        again = await service.matrix(list(reversed(locations)))
+        assert len(table.requests) == fetched
+        assert np.allclose(again["distances"], expected_km(service, list(reversed(locations))))
+
+        # One new stop only asks for the blocks that pair it with the others
+        extra = make_locations(1, 3)
+        grown = await service.matrix(locations + extra)
+        new_requests = table.requests[fetched:]
+        await table.close()
+
+        assert new_requests and all(service._point(extra[0]) in points for points in new_requests)
+        assert np.allclose(grown["distances"], expected_km(service, locations + extra))
+        assert service.cached_matrix(locations + extra)["source"] == "osrm"
+
+    asyncio.run(scenario())
+
+
+def test_unroutable_pairs_fall_back_to_estimates():
+    async def scenario():
+        table = await StandInTable().start()
+        service = TravelMatrixService(servers=[table.url], max_coordinates=4)
+        locations = make_locations(5, 4) + [ISLAND]
+        result = await service.matrix(locations)
+        await table.close()
+
+        island = len(locations) - 1
+        expected = expected_km(service, locations)
+        estimate = np.array([service._fallback(service._point(location), service._point(ISLAND))[0]
+                             for location in locations[:-1]])
+        assert result["source"] == "mixed"
+        assert result["estimated_cells"] == 2 * (len(locations) - 1)
+        assert np.allclose(result["distances"][:island, :island], expected[:island, :island])
+        assert np.allclose(result["distances"][:island, island], estimate)
+
+    asyncio.run(scenario())
+
+
+def test_failing_servers_are_skipped_until_retry():
+    async def scenario():
+        table = await StandInTable(fail=True).start()
+        service = TravelMatrixService(servers=[table.url], max_coordinates=4, retry_after=60)
+        locations = make_locations(6, 5)
+        first = await service.matrix(locations)
+        attempts = len(table.requests)
+        second = await service.matrix(locations)
+        await table.close()
+
+        assert first["source"] == "fallback" and second["source"] == "fallback"
+        assert attempts >= 1 and len(table.requests) == attempts
+        assert service.get_stats()["servers_down"]
+
+    asyncio.run(scenario())
@@ -51,6 +51,7 @@ export default function PackageTracker({ trackingNumber, orderId }) {
     
     wsRef.current.onmessage = (event) => {
       const update = JSON.parse(event.data)
+      if (update.type !== 'order_update' || update.removed) return
       setTrackingData(prev => ({
         ...prev,
         order: {